@@ -0,0 +1,276 @@
+# api.py
+#
+# JSON HTTP API over pharmacy.db for POS terminals and partner apps, running
+# alongside the Streamlit UI and sharing its data through the pharmacy package.
+#
+#   uvicorn api:app --host 0.0.0.0 --port 8000
+#
+#   GET  /medicines?page=1&per_page=50   catalog, paginated (ETag / If-None-Match)
+#   GET  /medicines/search?q=para        name search (ETag / If-None-Match)
+#   GET  /medicines/{id}/stock           current stock of one medicine
+#   POST /orders                         checkout, HTTP Basic auth as a customer
+#                                        {"items": [{"drug_id": 1, "quantity": 2}]}
+#   GET  /orders/export.csv              the customer's order history, streamed
+#   GET  /orders/export.pdf              the same as a PDF
+import base64
+import binascii
+import json
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from pharmacy import cache, catalog, db, maintenance, orders, users, writer
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+
+# One SQLite connection per worker thread, reused across requests
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = db.connect()
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+@contextmanager
+def _connection():
+    # On PostgreSQL, one from the pool for just this block: a connection held per
+    # worker thread (up to 40) would drain the pool, and checkouts need one too
+    if db.BACKEND == "postgres":
+        with db.connection() as conn:
+            yield conn
+    else:
+        yield _conn()
+
+
+def _medicine_json(row):
+    return {"medicine_id": row[0], "name": row[1], "stock": row[2], "expiry_date": row[3], "price": row[4]}
+
+
+def _error(status, message, headers=None):
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _catalog_read(key, if_none_match, build):
+    """
+    Serve a catalog read keyed by URL. Returns (etag, body); body is None when
+    the client's copy is current. The JSON is only rebuilt after the catalog
+    changes, and is shared with the other worker processes through the cache.
+    """
+    with _connection() as conn:
+        version = catalog.version(conn)
+        etag = f'"catalog-{version}"'
+        if _etag_matches(if_none_match, etag):
+            return etag, None
+
+        body = cache.get_or_compute(f"api:{key}", version, lambda: json.dumps(build(conn)).encode())
+    return etag, body
+
+
+async def _catalog_response(request, build):
+    etag, body = await run_in_threadpool(
+        _catalog_read, f"{request.url.path}?{request.url.query}", request.headers.get("if-none-match"), build)
+    # Clients may keep the response but must revalidate it on every use
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _int_param(request, name, default, minimum, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer") from None
+    if not minimum <= value <= maximum:
+        raise ValueError(f"'{name}' must be between {minimum} and {maximum}")
+    return value
+
+
+# GET /medicines
+async def list_medicines(request):
+    try:
+        page = _int_param(request, "page", 1, 1, 10**9)
+        per_page = _int_param(request, "per_page", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    def build(conn):
+        return {
+            "page": page,
+            "per_page": per_page,
+            "total": catalog.count_medicines(conn),
+            "items": [_medicine_json(row) for row in catalog.page_medicines(conn, per_page, (page - 1) * per_page)],
+        }
+    return await _catalog_response(request, build)
+
+
+# GET /medicines/search
+async def search_medicines(request):
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return _error(400, "'q' is required")
+    names = [name.strip() for name in query.split(",") if name.strip()]
+
+    def build(conn):
+        return {"items": [_medicine_json(row) for row in catalog.find_matching(conn, names)]}
+    return await _catalog_response(request, build)
+
+
+# GET /medicines/{medicine_id}/stock
+async def medicine_stock(request):
+    medicine_id = request.path_params["medicine_id"]
+    def read():
+        with _connection() as conn:
+            return catalog.get_medicine(conn, medicine_id)
+    row = await run_in_threadpool(read)
+    if not row:
+        return _error(404, f"No medicine with id {medicine_id}")
+    return JSONResponse({"medicine_id": row[0], "name": row[1], "stock": row[2], "expiry_date": row[3]},
+                        headers={"Cache-Control": "no-store"})
+
+
+def _basic_credentials(request):
+    header = request.headers.get("authorization", "")
+    scheme, _, encoded = header.partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        username, sep, password = base64.b64decode(encoded).decode("utf-8").partition(":")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return (username, password) if sep else None
+
+
+def _customer(username, password):
+    """
+    (user, None) for a valid customer login, else (None, (status, body)).
+    """
+    with _connection() as conn:
+        user = users.authenticate(conn, username, password)
+    if not user:
+        return None, (401, {"error": "Invalid credentials"})
+    if user[2] != "customer":
+        return None, (403, {"error": "Only customer accounts can order"})
+    return user, None
+
+
+def _checkout(username, password, quantities):
+    """
+    Authenticate and place the order with the same rules as the Streamlit cart:
+    server-side prices, one transaction, nothing written if any item is short.
+    """
+    user, error = _customer(username, password)
+    if error:
+        return error
+
+    # Given back before the writer takes its own connection for the order
+    items = []
+    with _connection() as conn:
+        for drug_id, quantity in quantities:
+            drug = catalog.get_medicine(conn, drug_id)
+            if not drug:
+                return 404, {"error": f"No medicine with id {drug_id}"}
+            items.append({'drug_id': drug[0], 'drug_name': drug[1], 'quantity': quantity,
+                          'total': drug[4] * quantity})
+
+    try:
+        order_ids = writer.run(orders.place_order, user[0], items)
+    except orders.InsufficientStock as e:
+        return 409, {"error": str(e), "drug_name": e.drug_name, "available": e.available}
+    return 201, {"order_ids": order_ids, "total_amount": round(sum(item['total'] for item in items), 2)}
+
+
+# POST /orders
+async def create_order(request):
+    credentials = _basic_credentials(request)
+    if not credentials:
+        return _error(401, "Authentication required", {"WWW-Authenticate": 'Basic realm="DawaKhana"'})
+
+    try:
+        payload = await request.json()
+        quantities = [(int(item["drug_id"]), int(item["quantity"])) for item in payload["items"]]
+    except (ValueError, KeyError, TypeError):
+        return _error(400, "Expected {\"items\": [{\"drug_id\": <int>, \"quantity\": <int>}, ...]}")
+    if not quantities or any(quantity < 1 for _, quantity in quantities):
+        return _error(400, "Order at least one item, each with a quantity of 1 or more")
+
+    try:
+        status, body = await run_in_threadpool(_checkout, *credentials, quantities)
+    except users.LoginThrottled as e:
+        return _error(429, str(e), {"Retry-After": str(int(e.retry_after) + 1)})
+    return JSONResponse(body, status_code=status)
+
+
+# Order history exports by file extension: (generator, media type)
+EXPORTS = {
+    "csv": (orders.export_orders_csv, "text/csv"),
+    "pdf": (orders.export_orders_pdf, "application/pdf"),
+}
+
+
+def _export_rows(export, customer_id):
+    # Its own connection: a streamed body is iterated across several worker threads
+    with db.connection() as conn:
+        yield from export(conn, customer_id)
+
+
+# GET /orders/export.csv, /orders/export.pdf
+async def export_orders(request):
+    extension = request.path_params["extension"]
+    if extension not in EXPORTS:
+        return _error(404, f"No export as .{extension}; use one of: {', '.join(EXPORTS)}")
+    export, media_type = EXPORTS[extension]
+    credentials = _basic_credentials(request)
+    if not credentials:
+        return _error(401, "Authentication required", {"WWW-Authenticate": 'Basic realm="DawaKhana"'})
+    try:
+        user, error = await run_in_threadpool(_customer, *credentials)
+    except users.LoginThrottled as e:
+        return _error(429, str(e), {"Retry-After": str(int(e.retry_after) + 1)})
+    if error:
+        return JSONResponse(error[1], status_code=error[0])
+    return StreamingResponse(_export_rows(export, user[0]), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="order_history.{extension}"'})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    with db.connection() as conn:
+        db.init_db(conn)
+    maintenance.start()
+    yield
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+
+
+app = Starlette(
+    routes=[
+        Route("/medicines", list_medicines),
+        Route("/medicines/search", search_medicines),
+        Route("/medicines/{medicine_id:int}/stock", medicine_stock),
+        Route("/orders", create_order, methods=["POST"]),
+        Route("/orders/export.{extension}", export_orders),
+    ],
+    lifespan=lifespan,
+)
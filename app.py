@@ -1,24 +1,13 @@
 import streamlit as st
-import sqlite3
-from datetime import datetime
 import pandas as pd
+from pharmacy import catalog, db, orders, readers, users  # Shared data access
 from PIL import Image  # For handling images
 import pytesseract  # For OCR
 
 # Initialize the database
 def init_db():
-    conn = sqlite3.connect('pharmacy.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS customers 
-                 (customer_id INTEGER PRIMARY KEY, name TEXT, contact TEXT, address TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS medicines 
-                 (medicine_id INTEGER PRIMARY KEY, name TEXT, stock INTEGER, expiry_date TEXT, price REAL, info TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS orders 
-                 (order_id INTEGER PRIMARY KEY, order_date TEXT, customer_id INTEGER, drug_id INTEGER, quantity INTEGER, total_amount REAL)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS users 
-                 (user_id INTEGER PRIMARY KEY, username TEXT, password TEXT, role TEXT)''')
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        db.init_db(conn)
 
 # Call the function to ensure the database is initialized
 init_db()
@@ -28,7 +17,7 @@ st.set_page_config(page_title="DawaKhana", layout="wide", page_icon="💊")
 
 # Utility: Database Connection
 def connect_db():
-    return sqlite3.connect('pharmacy.db', check_same_thread=False)
+    return db.connect()
 
 # Utility: Logout Function
 def logout():
@@ -71,20 +60,13 @@ def login():
                         st.error("Passwords do not match. Please try again.")
                     else:
                         conn = connect_db()
-                        c = conn.cursor()
                         try:
-                            # Check if the username already exists
-                            c.execute("SELECT * FROM users WHERE username = ?", (new_username,))
-                            if c.fetchone():
-                                st.error("Username already exists. Please choose a different username.")
-                            else:
-                                # Insert the new user into the database
-                                c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                                          (new_username, new_password, 'customer'))
-                                conn.commit()
-                                st.success(f"User '{new_username}' registered successfully! Please login.")
-                                st.session_state.sign_up_mode = False  # Switch back to login mode
-                                st.rerun()
+                            users.create_user(conn, new_username, new_password)
+                            st.success(f"User '{new_username}' registered successfully! Please login.")
+                            st.session_state.sign_up_mode = False  # Switch back to login mode
+                            st.rerun()
+                        except users.UsernameTaken as e:
+                            st.error(str(e))
                         except Exception as e:
                             st.error(f"Error during sign-up: {e}")
                         finally:
@@ -103,19 +85,23 @@ def login():
 
                 if st.form_submit_button("Login"):
                     conn = connect_db()
-                    c = conn.cursor()
-                    c.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, password))
-                    user = c.fetchone()
-                    conn.close()
+                    try:
+                        user = users.authenticate(conn, username, password)
+                    except users.LoginThrottled as e:
+                        st.error(str(e))
+                        user = None
+                    else:
+                        if not user:
+                            st.error("Invalid credentials. Please try again.")
+                    finally:
+                        conn.close()
 
                     if user:
                         st.session_state['username'] = username
                         st.session_state['user_id'] = user[0]
-                        st.session_state['role'] = user[3]
+                        st.session_state['role'] = user[2]
                         st.success(f"Welcome, {st.session_state['username']}!")
                         st.rerun()  # Rerun the app to reflect the new session state
-                    else:
-                        st.error("Invalid credentials. Please try again.")
 
             # Sign Up Button (outside the form)
             if st.button("Sign Up"):
@@ -170,28 +156,24 @@ def display_drugs_grid(drugs):
 # Place Order Function
 def place_order(drug_id, quantity):
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT stock, price FROM medicines WHERE medicine_id = ?", (drug_id,))
-    drug_info = c.fetchone()
-
-    if drug_info and drug_info[0] >= quantity:
-        total_amount = drug_info[1] * quantity
-        c.execute("INSERT INTO orders (order_date, customer_id, drug_id, quantity, total_amount) VALUES (?, ?, ?, ?, ?)",
-                  (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), st.session_state['user_id'], drug_id, quantity, total_amount))
-        c.execute("UPDATE medicines SET stock = stock - ? WHERE medicine_id = ?", (quantity, drug_id))
-        conn.commit()
-        st.success(f"Order for {drug_id} placed successfully!")
-    else:
+    drug = catalog.get_medicine(conn, drug_id)
+    try:
+        if drug:
+            orders.place_order(conn, st.session_state['user_id'],
+                               [{'drug_id': drug_id, 'drug_name': drug[1], 'quantity': quantity, 'total': drug[4] * quantity}])
+            st.success(f"Order for {drug_id} placed successfully!")
+        else:
+            st.error("Insufficient stock.")
+    except orders.InsufficientStock:
         st.error("Insufficient stock.")
-    conn.close()
+    finally:
+        conn.close()
 
 # View Drugs
 def view_drugs():
     st.subheader("Manage Drugs")
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM medicines")
-    drugs = c.fetchall()
+    drugs = catalog.list_medicines(conn)
     conn.close()
 
     display_drugs_grid(drugs)
@@ -208,10 +190,7 @@ def add_drug():
 
         if st.form_submit_button("Add Drug"):
             conn = connect_db()
-            c = conn.cursor()
-            c.execute("INSERT INTO medicines (name, stock, expiry_date, price, info) VALUES (?, ?, ?, ?, ?)", 
-                      (name, stock, expiry_date.strftime('%Y-%m-%d'), price, info))
-            conn.commit()
+            catalog.add_medicine(conn, name, stock, expiry_date, price, info)
             conn.close()
             st.success("Drug added successfully!")
 
@@ -225,16 +204,11 @@ def manage_users():
 
         if st.form_submit_button("Add User"):
             conn = connect_db()
-            c = conn.cursor()
             try:
-                c.execute("SELECT * FROM users WHERE username = ?", (new_username,))
-                if c.fetchone():
-                    st.error("Username already exists. Please choose a different username.")
-                else:
-                    c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                              (new_username, new_password, new_role))
-                    conn.commit()
-                    st.success(f"User '{new_username}' added successfully!")
+                users.create_user(conn, new_username, new_password, new_role)
+                st.success(f"User '{new_username}' added successfully!")
+            except users.UsernameTaken as e:
+                st.error(str(e))
             except Exception as e:
                 st.error(f"Error adding user: {e}")
             finally:
@@ -245,10 +219,8 @@ def manage_users():
         user_id_to_remove = st.number_input("Enter User ID to Remove", min_value=1, step=1)
         if st.form_submit_button("Remove User"):
             conn = connect_db()
-            c = conn.cursor()
             try:
-                c.execute("DELETE FROM users WHERE user_id = ?", (user_id_to_remove,))
-                conn.commit()
+                users.delete_user(conn, user_id_to_remove)
                 st.success(f"User with ID {user_id_to_remove} removed successfully!")
             except Exception as e:
                 st.error(f"Error removing user: {e}")
@@ -256,14 +228,12 @@ def manage_users():
                 conn.close()
             st.rerun()
 
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users")
-    users = c.fetchall()
-    conn.close()
+    # Reports read a snapshot from the read pool, never the connection checkout writes on
+    with readers.snapshot() as conn:
+        user_rows = users.list_users(conn)
 
-    if users:
-        users_df = pd.DataFrame(users, columns=["ID", "Username", "Password", "Role"])
+    if user_rows:
+        users_df = pd.DataFrame(user_rows, columns=["ID", "Username", "Role"])
         st.dataframe(users_df, use_container_width=True)
     else:
         st.write("No users found.")
@@ -271,17 +241,10 @@ def manage_users():
 # View Orders
 def view_orders():
     st.subheader("View Orders")
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("""
-        SELECT orders.order_id, orders.order_date, medicines.name, orders.quantity, orders.total_amount 
-        FROM orders 
-        JOIN medicines ON orders.drug_id = medicines.medicine_id
-    """)
-    orders = c.fetchall()
-    conn.close()
+    with readers.snapshot() as conn:
+        order_rows = orders.all_orders(conn)
 
-    orders_df = pd.DataFrame(orders, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
+    orders_df = pd.DataFrame(order_rows, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
     st.dataframe(orders_df, use_container_width=True)
 
 # Customer Dashboard
@@ -329,9 +292,7 @@ def upload_prescription():
 def buy_drugs():
     st.subheader("Available Drugs")
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM medicines")
-    drugs = c.fetchall()
+    drugs = catalog.list_medicines(conn)
     conn.close()
 
     display_drugs_grid(drugs)
@@ -340,17 +301,10 @@ def buy_drugs():
 def view_order_history():
     st.subheader("Order History")
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("""
-        SELECT orders.order_id, orders.order_date, medicines.name, orders.quantity, orders.total_amount 
-        FROM orders 
-        JOIN medicines ON orders.drug_id = medicines.medicine_id 
-        WHERE orders.customer_id = ?
-    """, (st.session_state['user_id'],))
-    orders = c.fetchall()
+    order_rows = orders.customer_orders(conn, st.session_state['user_id'])
     conn.close()
 
-    orders_df = pd.DataFrame(orders, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
+    orders_df = pd.DataFrame(order_rows, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
     st.dataframe(orders_df, use_container_width=True)
 
 # Search Drugs
@@ -360,10 +314,7 @@ def search_drugs():
     if st.button("Search"):
         drug_names = [name.strip() for name in search_query.split(',')]
         conn = connect_db()
-        c = conn.cursor()
-        query = f"SELECT * FROM medicines WHERE name IN ({','.join(['?'] * len(drug_names))})"
-        c.execute(query, drug_names)
-        results = c.fetchall()
+        results = catalog.find_by_names(conn, drug_names)
         conn.close()
 
         if results:
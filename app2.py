@@ -1,30 +1,20 @@
 import streamlit as st
-import sqlite3
 from datetime import datetime
 import pandas as pd
+from pharmacy import catalog, db, inventory, orders, readers, users  # Shared data access
 from PIL import Image  # For handling images
 # from text_extraction import extract_text_from_image, extract_entities  # Import OCR utility
 
 # Initialize the database
 def init_db():
-    conn = sqlite3.connect('pharmacy.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS customers 
-                 (customer_id INTEGER PRIMARY KEY, name TEXT, contact TEXT, address TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS medicines 
-                 (medicine_id INTEGER PRIMARY KEY, name TEXT, stock INTEGER, expiry_date TEXT, price REAL, info TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS orders 
-                 (order_id INTEGER PRIMARY KEY, order_date TEXT, customer_id INTEGER, drug_id INTEGER, quantity INTEGER, total_amount REAL)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS users 
-                 (user_id INTEGER PRIMARY KEY, username TEXT, password TEXT, role TEXT)''')
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        db.init_db(conn)
 
 # Call the function to ensure the database is initialized
 init_db()
 
 # Global Layout Config
-st.set_page_config(page_title="DawaKhana", layout="wide", page_icon="pills_bottle_logo.svg")
+st.set_page_config(page_title="DawaKhana", layout="wide", page_icon="static/pills_bottle_logo.svg")
 
 # Custom CSS for Styling
 st.markdown("""
@@ -72,7 +62,7 @@ st.markdown("""
 
 # Utility: Database Connection
 def connect_db():
-    return sqlite3.connect('pharmacy.db', check_same_thread=False)
+    return db.connect()
 
 # Utility: Logout Function
 def logout():
@@ -92,7 +82,7 @@ def login():
 
     col1, col2 = st.columns([1, 2])
     with col1:
-        st.image("pills_bottle_logo.svg", caption="The ultimate dispensary manager!", width=350)
+        st.image("static/pills_bottle_logo.svg", caption="The ultimate dispensary manager!", width=350)
     with col2:
         # Check if the user is in sign-up mode
         if 'sign_up_mode' not in st.session_state:
@@ -111,20 +101,13 @@ def login():
                         st.error("Passwords do not match. Please try again.")
                     else:
                         conn = connect_db()
-                        c = conn.cursor()
                         try:
-                            # Check if the username already exists
-                            c.execute("SELECT * FROM users WHERE username = ?", (new_username,))
-                            if c.fetchone():
-                                st.error("Username already exists. Please choose a different username.")
-                            else:
-                                # Insert the new user into the database
-                                c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                                          (new_username, new_password, 'customer'))
-                                conn.commit()
-                                st.success(f"User '{new_username}' registered successfully! Please login.")
-                                st.session_state.sign_up_mode = False  # Switch back to login mode
-                                st.rerun()
+                            users.create_user(conn, new_username, new_password)
+                            st.success(f"User '{new_username}' registered successfully! Please login.")
+                            st.session_state.sign_up_mode = False  # Switch back to login mode
+                            st.rerun()
+                        except users.UsernameTaken as e:
+                            st.error(str(e))
                         except Exception as e:
                             st.error(f"Error during sign-up: {e}")
                         finally:
@@ -143,19 +126,23 @@ def login():
 
                 if st.form_submit_button("Login"):
                     conn = connect_db()
-                    c = conn.cursor()
-                    c.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, password))
-                    user = c.fetchone()
-                    conn.close()
+                    try:
+                        user = users.authenticate(conn, username, password)
+                    except users.LoginThrottled as e:
+                        st.error(str(e))
+                        user = None
+                    else:
+                        if not user:
+                            st.error("Invalid credentials. Please try again.")
+                    finally:
+                        conn.close()
 
                     if user:
                         st.session_state['username'] = username
                         st.session_state['user_id'] = user[0]
-                        st.session_state['role'] = user[3]
+                        st.session_state['role'] = user[2]
                         st.success(f"Welcome, {st.session_state['username']}! 🎉")
                         st.rerun()  # Rerun the app to reflect the new session state
-                    else:
-                        st.error("Invalid credentials. Please try again.")
 
             # Sign Up Button (outside the form)
             if st.button("Sign Up"):
@@ -216,25 +203,22 @@ def display_drugs_grid(drugs):
     # Responsive grid layout
     cols_per_row = 4
     cols = st.columns(cols_per_row)
+    # Stock and expiry colours for the whole grid in one pass
+    statuses = inventory.grid_status(drugs)
 
-    for idx, drug in enumerate(drugs):
+    for idx, (drug, (stock_color, _, expiry_color)) in enumerate(zip(drugs, statuses)):
         with cols[idx % cols_per_row]:
             # Card container
             with st.container():
-                st.image("\bottle_blue.svg", caption=drug[1], width=100)
+                st.image("static/bottle_blue.svg", caption=drug[1], width=100)
                 
                 # Dynamic stock status indicator
-                stock_level = "high" if drug[2] > 50 else "medium" if drug[2] > 20 else "low"
-                stock_color = "green" if stock_level == "high" else "orange" if stock_level == "medium" else "red"
                 st.markdown(f"**Stock:** <span style='color: {stock_color}'>{drug[2]} units</span>", unsafe_allow_html=True)
                 
                 # Price with currency symbol
                 st.markdown(f"**Price:** ₹{drug[4]:,.2f}")
                 
                 # Expiry date with warning if approaching
-                expiry_date = datetime.strptime(drug[3], '%Y-%m-%d')
-                days_to_expiry = (expiry_date - datetime.now()).days
-                expiry_color = "red" if days_to_expiry < 90 else "orange" if days_to_expiry < 180 else "green"
                 st.markdown(f"**Expiry:** <span style='color: {expiry_color}'>{drug[3]}</span>", unsafe_allow_html=True)
                 
                 # Pop-up for detailed information
@@ -330,29 +314,14 @@ def view_cart():
 # Place Order from Cart
 def place_order_from_cart():
     conn = connect_db()
-    c = conn.cursor()
     
     try:
-        for item in st.session_state.cart:
-            # Check stock availability
-            c.execute("SELECT stock FROM medicines WHERE medicine_id = ?", (item['drug_id'],))
-            stock = c.fetchone()[0]
-            
-            if stock < item['quantity']:
-                st.error(f"Insufficient stock for {item['drug_name']}. Available: {stock}")
-                return
-            
-            # Insert order into the database
-            c.execute("INSERT INTO orders (order_date, customer_id, drug_id, quantity, total_amount) VALUES (?, ?, ?, ?, ?)",
-                      (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), st.session_state['user_id'], item['drug_id'], item['quantity'], item['total']))
-            
-            # Update stock
-            c.execute("UPDATE medicines SET stock = stock - ? WHERE medicine_id = ?", (item['quantity'], item['drug_id']))
-        
-        conn.commit()
+        orders.place_order(conn, st.session_state['user_id'], st.session_state.cart)
         st.toast("Order placed successfully! 🎉", icon="✅")  # Toast message
         st.session_state.cart = []  # Clear the cart immediately
         st.rerun()  # Rerun the app to reflect the empty cart
+    except orders.InsufficientStock as e:
+        st.error(str(e))
     except Exception as e:
         st.error(f"Error placing order: {e}")
     finally:
@@ -362,9 +331,7 @@ def place_order_from_cart():
 def view_drugs():
     st.subheader("Manage Drugs")
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM medicines")
-    drugs = c.fetchall()
+    drugs = catalog.list_medicines(conn)
     conn.close()
 
     # Display drugs in a grid with edit and delete options
@@ -375,7 +342,7 @@ def view_drugs():
         with cols[idx % cols_per_row]:
             # Card-like layout for each drug
             with st.container():
-                st.image("\bottle_blue.svg", caption=drug[1], width=100)  # Drug image
+                st.image("static/bottle_blue.svg", caption=drug[1], width=100)  # Drug image
                 st.write(f"*Price:* ₹{drug[4]:.2f}")
                 st.write(f"*Stock:* {drug[2]}")
                 st.write(f"*Expiry:* {drug[3]}")
@@ -391,13 +358,7 @@ def view_drugs():
                         # Submit button for editing
                         if st.form_submit_button("Save Changes"):
                             conn = connect_db()
-                            c = conn.cursor()
-                            c.execute("""
-                                UPDATE medicines 
-                                SET name = ?, stock = ?, expiry_date = ?, price = ?
-                                WHERE medicine_id = ?
-                            """, (new_name, new_stock, new_expiry.strftime('%Y-%m-%d'), new_price, drug[0]))
-                            conn.commit()
+                            catalog.update_medicine(conn, drug[0], new_name, new_stock, new_expiry, new_price)
                             conn.close()
                             st.toast(f"Updated {new_name} successfully!", icon="✅")
                             st.rerun()
@@ -405,9 +366,7 @@ def view_drugs():
                     # Delete button
                     if st.button(f"Delete {drug[1]}", key=f"delete_{drug[0]}"):
                         conn = connect_db()
-                        c = conn.cursor()
-                        c.execute("DELETE FROM medicines WHERE medicine_id = ?", (drug[0],))
-                        conn.commit()
+                        catalog.delete_medicine(conn, drug[0])
                         conn.close()
                         st.toast(f"Deleted {drug[1]} successfully!", icon="✅")
                         st.rerun()
@@ -425,10 +384,7 @@ def add_drug():
 
         if st.form_submit_button("Add Drug"):
             conn = connect_db()
-            c = conn.cursor()
-            c.execute("INSERT INTO medicines (name, stock, expiry_date, price) VALUES (?, ?, ?, ?)", 
-                      (name, stock, expiry_date.strftime('%Y-%m-%d'), price))
-            conn.commit()
+            catalog.add_medicine(conn, name, stock, expiry_date, price)
             conn.close()
             st.success("Drug added successfully!")
 
@@ -442,16 +398,11 @@ def manage_users():
 
         if st.form_submit_button("Add User"):
             conn = connect_db()
-            c = conn.cursor()
             try:
-                c.execute("SELECT * FROM users WHERE username = ?", (new_username,))
-                if c.fetchone():
-                    st.error("Username already exists. Please choose a different username.")
-                else:
-                    c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                              (new_username, new_password, new_role))
-                    conn.commit()
-                    st.success(f"User '{new_username}' added successfully!")
+                users.create_user(conn, new_username, new_password, new_role)
+                st.success(f"User '{new_username}' added successfully!")
+            except users.UsernameTaken as e:
+                st.error(str(e))
             except Exception as e:
                 st.error(f"Error adding user: {e}")
             finally:
@@ -462,10 +413,8 @@ def manage_users():
         user_id_to_remove = st.number_input("Enter User ID to Remove", min_value=1, step=1)
         if st.form_submit_button("Remove User"):
             conn = connect_db()
-            c = conn.cursor()
             try:
-                c.execute("DELETE FROM users WHERE user_id = ?", (user_id_to_remove,))
-                conn.commit()
+                users.delete_user(conn, user_id_to_remove)
                 st.success(f"User with ID {user_id_to_remove} removed successfully!")
             except Exception as e:
                 st.error(f"Error removing user: {e}")
@@ -473,14 +422,12 @@ def manage_users():
                 conn.close()
             st.rerun()
 
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users")
-    users = c.fetchall()
-    conn.close()
+    # Reports read a snapshot from the read pool, never the connection checkout writes on
+    with readers.snapshot() as conn:
+        user_rows = users.list_users(conn)
 
-    if users:
-        users_df = pd.DataFrame(users, columns=["ID", "Username", "Password", "Role"])
+    if user_rows:
+        users_df = pd.DataFrame(user_rows, columns=["ID", "Username", "Role"])
         st.dataframe(users_df, use_container_width=True)
     else:
         st.write("No users found.")
@@ -488,22 +435,15 @@ def manage_users():
 # View Orders
 def view_orders():
     st.subheader("View Orders")
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("""
-        SELECT orders.order_id, orders.order_date, medicines.name, orders.quantity, orders.total_amount 
-        FROM orders 
-        JOIN medicines ON orders.drug_id = medicines.medicine_id
-    """)
-    orders = c.fetchall()
-    conn.close()
+    with readers.snapshot() as conn:
+        order_rows = orders.all_orders(conn)
 
-    orders_df = pd.DataFrame(orders, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
+    orders_df = pd.DataFrame(order_rows, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
     st.dataframe(orders_df, use_container_width=True)
 
 # Customer Dashboard
 def customer_dashboard():
-    st.sidebar.image("pills_bottle_logo.svg")
+    st.sidebar.image("static/pills_bottle_logo.svg")
     st.sidebar.header("Customer Menu")
     st.sidebar.button("Logout", on_click=logout)
 
@@ -533,18 +473,14 @@ def buy_drugs():
     search_query = st.text_input("Search for drugs by name", placeholder="Enter drug names (comma-separated)")
     st.write("\n\n\n")
     conn = connect_db()
-    c = conn.cursor()
     
     if search_query:
         # If a search query is provided, filter the drugs
         drug_names = [name.strip() for name in search_query.split(',')]
-        query = f"SELECT * FROM medicines WHERE name IN ({','.join(['?'] * len(drug_names))})"
-        c.execute(query, drug_names)
-        drugs = c.fetchall()
+        drugs = catalog.find_by_names(conn, drug_names)
     else:
         # If no search query, display all drugs
-        c.execute("SELECT * FROM medicines")
-        drugs = c.fetchall()
+        drugs = catalog.list_medicines(conn)
     
     conn.close()
 
@@ -555,17 +491,10 @@ def buy_drugs():
 def view_order_history():
     st.subheader("Order History")
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("""
-        SELECT orders.order_id, orders.order_date, medicines.name, orders.quantity, orders.total_amount 
-        FROM orders 
-        JOIN medicines ON orders.drug_id = medicines.medicine_id 
-        WHERE orders.customer_id = ?
-    """, (st.session_state['user_id'],))
-    orders = c.fetchall()
+    order_rows = orders.customer_orders(conn, st.session_state['user_id'])
     conn.close()
 
-    orders_df = pd.DataFrame(orders, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
+    orders_df = pd.DataFrame(order_rows, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
     st.dataframe(orders_df, use_container_width=True)
 
 # Upload Prescription
@@ -632,16 +561,7 @@ def upload_prescription():
             if entities.get("drug_name"):
                 st.subheader("Available Drugs in Database")
                 conn = connect_db()
-                c = conn.cursor()
-
-                # Query the database for each drug
-                available_drugs = []
-                for drug in entities["drug_name"]:
-                    c.execute("SELECT * FROM medicines WHERE name LIKE ?", (f"%{drug}%",))
-                    result = c.fetchone()
-                    if result:
-                        available_drugs.append(result)
-
+                available_drugs = catalog.find_matching(conn, entities["drug_name"])
                 conn.close()
 
                 if available_drugs:
@@ -1,30 +1,31 @@
 import streamlit as st
+import os
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime
 import pandas as pd
 from PIL import Image  # For handling images
-from text_extraction import extract_text_from_image, extract_entities  # Import OCR utility
+from assets import static_url, drug_thumbnail_url, image_html  # Static file URLs
+from pharmacy import (carts, catalog, dashboard, db, entities, inventory, ledger, maintenance, orders, perf, pos,
+                      prescriptions, readers, users, writer)  # Data access shared by all front-ends
+from pharmacy.drug_info import get_monograph
+from pharmacy.perf import timer, timed
+from text_extraction import (PRESCRIPTION_TYPES, MIN_CONFIDENCE, PREPROCESSED, TEXT_READY, ENTITIES_READY,
+                             MATCHES_READY, prescription_pipeline, prompt_span,
+                             prescription_hash)  # Import OCR utility
 
-# Initialize the database
+# Initialize the database (cached, so it runs once per server process rather than on every rerun)
+@st.cache_resource(show_spinner=False)
 def init_db():
-    conn = sqlite3.connect('pharmacy.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS customers 
-                 (customer_id INTEGER PRIMARY KEY, name TEXT, contact TEXT, address TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS medicines 
-                 (medicine_id INTEGER PRIMARY KEY, name TEXT, stock INTEGER, expiry_date TEXT, price REAL, info TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS orders 
-                 (order_id INTEGER PRIMARY KEY, order_date TEXT, customer_id INTEGER, drug_id INTEGER, quantity INTEGER, total_amount REAL)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS users 
-                 (user_id INTEGER PRIMARY KEY, username TEXT, password TEXT, role TEXT)''')
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        db.init_db(conn)
+    # Backups, statistics and vacuuming in the background, when the database is quiet
+    maintenance.start()
 
 # Call the function to ensure the database is initialized
 init_db()
 
 # Global Layout Config
-st.set_page_config(page_title="DawaKhana", layout="wide", page_icon="static\pills_bottle_logo.svg")
+st.set_page_config(page_title="DawaKhana", layout="wide", page_icon="static/pills_bottle_logo.svg")
 
 # Custom CSS for Styling
 st.markdown("""
@@ -71,7 +72,15 @@ st.markdown("""
 
 # Utility: Database Connection
 def connect_db():
-    return sqlite3.connect('pharmacy.db', check_same_thread=False)
+    # Every statement run through this connection is timed for the Performance page
+    return db.connect()
+
+# Utility: Save the session's cart so it outlives this server process
+def save_cart():
+    conn = connect_db()
+    carts.save_cart(conn, st.session_state['user_id'], st.session_state.cart)
+    conn.close()
+    refresh_cart_badge()  # Cart changes made inside a fragment don't rerun the sidebar
 
 # Utility: Logout Function
 def logout():
@@ -91,7 +100,8 @@ def login():
 
     col1, col2 = st.columns([1, 2])
     with col1:
-        st.image("static/pills_bottle_logo.svg", caption="The ultimate dispensary manager!", width=350)
+        st.markdown(image_html(static_url("pills_bottle_logo.png"), caption="The ultimate dispensary manager!", width=350),
+                    unsafe_allow_html=True)
     with col2:
         # Check if the user is in sign-up mode
         if 'sign_up_mode' not in st.session_state:
@@ -110,20 +120,13 @@ def login():
                         st.error("Passwords do not match. Please try again.")
                     else:
                         conn = connect_db()
-                        c = conn.cursor()
                         try:
-                            # Check if the username already exists
-                            c.execute("SELECT * FROM users WHERE username = ?", (new_username,))
-                            if c.fetchone():
-                                st.error("Username already exists. Please choose a different username.")
-                            else:
-                                # Insert the new user into the database
-                                c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                                          (new_username, new_password, 'customer'))
-                                conn.commit()
-                                st.toast(f"User '{new_username}' registered successfully! Please login.")
-                                st.session_state.sign_up_mode = False  # Switch back to login mode
-                                st.rerun()
+                            users.create_user(conn, new_username, new_password, 'customer')
+                            st.toast(f"User '{new_username}' registered successfully! Please login.")
+                            st.session_state.sign_up_mode = False  # Switch back to login mode
+                            st.rerun()
+                        except users.UsernameTaken as e:
+                            st.error(str(e))
                         except Exception as e:
                             st.error(f"Error during sign-up: {e}")
                         finally:
@@ -142,19 +145,27 @@ def login():
 
                 if st.form_submit_button("Login"):
                     conn = connect_db()
-                    c = conn.cursor()
-                    c.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, password))
-                    user = c.fetchone()
-                    conn.close()
+                    try:
+                        user = users.authenticate(conn, username, password)
+                    except users.LoginThrottled as e:
+                        st.error(str(e))
+                        user = None
+                    else:
+                        if not user:
+                            st.error("Invalid credentials. Please try again.")
+                    finally:
+                        conn.close()
 
                     if user:
                         st.session_state['username'] = username
                         st.session_state['user_id'] = user[0]
-                        st.session_state['role'] = user[3]
+                        st.session_state['role'] = user[2]
+                        # Pick up the cart saved by an earlier session, possibly on another server
+                        conn = connect_db()
+                        st.session_state.cart = carts.load_cart(conn, user[0])
+                        conn.close()
                         st.toast(f"Welcome, {st.session_state['username']}! 🎉")
                         st.rerun()  # Rerun the app to reflect the new session state
-                    else:
-                        st.error("Invalid credentials. Please try again.")
 
             # Sign Up Button (outside the form)
             if st.button("Sign Up"):
@@ -163,12 +174,13 @@ def login():
 
 # Admin Dashboard
 def admin_dashboard():
-    st.sidebar.image("static/pills_bottle_logo.svg")
+    st.sidebar.markdown(image_html(static_url("pills_bottle_logo.png"), width=118), unsafe_allow_html=True)
     st.sidebar.header("Dawakhana")
     st.sidebar.button("Logout", on_click=logout)
 
     # Remove "Dashboard" from the menu options
-    menu_options = ["Manage Drugs", "Add Drug", "Manage Users", "View Orders"]
+    menu_options = ["Manage Drugs", "Point of Sale", "Add Drug", "Manage Users", "View Orders", "Prescription Review",
+                    "Performance"]
     selected_option = st.sidebar.radio("Navigate", menu_options)
 
     if 'username' in st.session_state:
@@ -177,118 +189,131 @@ def admin_dashboard():
     st.markdown("---")
     
     # Automatically redirect to "Manage Drugs" if no option is selected
-    if selected_option == "Manage Drugs":
-        view_drugs()
-    elif selected_option == "Add Drug":
-        add_drug()
-    elif selected_option == "Manage Users":
-        manage_users()
-    elif selected_option == "View Orders":
-        view_orders()
+    with timer("page", selected_option):
+        if selected_option == "Manage Drugs":
+            view_drugs()
+        elif selected_option == "Point of Sale":
+            point_of_sale()
+        elif selected_option == "Add Drug":
+            add_drug()
+        elif selected_option == "Manage Users":
+            manage_users()
+        elif selected_option == "View Orders":
+            view_orders()
+        elif selected_option == "Prescription Review":
+            review_prescriptions()
+        elif selected_option == "Performance":
+            performance_page()
 
-# Display Drugs in a Grid Layout
-drug_info = {
-    'Paracetamol': '**Primary Use:** Pain reliever and fever reducer.\n\n**Key Benefits:** Effective for mild to moderate pain and fever.\n\n**Important Precautions:** Avoid exceeding recommended dosage to prevent liver damage.',
-    'Ibuprofen': '**Primary Use:** Pain reliever and anti-inflammatory.\n\n**Key Benefits:** Reduces pain, inflammation, and fever.\n\n**Important Precautions:** May cause stomach ulcers; use with caution in patients with kidney issues.',
-    'Amoxicillin': '**Primary Use:** Antibiotic for bacterial infections.\n\n**Key Benefits:** Treats a wide range of infections.\n\n**Important Precautions:** May cause allergic reactions; complete the full course.',
-    'Lisinopril': '**Primary Use:** Treats high blood pressure and heart failure.\n\n**Key Benefits:** Lowers blood pressure and reduces heart failure symptoms.\n\n**Important Precautions:** May cause dizziness; monitor kidney function.',
-    'Metformin': '**Primary Use:** Treats type 2 diabetes.\n\n**Key Benefits:** Regulates blood sugar levels.\n\n**Important Precautions:** Use with caution in patients with kidney or liver disease.',
-    'Atorvastatin': '**Primary Use:** Treats high cholesterol.\n\n**Key Benefits:** Reduces risk of heart disease.\n\n**Important Precautions:** Monitor liver enzymes regularly.',
-    'Omeprazole': '**Primary Use:** Treats acid reflux.\n\n**Key Benefits:** Reduces stomach acid production.\n\n**Important Precautions:** Long-term use may increase risk of bone fractures.',
-    'Levothyroxine': '**Primary Use:** Treats hypothyroidism.\n\n**Key Benefits:** Restores thyroid hormone levels.\n\n**Important Precautions:** Monitor thyroid levels regularly.',
-    'Amlodipine': '**Primary Use:** Treats high blood pressure.\n\n**Key Benefits:** Lowers blood pressure.\n\n**Important Precautions:** May cause dizziness or swelling.',
-    'Simvastatin': '**Primary Use:** Lowers cholesterol.\n\n**Key Benefits:** Reduces risk of heart attack.\n\n**Important Precautions:** Avoid with certain medications.',
-    'Losartan': '**Primary Use:** Treats high blood pressure.\n\n**Key Benefits:** Relaxes blood vessels.\n\n**Important Precautions:** Monitor kidney function.',
-    'Metoprolol': '**Primary Use:** Treats high blood pressure.\n\n**Key Benefits:** Reduces risk of heart attack.\n\n**Important Precautions:** Use with caution in asthma patients.',
-    'Albuterol': '**Primary Use:** Treats asthma.\n\n**Key Benefits:** Relieves bronchospasms.\n\n**Important Precautions:** Use with caution in cardiovascular disease.',
-    'Gabapentin': '**Primary Use:** Treats neuropathic pain.\n\n**Key Benefits:** Reduces pain and seizures.\n\n**Important Precautions:** May cause dizziness or drowsiness.',
-    'Hydrochlorothiazide': '**Primary Use:** Treats high blood pressure.\n\n**Key Benefits:** Reduces fluid buildup.\n\n**Important Precautions:** Monitor electrolyte levels.',
-    'Sertraline': '**Primary Use:** Treats depression.\n\n**Key Benefits:** Improves mood and reduces anxiety.\n\n**Important Precautions:** May cause withdrawal symptoms.',
-    'Prednisone': '**Primary Use:** Treats inflammation.\n\n**Key Benefits:** Reduces swelling and pain.\n\n**Important Precautions:** Long-term use may cause side effects.',
-    'Tramadol': '**Primary Use:** Treats moderate pain.\n\n**Key Benefits:** Effective pain relief.\n\n**Important Precautions:** May cause dizziness or drowsiness.',
-    'Citalopram': '**Primary Use:** Treats depression.\n\n**Key Benefits:** Improves mood.\n\n**Important Precautions:** Monitor for suicidal thoughts.',
-    'Warfarin': '**Primary Use:** Prevents blood clots.\n\n**Key Benefits:** Reduces risk of stroke.\n\n**Important Precautions:** Monitor INR regularly.',
-    'Methamphetamine': '**Primary Use:** Recreational drug.\n\n**Key Benefits:** None.\n\n**Important Precautions:** Highly addictive and dangerous.',
-    'Dolo 650': '**Primary Use:** Treats pain and fever.\n\n**Key Benefits:** Fast relief.\n\n**Important Precautions:** Avoid in liver disease.'
-}
+# Drug Details Dialog (loaded only when opened)
+@st.dialog("Drug Details")
+def show_drug_info(drug_id):
+    conn = connect_db()
+    monograph = get_monograph(conn, drug_id)
+    conn.close()
+    st.markdown(monograph or "Description not available.")
+
+# Drug Card (a fragment, so quantity changes and Add to Cart only rerun this card).
+# status is (stock_color, days_to_expiry, expiry_color) from inventory.grid_status.
+@st.fragment
+@timed("fragment")
+def drug_card(drug, status):
+    stock_color, _, expiry_color = status
+    with st.container():
+        st.markdown(image_html(drug_thumbnail_url(drug[0], drug[1]), caption=drug[1]), unsafe_allow_html=True)
+
+        if st.button("More Info", key=f"info_{drug[0]}"):
+            show_drug_info(drug[0])
+
+        # Dynamic stock status indicator
+        st.markdown(f"**Stock:** <span style='color: {stock_color}'>{drug[2]} units</span>", unsafe_allow_html=True)
+
+        # Price with currency symbol
+        st.markdown(f"**Price:** ₹{drug[4]:,.2f}")
+
+        # Expiry date with warning if approaching
+        st.markdown(f"**Expiry:** <span style='color: {expiry_color}'>{drug[3]}</span>", unsafe_allow_html=True)
+
+        # Shopping cart functionality for customers
+        if st.session_state.get('role') == 'customer':
+            st.number_input(
+                "Quantity",
+                min_value=1,
+                max_value=drug[2],
+                step=1,
+                key=f"qty_{drug[0]}"
+            )
+            st.button(
+                "🛒 Add to Cart",
+                key=f"add_{drug[0]}",
+                disabled=drug[2] == 0,
+                on_click=add_card_to_cart,
+                args=(drug,)
+            )
+
+        st.markdown("---")
+
+# Add to Cart callback for a drug card; runs before the card's fragment rerun
+def add_card_to_cart(drug):
+    add_to_cart(drug, st.session_state[f"qty_{drug[0]}"])
+
+# Add a drug to the customer's cart, merging with an existing line for it
+def add_to_cart(drug, quantity):
+    if 'cart' not in st.session_state:
+        st.session_state['cart'] = []
+
+    # Check if item already in cart
+    cart_item = next(
+        (item for item in st.session_state['cart'] 
+         if item['drug_id'] == drug[0]),
+        None
+    )
+
+    if cart_item:
+        cart_item['quantity'] += quantity
+        cart_item['total'] = cart_item['quantity'] * cart_item['price']  # Update total
+        save_cart()
+        st.toast(f"Updated quantity for {drug[1]}!", icon="✅")  # Toast message
+    else:
+        st.session_state['cart'].append({
+            'drug_id': drug[0],
+            'drug_name': drug[1],
+            'quantity': quantity,
+            'price': drug[4],
+            'total': quantity * drug[4]  # Add total
+        })
+        save_cart()
+        st.toast(f"Added {quantity} x {drug[1]} to cart!", icon="✅")  # Toast message
 
 # Display Drugs in a Grid Layout
 def display_drugs_grid(drugs):
     cols_per_row = 4
     cols = st.columns(cols_per_row)
+    # Stock and expiry colours for the whole grid in one pass
+    statuses = inventory.grid_status(drugs)
 
-    for idx, drug in enumerate(drugs):
+    for idx, (drug, status) in enumerate(zip(drugs, statuses)):
         with cols[idx % cols_per_row]:
-            # Card container
-            with st.container():
-                st.image("static\\bottle_blue.svg", caption=drug[1], width=100)
-                
-                with st.popover("More Info"):
-                    # Fetch drug description from the drug_info dictionary
-                    description = drug_info.get(drug[1], "Description not available.")
-                    
-                    # Display structured drug details
-                    st.markdown(f"### {drug[1]} Details")
-                    st.markdown(description)
-                
-                # Dynamic stock status indicator
-                stock_level = "high" if drug[2] > 50 else "medium" if drug[2] > 20 else "low"
-                stock_color = "green" if stock_level == "high" else "orange" if stock_level == "medium" else "red"
-                st.markdown(f"**Stock:** <span style='color: {stock_color}'>{drug[2]} units</span>", unsafe_allow_html=True)
-                
-                # Price with currency symbol
-                st.markdown(f"**Price:** ₹{drug[4]:,.2f}")
-                
-                # Expiry date with warning if approaching
-                expiry_date = datetime.strptime(drug[3], '%Y-%m-%d')
-                days_to_expiry = (expiry_date - datetime.now()).days
-                expiry_color = "red" if days_to_expiry < 90 else "orange" if days_to_expiry < 180 else "green"
-                st.markdown(f"**Expiry:** <span style='color: {expiry_color}'>{drug[3]}</span>", unsafe_allow_html=True)
-                
-                # Pop-up for detailed information
-                
-                # Shopping cart functionality for customers
-                if st.session_state.get('role') == 'customer':
-                    quantity = st.number_input(
-                        "Quantity",
-                        min_value=1,
-                        max_value=drug[2],
-                        step=1,
-                        key=f"qty_{drug[0]}"
-                    )
-                    if st.button(
-                        "🛒 Add to Cart",
-                        key=f"add_{drug[0]}",
-                        disabled=drug[2] == 0
-                    ):
-                        if 'cart' not in st.session_state:
-                            st.session_state['cart'] = []
-                        
-                        # Check if item already in cart
-                        cart_item = next(
-                            (item for item in st.session_state['cart'] 
-                             if item['drug_id'] == drug[0]),
-                            None
-                        )
-                        
-                        if cart_item:
-                            cart_item['quantity'] += quantity
-                            cart_item['total'] = cart_item['quantity'] * cart_item['price']  # Update total
-                            st.toast(f"Updated quantity for {drug[1]}!", icon="✅")  # Toast message
-                        else:
-                            st.session_state['cart'].append({
-                                'drug_id': drug[0],
-                                'drug_name': drug[1],
-                                'quantity': quantity,
-                                'price': drug[4],
-                                'expiry': drug[3],
-                                'total': quantity * drug[4]  # Add total
-                            })
-                            st.toast(f"Added {quantity} x {drug[1]} to cart!", icon="✅")  # Toast message
-                                            
-                st.markdown("---")
-
-# View Cart
+            drug_card(drug, status)
+
+# Cart Badge (a sidebar fragment; save_cart redraws it through refresh_cart_badge, so
+# adding from a drug card or removing from the cart reruns only that fragment)
+@st.fragment
+def cart_badge():
+    st.session_state['cart_badge'] = st.empty()
+    refresh_cart_badge()
+
+# Redraw the cart badge with the session's current item count
+def refresh_cart_badge():
+    badge = st.session_state.get('cart_badge')
+    if badge is None:
+        return
+    item_count = sum(item['quantity'] for item in st.session_state.get('cart', []))
+    badge.markdown(f"🛒 **Cart:** {item_count} item(s)")
+
+# View Cart (a fragment; removing an item reruns only the cart)
+@st.fragment
+@timed("fragment")
 def view_cart():
     st.subheader("🛒 Your Cart")
     
@@ -314,8 +339,9 @@ def view_cart():
                 if st.button(f"❌", key=f"remove_{idx}"):
                 # if st.button(f"Remove", key=f"remove_{idx}"):
                     st.session_state.cart.pop(idx)
+                    save_cart()
                     st.toast(f"Removed {item['drug_name']} from cart!", icon="✅")  # Toast message
-                    st.rerun()
+                    st.rerun(scope="fragment")
             
             st.markdown("---")
             total_amount += item['total']
@@ -329,89 +355,35 @@ def view_cart():
 
 # Place Order from Cart
 def place_order_from_cart():
-    conn = connect_db()
-    c = conn.cursor()
-    
     try:
-        for item in st.session_state.cart:
-            # Check stock availability
-            c.execute("SELECT stock FROM medicines WHERE medicine_id = ?", (item['drug_id'],))
-            stock = c.fetchone()[0]
-            
-            if stock < item['quantity']:
-                st.error(f"Insufficient stock for {item['drug_name']}. Available: {stock}")
-                return
-            
-            # Insert order into the database
-            c.execute("INSERT INTO orders (order_date, customer_id, drug_id, quantity, total_amount) VALUES (?, ?, ?, ?, ?)",
-                      (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), st.session_state['user_id'], item['drug_id'], item['quantity'], item['total']))
-            
-            # Update stock
-            c.execute("UPDATE medicines SET stock = stock - ? WHERE medicine_id = ?", (item['quantity'], item['drug_id']))
-        
-        conn.commit()
+        # Checkouts from every session in this process go through one writer thread
+        writer.run(orders.place_order, st.session_state['user_id'], st.session_state.cart)
+        dashboard.invalidate(st.session_state['user_id'])  # "Recently ordered" changes with this order
         st.toast("Order placed successfully! 🎉", icon="✅")  # Toast message
         st.session_state.cart = []  # Clear the cart immediately
-        st.rerun()  # Rerun the app to reflect the empty cart
+        save_cart()
+        st.rerun()  # Full rerun, since stock levels on every page have changed
+    except orders.InsufficientStock as e:
+        st.error(str(e))
     except Exception as e:
         st.error(f"Error placing order: {e}")
-    finally:
-        conn.close()
 
 # View Drugs
-from datetime import datetime, timedelta  # Ensure timedelta is imported
-
-# Helper function to get drugs near expiry
-def get_drugs_near_expiry(threshold_days=90):
-    """
-    Fetch drugs that are near expiry (within the specified threshold).
-    """
-    conn = connect_db()
-    c = conn.cursor()
-    
-    # Calculate the expiry threshold date
-    threshold_date = (datetime.now() + timedelta(days=threshold_days)).strftime('%Y-%m-%d')
-    
-    # Query drugs expiring within the threshold
-    c.execute("SELECT * FROM medicines WHERE expiry_date <= ? AND expiry_date >= ?", 
-              (threshold_date, datetime.now().strftime('%Y-%m-%d')))
-    drugs_near_expiry = c.fetchall()
-    
-    conn.close()
-    return drugs_near_expiry
-
-# Helper function to get expired drugs
-def get_expired_drugs():
-    """
-    Fetch drugs that have already expired.
-    """
-    conn = connect_db()
-    c = conn.cursor()
-    
-    # Calculate today's date
-    today = datetime.now().strftime('%Y-%m-%d')
-    
-    # Query drugs that have expired
-    c.execute("SELECT * FROM medicines WHERE expiry_date < ?", (today,))
-    expired_drugs = c.fetchall()
-    
-    conn.close()
-    return expired_drugs
-
 def view_drugs():
     st.subheader("Manage Drugs")
     
-    # Fetch all drugs from the database
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM medicines")
-    drugs = c.fetchall()
-    conn.close()
+    # Fetch the catalog (cached per catalog version; a reload reads a snapshot from the read pool)
+    with readers.snapshot() as conn:
+        compact = catalog.compact_catalog(conn)
+    # Expiry alerts are filters over the cached catalog's columns, not extra queries
+    # One "today" for the alerts and every card on this render
+    today = date.today()
+    drugs = compact.select()
+    drugs_near_expiry = compact.select(compact.expiring_within(90, today))
+    expired_drugs = compact.select(compact.expired(today))
 
     # Display expiry alerts at the top
     st.markdown("### ⚠️ Expiry Alerts")
-    drugs_near_expiry = get_drugs_near_expiry(threshold_days=90)
-    expired_drugs = get_expired_drugs()
     
     if drugs_near_expiry or expired_drugs:
         # Create columns for better organization
@@ -422,80 +394,108 @@ def view_drugs():
                 st.error(f"**{len(expired_drugs)} drugs have expired!**")
                 for drug in expired_drugs:
                     st.markdown(f"❌ **{drug[1]}** (Expired on: {drug[3]})")
+                if st.button("🗑️ Write Off Expired Stock"):
+                    conn = connect_db()
+                    written_off = ledger.write_off_expired(conn)
+                    conn.close()
+                    st.toast(f"Wrote off stock for {written_off} expired drug(s).", icon="✅")
+                    st.rerun()
         
         with col2:
             if drugs_near_expiry:
                 st.warning(f"**{len(drugs_near_expiry)} drugs are near expiry!**")
-                for drug in drugs_near_expiry:
-                    expiry_date = datetime.strptime(drug[3], '%Y-%m-%d')
-                    days_to_expiry = (expiry_date - datetime.now()).days
+                near_expiry_days = inventory.grid_status(drugs_near_expiry, today)
+                for drug, (_, days_to_expiry, _) in zip(drugs_near_expiry, near_expiry_days):
                     st.markdown(f"⚠️ **{drug[1]}** (Expiry: {drug[3]}, {days_to_expiry} days remaining)")
     else:
         st.success("No drugs are near expiry or expired.")
     
+    # Stock ledger checks
+    with st.expander("📒 Stock Ledger"):
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Reconcile Stock", use_container_width=True):
+                conn = connect_db()
+                mismatches = ledger.reconcile(conn)
+                conn.close()
+                if mismatches:
+                    st.error(f"{len(mismatches)} drug(s) disagree with the ledger.")
+                    st.dataframe(pd.DataFrame(mismatches, columns=["ID", "Name", "Stock", "Ledger Stock"]),
+                                 use_container_width=True)
+                else:
+                    st.success("Stock matches the ledger for every drug.")
+        with col2:
+            if st.button("Take Snapshot", use_container_width=True):
+                conn = connect_db()
+                snapshot_id = ledger.take_snapshot(conn)
+                conn.close()
+                st.toast(f"Snapshot {snapshot_id} taken.", icon="✅")
+
     st.markdown("---")
 
     # Display drugs in a grid with edit and delete options
     cols_per_row = 4  # Number of columns per row
     cols = st.columns(cols_per_row)  # Create columns for the grid
+    # Admin cards flag expired drugs red and those within 90 days orange
+    statuses = inventory.grid_status(drugs, today, expiry_red_below=0, expiry_orange_below=90)
 
-    for idx, drug in enumerate(drugs):
+    for idx, (drug, status) in enumerate(zip(drugs, statuses)):
         with cols[idx % cols_per_row]:
-            # Card-like layout for each drug
-            with st.container():
-                # Highlight expired drugs with a red border
-                expiry_date = datetime.strptime(drug[3], '%Y-%m-%d')
-                days_to_expiry = (expiry_date - datetime.now()).days
-        
-                
-                st.image("static\\bottle_blue.svg", caption=drug[1], width=100)  # Drug image
-                st.write(f"*Price:* ₹{drug[4]:.2f}")
-                st.write(f"*Stock:* {drug[2]}")
-                
-                # Expiry date with color-coded warning
-                expiry_color = "red" if days_to_expiry < 0 else "orange" if days_to_expiry < 90 else "green"
-                st.markdown(f"*Expiry:* <span style='color: {expiry_color}'>{drug[3]}</span>", unsafe_allow_html=True)
-                
-                # Pop-up for detailed information
-                with st.popover("More Info"):
-                    description = drug_info.get(drug[1], "Description not available.")
-                    st.markdown(f"### {drug[1]} Details")
-                    st.markdown(description)
-                
-                # Edit and Delete buttons
-                with st.popover("Edit/Delete Drug"):
-                    with st.form(key=f"edit_form_{drug[0]}"):
-                        new_name = st.text_input("Name", value=drug[1], key=f"name_{drug[0]}")
-                        new_stock = st.number_input("Stock", value=drug[2], min_value=0, key=f"stock_{drug[0]}")
-                        new_expiry = st.date_input("Expiry Date", value=datetime.strptime(drug[3], '%Y-%m-%d').date(), key=f"expiry_{drug[0]}")
-                        new_price = st.number_input("Price (₹)", value=drug[4], min_value=0.0, format="%.2f", key=f"price_{drug[0]}")
-
-                        # Submit button for editing
-                        if st.form_submit_button("Save Changes"):
-                            conn = connect_db()
-                            c = conn.cursor()
-                            c.execute("""
-                                UPDATE medicines 
-                                SET name = ?, stock = ?, expiry_date = ?, price = ?
-                                WHERE medicine_id = ?
-                            """, (new_name, new_stock, new_expiry.strftime('%Y-%m-%d'), new_price, drug[0]))
-                            conn.commit()
-                            conn.close()
-                            st.toast(f"Updated {new_name} successfully!", icon="✅")
-                            st.rerun()
+            admin_drug_card(drug, status)
 
-                    # Delete button
-                    if st.button(f"Delete {drug[1]}", key=f"delete_{drug[0]}"):
-                        conn = connect_db()
-                        c = conn.cursor()
-                        c.execute("DELETE FROM medicines WHERE medicine_id = ?", (drug[0],))
-                        conn.commit()
-                        conn.close()
-                        st.toast(f"Deleted {drug[1]} successfully!", icon="✅")
-                        st.rerun()
+# Admin Drug Card with Edit and Delete Options (reruns on its own)
+@st.fragment
+@timed("fragment")
+def admin_drug_card(drug, status):
+    _, _, expiry_color = status
+    # Card-like layout for each drug
+    with st.container():
+        st.markdown(image_html(drug_thumbnail_url(drug[0], drug[1]), caption=drug[1]), unsafe_allow_html=True)  # Drug image
+        st.write(f"*Price:* ₹{drug[4]:.2f}")
+        st.write(f"*Stock:* {drug[2]}")
+
+        # Expiry date with color-coded warning
+        st.markdown(f"*Expiry:* <span style='color: {expiry_color}'>{drug[3]}</span>", unsafe_allow_html=True)
+
+        # Pop-up for detailed information
+        if st.button("More Info", key=f"admin_info_{drug[0]}"):
+            show_drug_info(drug[0])
+
+        # Edit and Delete buttons
+        with st.popover("Edit/Delete Drug"):
+            with st.form(key=f"edit_form_{drug[0]}"):
+                new_name = st.text_input("Name", value=drug[1], key=f"name_{drug[0]}")
+                new_stock = st.number_input("Stock", value=drug[2], min_value=0, key=f"stock_{drug[0]}")
+                new_expiry = st.date_input("Expiry Date", value=date.fromisoformat(drug[3]), key=f"expiry_{drug[0]}")
+                new_price = st.number_input("Price (₹)", value=drug[4], min_value=0.0, format="%.2f", key=f"price_{drug[0]}")
+
+                # Submit button for editing
+                if st.form_submit_button("Save Changes"):
+                    conn = connect_db()
+                    catalog.update_medicine(conn, drug[0], new_name, new_stock, new_expiry, new_price)
+                    conn.close()
+                    st.toast(f"Updated {new_name} successfully!", icon="✅")
+                    st.rerun()
+
+            # Restock (recorded in the stock ledger)
+            restock_quantity = st.number_input("Units Received", min_value=1, step=1, key=f"restock_qty_{drug[0]}")
+            if st.button("Restock", key=f"restock_{drug[0]}"):
+                conn = connect_db()
+                ledger.restock(conn, drug[0], restock_quantity, note="received")
+                conn.close()
+                st.toast(f"Added {restock_quantity} units of {drug[1]}!", icon="✅")
+                st.rerun()
+
+            # Delete button
+            if st.button(f"Delete {drug[1]}", key=f"delete_{drug[0]}"):
+                conn = connect_db()
+                catalog.delete_medicine(conn, drug[0])
+                conn.close()
+                st.toast(f"Deleted {drug[1]} successfully!", icon="✅")
+                st.rerun()
 
-                st.markdown("</div>", unsafe_allow_html=True)  # Close the container
-                st.markdown("---")
+        st.markdown("</div>", unsafe_allow_html=True)  # Close the container
+        st.markdown("---")
 
 
 # Add Drug
@@ -506,13 +506,11 @@ def add_drug():
         stock = st.number_input("Stock Quantity", min_value=0, step=1)
         expiry_date = st.date_input("Expiry Date")
         price = st.number_input("Price (₹)", min_value=0.0, format="%.2f")
+        info = st.text_area("Drug Description (Markdown)")
 
         if st.form_submit_button("Add Drug"):
             conn = connect_db()
-            c = conn.cursor()
-            c.execute("INSERT INTO medicines (name, stock, expiry_date, price) VALUES (?, ?, ?, ?)", 
-                      (name, stock, expiry_date.strftime('%Y-%m-%d'), price))
-            conn.commit()
+            catalog.add_medicine(conn, name, stock, expiry_date, price, info)
             conn.close()
             st.toast("Drug added successfully!", icon="✅")
 
@@ -526,16 +524,11 @@ def manage_users():
 
         if st.form_submit_button("Add User"):
             conn = connect_db()
-            c = conn.cursor()
             try:
-                c.execute("SELECT * FROM users WHERE username = ?", (new_username,))
-                if c.fetchone():
-                    st.error("Username already exists. Please choose a different username.")
-                else:
-                    c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                              (new_username, new_password, new_role))
-                    conn.commit()
-                    st.toast(f"User '{new_username}' added successfully!", icon="✅")
+                users.create_user(conn, new_username, new_password, new_role)
+                st.toast(f"User '{new_username}' added successfully!", icon="✅")
+            except users.UsernameTaken as e:
+                st.error(str(e))
             except Exception as e:
                 st.error(f"Error adding user: {e}")
             finally:
@@ -546,10 +539,8 @@ def manage_users():
         user_id_to_remove = st.number_input("Enter User ID to Remove", min_value=1, step=1)
         if st.form_submit_button("Remove User"):
             conn = connect_db()
-            c = conn.cursor()
             try:
-                c.execute("DELETE FROM users WHERE user_id = ?", (user_id_to_remove,))
-                conn.commit()
+                users.delete_user(conn, user_id_to_remove)
                 st.toast(f"User with ID {user_id_to_remove} removed successfully!", icon="✅")
             except Exception as e:
                 st.error(f"Error removing user: {e}")
@@ -557,14 +548,12 @@ def manage_users():
                 conn.close()
             st.rerun()
 
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users")
-    users = c.fetchall()
-    conn.close()
+    # Reports read a snapshot from the read pool, never the connection checkout writes on
+    with readers.snapshot() as conn:
+        user_rows = users.list_users(conn)
 
-    if users:
-        users_df = pd.DataFrame(users, columns=["ID", "Username", "Password", "Role"])
+    if user_rows:
+        users_df = pd.DataFrame(user_rows, columns=["ID", "Username", "Role"])
         st.dataframe(users_df, use_container_width=True)
     else:
         st.write("No users found.")
@@ -572,27 +561,212 @@ def manage_users():
 # View Orders
 def view_orders():
     st.subheader("View Orders")
+    with readers.snapshot() as conn:
+        order_rows = orders.all_orders(conn)
+
+    orders_df = pd.DataFrame(order_rows, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
+    st.dataframe(orders_df, use_container_width=True)
+
+# Add a drug to the counter basket, merging repeat scans of the same drug
+def add_to_pos_basket(drug, quantity):
+    # Drugs without an expiry date on file can still be sold
+    if drug[3] and drug[3] < datetime.now().strftime('%Y-%m-%d'):
+        st.error(f"{drug[1]} expired on {drug[3]} and can't be sold.")
+        return
+    item = next((item for item in st.session_state.pos_basket if item['drug_id'] == drug[0]), None)
+    in_basket = item['quantity'] if item else 0
+    stock = drug[2] or 0
+    if in_basket + quantity > stock:
+        st.error(f"Only {stock} units of {drug[1]} in stock.")
+        return
+    if item:
+        item['quantity'] += quantity
+        item['total'] = item['quantity'] * item['price']
+    else:
+        st.session_state.pos_basket.append({
+            'drug_id': drug[0],
+            'drug_name': drug[1],
+            'quantity': quantity,
+            'price': drug[4],
+            'total': quantity * drug[4]
+        })
+    st.toast(f"{quantity} x {drug[1]}", icon="➕")
+
+# Point of Sale (a fragment: scanning an item reruns only this page, and the
+# lookup is served from an in-memory index rather than a query)
+@st.fragment
+@timed("fragment")
+def point_of_sale():
+    st.subheader("🧾 Point of Sale")
+    if 'pos_basket' not in st.session_state:
+        st.session_state.pos_basket = []
+        st.session_state.pos_matches = []
+
+    # Scan a code or type a name, then press Enter
+    with st.form("pos_scan_form", clear_on_submit=True):
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            query = st.text_input("Scan code or type a name", placeholder="e.g. 42 or dolo 650")
+        with col2:
+            quantity = st.number_input("Qty", min_value=1, step=1)
+        scanned = st.form_submit_button("Add ⏎")
+
+    if scanned and query.strip():
+        conn = connect_db()
+        with timer("stage", "pos_lookup"):
+            matches = pos.search(conn, query)
+        conn.close()
+        st.session_state.pos_matches = []
+        if len(matches) == 1:
+            add_to_pos_basket(matches[0], quantity)
+        elif matches:
+            st.session_state.pos_matches = [(drug, quantity) for drug in matches]
+        else:
+            st.warning(f"No drug matches '{query}'.")
+
+    # Several drugs matched the prefix: pick one
+    if st.session_state.pos_matches:
+        st.caption("Several drugs match. Pick one:")
+        for drug, pick_quantity in st.session_state.pos_matches:
+            if st.button(f"{drug[1]} · ₹{drug[4]:,.2f} · {drug[2]} in stock", key=f"pos_pick_{drug[0]}"):
+                add_to_pos_basket(drug, pick_quantity)
+                st.session_state.pos_matches = []
+                st.rerun(scope="fragment")
+
+    st.markdown("---")
+    basket = st.session_state.pos_basket
+    if not basket:
+        st.info("Basket is empty. Scan an item to start a sale.")
+        return
+
+    basket_df = pd.DataFrame(basket, columns=["drug_name", "quantity", "price", "total"])
+    basket_df.columns = ["Drug", "Qty", "Price (₹)", "Total (₹)"]
+    st.dataframe(basket_df, use_container_width=True)
+    total_amount = sum(item['total'] for item in basket)
+    st.markdown(f"### **Total: ₹{total_amount:,.2f}**")
+
+    customer_name = st.text_input("Customer username (leave blank for walk-in)", key="pos_customer")
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        if st.button("✅ Complete Sale", use_container_width=True, type="primary"):
+            conn = connect_db()
+            customer = users.find_user(conn, customer_name.strip()) if customer_name.strip() else None
+            conn.close()
+            if customer_name.strip() and not customer:
+                st.error(f"No user named '{customer_name}'.")
+            else:
+                try:
+                    # The whole basket is one transaction on this process's writer thread;
+                    # if it fails nothing was written and the basket is kept as it was
+                    writer.run(orders.place_order, customer[0] if customer else None, basket)
+                    if customer:
+                        dashboard.invalidate(customer[0])  # Their "Recently ordered", as after a checkout
+                    st.session_state.pos_basket = []
+                    st.toast(f"Sale completed: ₹{total_amount:,.2f}", icon="✅")
+                    st.rerun(scope="fragment")
+                except orders.InsufficientStock as e:
+                    st.error(str(e))
+                except Exception as e:
+                    st.error(f"Error completing sale: {e}")
+    with col2:
+        if st.button("↩️ Remove Last", use_container_width=True):
+            basket.pop()
+            st.rerun(scope="fragment")
+    with col3:
+        if st.button("🗑️ Clear", use_container_width=True):
+            st.session_state.pos_basket = []
+            st.rerun(scope="fragment")
+
+# Database file stats and maintenance runs (admin only, SQLite backend)
+def database_section():
+    st.markdown("### 🗄️ Database")
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("""
-        SELECT orders.order_id, orders.order_date, medicines.name, orders.quantity, orders.total_amount 
-        FROM orders 
-        JOIN medicines ON orders.drug_id = medicines.medicine_id
-    """)
-    orders = c.fetchall()
+    file_stats = maintenance.database_stats(conn)
+    runs = maintenance.last_runs(conn)
     conn.close()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Size", f"{file_stats['size_bytes'] / 2**20:,.1f} MB")
+    col2.metric("WAL", f"{file_stats['wal_bytes'] / 2**20:,.1f} MB")
+    col3.metric("Free pages", f"{file_stats['free_pages']:,}", f"{file_stats['fragmentation']:.1%} of file",
+                delta_color="off")
+    # The configured limit, not a hit rate: SQLite exposes no cache hit counters through Python
+    col4.metric("Page cache budget", f"{file_stats['cache_bytes'] / 2**20:,.1f} MB", "per connection",
+                delta_color="off")
+    st.caption(f"Auto-vacuum: {file_stats['auto_vacuum']} · page size {file_stats['page_size']:,} bytes · "
+               f"the page cache budget is the most each connection may hold, not how much it uses.")
+    if runs:
+        runs_df = pd.DataFrame(runs, columns=["Task", "Last Run", "Seconds", "Result"])
+        st.dataframe(runs_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No maintenance has run yet; it runs once the database has been quiet for "
+                f"{maintenance.QUIET_SECONDS} seconds.")
+    for col, task in zip(st.columns(len(maintenance.TASKS)), maintenance.TASKS):
+        if col.button(f"Run {task} now", key=f"maintenance_{task}", use_container_width=True):
+            conn = connect_db()
+            with st.spinner(f"Running {task}..."):
+                result = maintenance.run_task(conn, task)
+            conn.close()
+            if result.startswith("ok"):
+                st.toast(f"{task}: {result}", icon="✅")
+            else:
+                st.error(f"{task}: {result}")
 
-    orders_df = pd.DataFrame(orders, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
-    st.dataframe(orders_df, use_container_width=True)
+# Performance (admin only)
+def performance_page():
+    st.subheader("Performance")
+    st.caption("Timings for this server process. Percentiles cover the most recent "
+               f"{perf.SAMPLE_WINDOW} samples of each query, stage or page.")
+
+    rows = perf.stats()
+    if not rows:
+        st.info("No timings recorded yet.")
+        return
+
+    kinds = ["all"] + sorted({row['kind'] for row in rows})
+    kind = st.selectbox("Show", kinds)
+    stats_df = pd.DataFrame([row for row in rows if kind == "all" or row['kind'] == kind])
+    stats_df.columns = ["Type", "Name", "Count", "Errors", "p50 (ms)", "p95 (ms)", "Max (ms)", "Total (ms)"]
+    st.dataframe(stats_df, use_container_width=True, hide_index=True)
+
+    # Slow query log with query plans
+    st.markdown(f"### 🐢 Slow Queries (over {perf.SLOW_QUERY_SECONDS * 1000:.0f} ms)")
+    slow_queries = perf.slow_queries()
+    if not slow_queries:
+        st.success("No slow queries recorded.")
+    else:
+        conn = connect_db()
+        for query in slow_queries:
+            with st.expander(f"{query['ms']:.1f} ms at {query['at']}: {query['sql'][:80]}"):
+                st.code(query['sql'], language="sql")
+                try:
+                    plan = perf.explain(conn, query['sql'], query['params'])
+                except sqlite3.Error as e:
+                    plan = [f"No query plan: {e}"]
+                st.markdown("*Query plan:*")
+                st.code("\n".join(plan))
+        conn.close()
+
+    # Database file and maintenance (a PostgreSQL server looks after its own)
+    if db.BACKEND == "sqlite":
+        database_section()
+
+    # Prometheus export
+    st.markdown("### Prometheus Metrics")
+    metrics = perf.render_prometheus()
+    st.download_button("Download metrics", metrics, file_name="dawakhana.prom", mime="text/plain")
+    with st.expander("Show metrics"):
+        st.code(metrics)
 
 # Customer Dashboard
 def customer_dashboard():
-    st.sidebar.image("static/pills_bottle_logo.svg")
+    st.sidebar.markdown(image_html(static_url("pills_bottle_logo.png"), width=118), unsafe_allow_html=True)
     st.sidebar.header("Dawakhana")
     st.sidebar.button("Logout", on_click=logout)
+    with st.sidebar:
+        cart_badge()
 
     # Remove "Search Drugs" from the menu options
-    menu_options = ["Buy Drugs", "Order History", "Upload Prescription", "View Cart"]
+    menu_options = ["Home", "Buy Drugs", "Order History", "Upload Prescription", "Prescriptions", "View Cart"]
     selected_option = st.sidebar.radio("Navigate", menu_options)
 
     if 'username' in st.session_state:
@@ -600,14 +774,61 @@ def customer_dashboard():
         st.title(f"{username}'s Dashboard")
     st.markdown("---")
     
-    if selected_option == "Buy Drugs":
-        buy_drugs()
-    elif selected_option == "Order History":
-        view_order_history()
-    elif selected_option == "Upload Prescription":
-        upload_prescription()
-    elif selected_option == "View Cart":
-        view_cart()
+    with timer("page", selected_option):
+        if selected_option == "Home":
+            customer_home()
+        elif selected_option == "Buy Drugs":
+            buy_drugs()
+        elif selected_option == "Order History":
+            view_order_history()
+        elif selected_option == "Upload Prescription":
+            upload_prescription()
+        elif selected_option == "Prescriptions":
+            view_prescriptions()
+        elif selected_option == "View Cart":
+            view_cart()
+
+# Stock flag for a landing page tile, or "" when there's plenty
+def low_stock_flag(stock):
+    if stock == 0:
+        return " · :red[Out of stock]"
+    if stock <= inventory.STOCK_ORANGE_ABOVE:
+        return f" · :orange[Only {stock} left]"
+    return ""
+
+# Customer Home (a fragment, so Reorder only redraws this page). Reads the
+# per-customer dashboard cache, so the first paint doesn't load the catalog.
+@st.fragment
+@timed("fragment")
+def customer_home():
+    conn = connect_db()
+    home = dashboard.customer_dashboard(conn, st.session_state['user_id'])
+    conn.close()
+
+    st.subheader("🔁 Recently Ordered")
+    if not home["recent"]:
+        st.info("You haven't ordered anything yet. Browse Buy Drugs to get started.")
+    for drug, quantity, last_ordered in home["recent"]:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(f"**{drug[1]}** · ₹{drug[4]:,.2f} · last ordered {quantity} on {last_ordered[:10]}"
+                        f"{low_stock_flag(drug[2])}")
+        with col2:
+            if st.button(f"Reorder {quantity}", key=f"reorder_{drug[0]}", disabled=drug[2] < quantity,
+                         use_container_width=True):
+                add_to_cart(drug, quantity)
+
+    st.markdown("---")
+    st.subheader("🔥 Top Sellers")
+    if not home["top_sellers"]:
+        st.info("No sales in the last month yet.")
+    cols_per_row = 4
+    cols = st.columns(cols_per_row)
+    for idx, (drug, units) in enumerate(home["top_sellers"]):
+        with cols[idx % cols_per_row]:
+            st.markdown(f"**{drug[1]}**  \n₹{drug[4]:,.2f} · {units} sold{low_stock_flag(drug[2])}")
+            if st.button("🛒 Add 1", key=f"top_add_{drug[0]}", disabled=drug[2] == 0):
+                add_to_cart(drug, 1)
 
 # Buy Drugs with Search Functionality
 def buy_drugs():
@@ -617,155 +838,349 @@ def buy_drugs():
     search_query = st.text_input("Search for drugs by name", placeholder="Enter drug names (comma-separated)")
     st.write("\n\n\n")
     conn = connect_db()
-    c = conn.cursor()
     
     if search_query:
         # If a search query is provided, filter the drugs
         drug_names = [name.strip() for name in search_query.split(',')]
-        query = f"SELECT * FROM medicines WHERE name IN ({','.join(['?'] * len(drug_names))})"
-        c.execute(query, drug_names)
-        drugs = c.fetchall()
+        drugs = catalog.find_by_names(conn, drug_names)
     else:
         # If no search query, display all drugs
-        c.execute("SELECT * FROM medicines")
-        drugs = c.fetchall()
+        drugs = catalog.cached_medicines(conn)
     
     conn.close()
 
     # Display the drugs in a grid
     display_drugs_grid(drugs)
 
-# View Order History
+# View Order History (newest first, one page at a time)
 def view_order_history():
     st.subheader("Order History")
+    view = st.radio("Show", ["Items", "Baskets"], horizontal=True)
+
+    # The last row of every page visited so far; the current page starts after the last one
+    cursors = st.session_state.setdefault(f"history_cursors_{view}", [None])
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("""
-        SELECT orders.order_id, orders.order_date, medicines.name, orders.quantity, orders.total_amount 
-        FROM orders 
-        JOIN medicines ON orders.drug_id = medicines.medicine_id 
-        WHERE orders.customer_id = ?
-    """, (st.session_state['user_id'],))
-    orders = c.fetchall()
+    if view == "Items":
+        rows = orders.customer_orders_page(conn, st.session_state['user_id'], after=cursors[-1])
+        columns = ["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"]
+    else:
+        rows = orders.customer_baskets_page(conn, st.session_state['user_id'], after=cursors[-1])
+        columns = ["Order Date", "Items", "Units", "Total Amount"]
     conn.close()
 
-    orders_df = pd.DataFrame(orders, columns=["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"])
+    orders_df = pd.DataFrame(rows, columns=columns)
     st.dataframe(orders_df, use_container_width=True)
 
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("← Newer", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Older →", disabled=len(rows) < orders.HISTORY_PAGE_SIZE, use_container_width=True):
+            cursors.append(rows[-1])
+            st.rerun()
+    with col3:
+        st.caption(f"Page {len(cursors)}")
+
+    # Exports are only built when asked for
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Export full history as CSV", use_container_width=True):
+            offer_export(orders.export_orders_csv, "order_history.csv", "text/csv")
+    with col2:
+        if st.button("Export full history as PDF", use_container_width=True):
+            offer_export(orders.export_orders_pdf, "order_history.pdf", "application/pdf")
+
+# Build an order history export and offer it for download. Streamlit holds the
+# whole file in server memory to serve it; the API's /orders/export.csv streams it.
+def offer_export(export, file_name, mime):
+    conn = connect_db()
+    data = b"".join(chunk.encode() if isinstance(chunk, str) else chunk
+                    for chunk in export(conn, st.session_state['user_id']))
+    conn.close()
+    st.download_button(f"Download {file_name}", data=data, file_name=file_name, mime=mime)
+    st.caption("This download is built in full on the server first. For a very long history, "
+               "GET /orders/export.csv (or .pdf) from the API streams it instead.")
+
+# Put a stored prescription's drugs in the cart (one query, no OCR or extraction)
+def refill_prescription(prescription_id):
+    conn = connect_db()
+    items, unavailable = prescriptions.refill_cart(conn, st.session_state['user_id'], prescription_id)
+    conn.close()
+    if items:
+        carts.merge_items(st.session_state.setdefault('cart', []), items)
+        save_cart()
+        st.toast(f"Added {len(items)} drug(s) from prescription #{prescription_id} to your cart!", icon="✅")
+    if unavailable:
+        st.warning(f"Not available right now: {', '.join(unavailable)}")
+
+# Past Prescriptions (newest first, one page at a time) with one-click refill
+def view_prescriptions():
+    st.subheader("Prescriptions")
+
+    cursors = st.session_state.setdefault("prescription_cursors", [None])
+    conn = connect_db()
+    rows = prescriptions.customer_prescriptions(conn, st.session_state['user_id'], after=cursors[-1])
+    conn.close()
+
+    if not rows and len(cursors) == 1:
+        st.info("No prescriptions yet. Upload one to have it saved here.")
+        return
+    for prescription_id, uploaded_at, doctor_name, patient_name, drugs in rows:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(f"**#{prescription_id}** · {uploaded_at[:10]} · Dr. {doctor_name or '-'} · "
+                        f"Patient: {patient_name or '-'}  \n{drugs or 'No drugs recognised'}")
+        with col2:
+            if st.button("🔁 Refill", key=f"refill_{prescription_id}", disabled=not drugs, use_container_width=True):
+                refill_prescription(prescription_id)
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("← Newer", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Older →", disabled=len(rows) < prescriptions.PAGE_SIZE, use_container_width=True):
+            cursors.append(rows[-1])
+            st.rerun()
+    with col3:
+        st.caption(f"Page {len(cursors)}")
+
 import json
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+
+# Remote LLM extraction is optional: offered only when a Groq API key is configured
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+
+# Ask the LLM for the entities of a (short) span of prescription text
+def llm_entities(text):
+    from langchain_groq import ChatGroq
+    from langchain_core.prompts import ChatPromptTemplate
+
+    llm = ChatGroq(groq_api_key=GROQ_API_KEY, model_name="Llama3-8b-8192")
+    
+    # Define the prompt for entity extraction
+    prompt = ChatPromptTemplate.from_template("""
+        Extract the following entities from the provided text:
+        - Doctor's name
+        - Patient's name
+        - Drug name
+        - Quantity
+
+        Text: {text}
+
+        Structure the extracted entities in the following JSON format:
+        {{
+            "doctor_name": "Extracted Doctor's Name",
+            "patient_name": "Extracted Patient's Name",
+            "drug_name": ["List", "of", "Drug", "Names"],
+            "quantity": ["List", "of", "Quantities"]
+        }}
+
+        Provide only the JSON output with no additional text or explanations.
+    """)
+    
+    # Format the prompt with the extracted text
+    messages = prompt.format_messages(text=text)
+    # Invoke the LLM to extract entities
+    with timer("stage", "llm"):
+        response = llm.invoke(messages)
+    return json.loads(response.content)
+
+# Read an uploaded prescription into `cache`, its entry in session state, showing
+# each stage as it completes. Pages read before a rerun interrupted the page are
+# not read again, and a customer's re-upload of their own stored prescription
+# stops after the first page is preprocessed. Returns False if nothing could be read.
+def read_prescription(uploaded_file, cache):
+    cache.setdefault("entities", {})
+    cache.setdefault("prompts", [])  # Per page read: only the medication section and name lines go to the LLM
+    # The page being read replaces the previous one, so only one is held at a time
+    page_preview = st.empty()
+    conn = connect_db()
+
+    def match(drug_names):
+        with timer("stage", "drug_match"):
+            return [row[0] for row in catalog.find_matching(conn, drug_names)]
+
+    pipeline = prescription_pipeline(uploaded_file, lambda text: entities.extract(conn, text), match,
+                                     found=cache["entities"], start_page=len(cache["prompts"]) + 1)
+
+    # Progress lines for st.write_stream, written as the pipeline's events arrive
+    def progress():
+        for stage, page_number, payload in pipeline:
+            if stage == PREPROCESSED:
+                page_preview.image(payload, caption=f"Uploaded Prescription, page {page_number}",
+                                   use_container_width=True)
+                if page_number == 1 and "image_hash" not in cache:
+                    # A re-upload (even re-compressed or re-cropped) is flagged. The customer's own
+                    # reuses the stored extraction; another customer's is read, and never shown
+                    cache["image_hash"] = prescription_hash(payload)
+                    duplicate = prescriptions.find_duplicate(conn, cache["image_hash"])
+                    if duplicate is not None and duplicate[1] == st.session_state['user_id']:
+                        pipeline.close()
+                        cache["reused_from"] = duplicate[0]
+                        cache["entities"] = prescriptions.entities_of(conn, duplicate[0])
+                        cache["matches"] = match(cache["entities"]["drug_name"])
+                        yield f"Already on file as your prescription #{duplicate[0]}; its details are reused.\n\n"
+                        return
+                    if duplicate is not None:
+                        cache["duplicate_of"] = duplicate[0]
+                status.update(label=f"Reading page {page_number}...")
+            elif stage == TEXT_READY:
+                page_prompt = prompt_span(payload)
+                yield f"**Page {page_number}:** {len(payload.lines(payload.confident(MIN_CONFIDENCE)))} lines read. "
+            elif stage == ENTITIES_READY:
+                cache["prompts"].append(page_prompt)
+                yield (f"Drugs so far: {', '.join(payload['drug_name']) or 'none yet'} · "
+                       f"Doctor: {payload['doctor_name'] or '-'} · Patient: {payload['patient_name'] or '-'}\n\n")
+            elif stage == MATCHES_READY:
+                cache["matches"] = payload
+                yield f"{len(payload)} matching drug(s) in the catalog.\n\n"
+
+    try:
+        if "matches" not in cache:
+            with st.status("Reading prescription...", expanded=True) as status:
+                if cache["prompts"]:
+                    st.write(f"Resuming after page {len(cache['prompts'])}.")
+                try:
+                    st.write_stream(progress())
+                except Exception as e:
+                    status.update(label="Could not read the prescription.", state="error")
+                    st.error(f"Error extracting text: {e}")
+                    return False
+                status.update(label="Prescription read.", state="complete", expanded=False)
+
+        if cache.get("reused_from") is None and not "".join(cache["prompts"]).strip():
+            st.error("No text extracted from the image.")
+            return False
+        # Stored once, so it can be refilled later and recognised if uploaded again
+        if "prescription_id" not in cache:
+            if cache.get("reused_from") is not None:
+                cache["prescription_id"] = prescriptions.save_duplicate(
+                    conn, st.session_state['user_id'], cache["reused_from"], source=uploaded_file.name)
+            else:
+                cache["prescription_id"] = prescriptions.save_prescription(
+                    conn, st.session_state['user_id'], cache["entities"], source=uploaded_file.name,
+                    image_hash=cache.get("image_hash"), duplicate_of=cache.get("duplicate_of"))
+        return True
+    finally:
+        conn.close()
 
 def upload_prescription():
     st.subheader("Upload Prescription")
-    uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
+    uploaded_file = st.file_uploader("Choose an image, TIFF or PDF...", type=PRESCRIPTION_TYPES)
     
     if uploaded_file is not None:
-        # Display the uploaded image
-        image = Image.open(uploaded_file)
-        st.image(image, caption='Uploaded Prescription', use_container_width=True)
+        # Each stage is read once per upload; reruns of this page pick up where the last one stopped
+        cache = st.session_state.setdefault(f"prescription_{uploaded_file.file_id}", {})
+        if not read_prescription(uploaded_file, cache):
+            return
+        prescription_id = cache["prescription_id"]
+
+        if cache.get("reused_from") is not None:
+            st.warning(f"You uploaded this prescription before (#{cache['reused_from']}). Its details are "
+                       "reused, and the upload has been flagged for a pharmacist to review.")
+        elif cache.get("duplicate_of") is not None:
+            st.warning("This prescription looks like one already on file, so the upload has been flagged "
+                       "for a pharmacist to review.")
+
+        found_entities = cache["entities"]
+        matches = cache["matches"]
+        prompt = "\n".join(cache["prompts"]).strip()
+        if GROQ_API_KEY and prompt and st.checkbox("Refine with the LLM (sends the medication section to Groq)"):
+            if "llm_entities" not in cache:
+                with st.status("Asking the LLM...") as status:
+                    try:
+                        cache["llm_entities"] = llm_entities(prompt)
+                    except json.JSONDecodeError as e:
+                        status.update(label="The LLM's answer could not be read.", state="error")
+                        st.error(f"Failed to parse LLM response as JSON: {e}")
+                        return
+                    except Exception as e:
+                        status.update(label="The LLM request failed.", state="error")
+                        st.error(f"Error generating baseline response: {str(e)}")
+                        return
+                    status.update(label="LLM entities ready.", state="complete")
+            found_entities = cache["llm_entities"]
+            matches = None
+
+        # Display the extracted entities
+        st.subheader("Extracted Entities")
         
-        # Extract text from the image
-        extracted_text = extract_text_from_image(uploaded_file)
+        col1, col2 = st.columns(2)
         
-        if extracted_text:
-            # Initialize the LLM
-            GROQ_API_KEY = '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'
-            llm = ChatGroq(groq_api_key=GROQ_API_KEY, model_name="Llama3-8b-8192")
+        with col1:
+            st.markdown("*Doctor Name:*")
+            st.info(found_entities.get("doctor_name") or "No doctor name found.")
             
-            # Define the prompt for entity extraction
-            prompt = ChatPromptTemplate.from_template("""
-                Extract the following entities from the provided text:
-                - Doctor's name
-                - Patient's name
-                - Drug name
-                - Quantity
-
-                Text: {text}
-
-                Structure the extracted entities in the following JSON format:
-                {{
-                    "doctor_name": "Extracted Doctor's Name",
-                    "patient_name": "Extracted Patient's Name",
-                    "drug_name": ["List", "of", "Drug", "Names"],
-                    "quantity": ["List", "of", "Quantities"]
-                }}
-
-                Provide only the JSON output with no additional text or explanations.
-            """)
+            st.markdown("*Patient Name:*")
+            st.info(found_entities.get("patient_name") or "No patient name found.")
+        
+        with col2:
+            st.markdown("*Drug Name:*")
+            st.info(", ".join(found_entities.get("drug_name") or ["No drug name found."]))
             
-            try:
-                # Format the prompt with the extracted text
-                messages = prompt.format_messages(text=extracted_text)
-                # Invoke the LLM to extract entities
-                response = llm.invoke(messages)
-                
-                # Safely parse the response as JSON
-                try:
-                    entities = json.loads(response.content)
-                except json.JSONDecodeError as e:
-                    st.error(f"Failed to parse LLM response as JSON: {e}")
-                    st.error(f"LLM Response: {response.content}")
-                    return
-                
-                # Display the extracted entities
-                st.subheader("Extracted Entities")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("*Doctor Name:*")
-                    st.info(entities.get("doctor_name", "No doctor name found."))
-                    
-                    st.markdown("*Patient Name:*")
-                    st.info(entities.get("patient_name", "No patient name found."))
-                
-                with col2:
-                    st.markdown("*Drug Name:*")
-                    st.info(", ".join(entities.get("drug_name", ["No drug name found."])))
-                    
-                    st.markdown("*Quantity:*")
-                    st.info(", ".join(entities.get("quantity", ["No quantity found."])))
-                
-                # Check the database for identified drugs
-                if entities.get("drug_name"):
-                    st.subheader("Available Drugs in Database")
-                    conn = connect_db()
-                    c = conn.cursor()
-
-                    # Handle drug names as a list
-                    drug_names = entities["drug_name"]
-                    available_drugs = []
+            st.markdown("*Quantity:*")
+            st.info(", ".join(quantity or "?" for quantity in found_entities.get("quantity") or [])
+                    or "No quantity found.")
+        
+        # Check the database for identified drugs
+        if found_entities.get("drug_name"):
+            st.subheader("Available Drugs in Database")
+            conn = connect_db()
 
-                    # Search for each drug in the database
-                    for drug_name in drug_names:
-                        c.execute("SELECT * FROM medicines WHERE name LIKE ?", (f"%{drug_name}%",))
-                        result = c.fetchall()
-                        if result:
-                            available_drugs.extend(result)
+            # Matches found while reading are re-read by id for current stock; LLM names are searched afresh
+            if matches is None:
+                with timer("stage", "drug_match"):
+                    available_drugs = catalog.find_matching(conn, found_entities["drug_name"])
+            else:
+                available_drugs = catalog.get_medicines(conn, matches)
 
-                    conn.close()
+            conn.close()
 
-                    if available_drugs:
-                        # Display available drugs in a grid
-                        st.write("The following drugs are available in the database:")
-                        display_drugs_grid(available_drugs)
-                    else:
-                        st.warning("No matching drugs found in the database.")
-                else:
-                    st.warning("No drug name found in the extracted entities.")
-            
-            except Exception as e:
-                st.error(f"Error generating baseline response: {str(e)}")
-        
+            if available_drugs:
+                st.caption(f"Saved as prescription #{prescription_id}; refill it any time from Prescriptions.")
+                if st.button("🛒 Add prescription to cart"):
+                    refill_prescription(prescription_id)
+                # Display available drugs in a grid
+                st.write("The following drugs are available in the database:")
+                display_drugs_grid(available_drugs)
+            else:
+                st.warning("No matching drugs found in the database.")
         else:
-            st.error("No text extracted from the image.")
+            st.warning("No drug name found in the extracted entities.")
+
+# Prescription Review (re-uploads flagged by perceptual hash)
+def review_prescriptions():
+    st.subheader("Prescription Review")
+    conn = connect_db()
+    rows = prescriptions.flagged(conn)
+    conn.close()
+    if not rows:
+        st.success("No re-uploaded prescriptions waiting for review.")
+        return
+    st.caption("These uploads match a prescription already on file. Check the prescription isn't being reused.")
+    for prescription_id, uploaded_at, username, original_id, original_at, original_username in rows:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            same_customer = "same customer" if username == original_username else f"first uploaded by {original_username}"
+            st.markdown(f"**#{prescription_id}** by {username} on {uploaded_at} · matches #{original_id} "
+                        f"from {original_at} ({same_customer})")
+        with col2:
+            if st.button("Mark Reviewed", key=f"reviewed_{prescription_id}", use_container_width=True):
+                conn = connect_db()
+                prescriptions.mark_reviewed(conn, prescription_id)
+                conn.close()
+                st.rerun()
 
 # Main Logic
-if 'user_id' not in st.session_state:
-    login()
-else:
-    if st.session_state['role'] == 'admin':
-        admin_dashboard()
+with timer("rerun", st.session_state.get('role', 'login')):
+    if 'user_id' not in st.session_state:
+        login()
     else:
-        customer_dashboard()
+        if st.session_state['role'] == 'admin':
+            admin_dashboard()
+        else:
+            customer_dashboard()
+perf.maybe_write_prometheus()
@@ -0,0 +1,88 @@
+# assets.py
+import colorsys
+import hashlib
+import html
+import os
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Files in STATIC_DIR are served by Streamlit at STATIC_URL (see .streamlit/config.toml)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+THUMBS_DIR = os.path.join(STATIC_DIR, "thumbs")
+
+# Template for per-drug thumbnails: the shape of bottle_blue.svg as an alpha
+# mask, rendered at twice its size. Thumbnails are PNGs since Streamlit's static
+# handler serves SVG as text/plain, which browsers refuse to show in an <img>.
+BOTTLE_MASK = "bottle_mask.png"
+# Centre of the bottle's label, in mask pixels, and the initials' size
+LABEL_CENTER = (187, 538)
+LABEL_FONT_SIZE = 88
+
+_versions = {}  # filename -> content hash, computed once per process
+_thumbnails = set()  # thumbnail files known to exist on disk
+_lock = threading.Lock()
+
+
+def _file_version(filename):
+    with _lock:
+        if filename not in _versions:
+            with open(os.path.join(STATIC_DIR, filename), "rb") as f:
+                _versions[filename] = hashlib.sha1(f.read()).hexdigest()[:10]
+        return _versions[filename]
+
+
+def static_url(filename):
+    """
+    URL for a file under static/, with a content hash in the query string so
+    a browser never reuses its copy of a file that has since changed.
+    """
+    return f"{STATIC_URL}/{filename}?v={_file_version(filename)}"
+
+
+def _label_font():
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", LABEL_FONT_SIZE)
+    except OSError:
+        return ImageFont.load_default(LABEL_FONT_SIZE)
+
+
+def _thumbnail_png(name, path):
+    # Colour the bottle from the drug name and print its initials on the label
+    hue = int(hashlib.md5(name.encode()).hexdigest()[:4], 16) / 0xFFFF
+    r, g, b = colorsys.hls_to_rgb(hue, 0.68, 0.45)
+    initials = "".join(word[0] for word in name.split()[:2]).upper() or "?"
+    with Image.open(os.path.join(STATIC_DIR, BOTTLE_MASK)) as mask:
+        image = Image.new("RGBA", mask.size, (int(r * 255), int(g * 255), int(b * 255)))
+        image.putalpha(mask)
+    ImageDraw.Draw(image).text(LABEL_CENTER, initials, fill="white", font=_label_font(), anchor="ms")
+    image.save(path, format="PNG", optimize=True)
+
+
+def drug_thumbnail_url(drug_id, name):
+    """
+    URL of the card thumbnail for a drug, generating the file on first use.
+    The file name includes a hash of the drug name, so a renamed drug gets a
+    new URL instead of the old thumbnail.
+    """
+    filename = f"drug_{drug_id}_{hashlib.sha1(name.encode()).hexdigest()[:8]}.png"
+    path = os.path.join(THUMBS_DIR, filename)
+    if filename not in _thumbnails and not os.path.exists(path):
+        os.makedirs(THUMBS_DIR, exist_ok=True)
+        # Write to a temp file first so concurrent sessions never serve a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        _thumbnail_png(name, tmp_path)
+        os.replace(tmp_path, path)
+    _thumbnails.add(filename)
+    return f"{STATIC_URL}/thumbs/{filename}"
+
+
+def image_html(url, caption=None, width=100):
+    """
+    HTML for an image referenced by URL, for st.markdown(..., unsafe_allow_html=True).
+    Unlike st.image on a local file, only the URL is sent to the browser.
+    """
+    caption_html = f"<figcaption style='font-size: 14px; color: gray'>{html.escape(caption)}</figcaption>" if caption else ""
+    return (f"<figure style='margin: 0 0 1rem 0'><img src='{url}' width='{width}' loading='lazy' "
+            f"alt='{html.escape(caption or '')}'>{caption_html}</figure>")
@@ -0,0 +1,156 @@
+# Load test for the HTTP API (api.py) against a local uvicorn server.
+#
+# Usage: python benchmarks/api_load.py --medicines 10000 --clients 16 --requests 2000
+#
+# Starts `uvicorn api:app` on a copy of a synthetic fixture (see fixtures.py), then
+# has `--clients` threads, each holding one keep-alive connection, hit one endpoint
+# at a time. Reports requests/sec and latency per scenario; "catalog_304" sends
+# If-None-Match with the current ETag to measure conditional GETs.
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import fixtures  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", ".data")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(port, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit("uvicorn exited before it started listening")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    sys.exit("uvicorn did not start listening in time")
+
+
+def scenarios(params, etag):
+    """
+    Request factories, each returning (method, url, body, headers) for one request.
+    """
+    auth = base64.b64encode(f"user{params['admins']}:{fixtures.PASSWORD}".encode()).decode()
+    pages = max(1, params["medicines"] // 50)
+    return {
+        "catalog": lambda rng: ("GET", f"/medicines?page={rng.randint(1, pages)}", None, {}),
+        "catalog_304": lambda rng: ("GET", "/medicines?page=1", None, {"If-None-Match": etag}),
+        "search": lambda rng: ("GET", f"/medicines/search?q={rng.choice(fixtures.DRUG_STEMS)}", None, {}),
+        "stock": lambda rng: ("GET", f"/medicines/{rng.randint(1, params['medicines'])}/stock", None, {}),
+        "checkout": lambda rng: ("POST", "/orders", json.dumps(
+            {"items": [{"drug_id": rng.randint(1, params["medicines"]), "quantity": 1}]}),
+            {"Authorization": f"Basic {auth}", "Content-Type": "application/json"}),
+    }
+
+
+def run_scenario(port, make_request, clients, requests, seed):
+    latencies, statuses, lock = [], {}, threading.Lock()
+
+    def client(client_id, count):
+        rng = random.Random(seed * 1000 + client_id)
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        local, local_statuses = [], {}
+        for _ in range(count):
+            method, url, body, headers = make_request(rng)
+            start = time.perf_counter()
+            conn.request(method, url, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            local.append(time.perf_counter() - start)
+            local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            for status, n in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + n
+
+    per_client = [requests // clients + (1 if i < requests % clients else 0) for i in range(clients)]
+    threads = [threading.Thread(target=client, args=(i, n)) for i, n in enumerate(per_client) if n]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "statuses": statuses,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+        "requests_per_sec": len(latencies) / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the DawaKhana HTTP API on a local server.")
+    parser.add_argument("--medicines", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--checkout-requests", type=int, default=200,
+                        help="requests for the checkout scenario (each one pays the password KDF)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fixture = os.path.join(DATA_DIR, f"bench-{args.medicines}-{args.orders}-{args.users}-{args.seed}.db")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    params = fixtures.generate(fixture, args.medicines, args.orders, args.users, seed=args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_path = os.path.join(tmp, "api.db")
+        shutil.copyfile(fixture, work_path)
+        port = _free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning",
+             "--workers", str(args.workers)],
+            cwd=ROOT, env={**os.environ, "DAWAKHANA_DB": work_path})
+        try:
+            _wait_for(port, proc)
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            conn.request("GET", "/medicines?page=1")
+            response = conn.getresponse()
+            response.read()
+            etag = response.getheader("ETag")
+            conn.close()
+
+            report = {}
+            for name, make_request in scenarios(params, etag).items():
+                count = args.checkout_requests if name == "checkout" else args.requests
+                result = run_scenario(port, make_request, args.clients, count, args.seed)
+                report[name] = result
+                print(f"{name:<12} {result['requests_per_sec']:9.1f} req/s  p50 {result['p50_ms']:8.2f} ms  "
+                      f"p95 {result['p95_ms']:8.2f} ms  {result['statuses']}", file=sys.stderr)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(json.dumps({"fixture": params, "clients": args.clients, "scenarios": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Memory and filter speed of the in-process catalog representations.
+#
+# Usage: python benchmarks/catalog_memory.py --medicines 100000
+#
+# Loads the medicines table of a synthetic fixture (see fixtures.py) as
+#   rows       - the list of sqlite3 tuples list_medicines() returns
+#   dataframe  - a pandas DataFrame of those rows, as the pages build (if pandas is installed)
+#   compact    - pharmacy.compact.CompactCatalog
+# and reports the memory each holds (tracemalloc) and the time to run the
+# "in stock, expiring within 90 days, priced 100-500" filter over it.
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import fixtures  # noqa: E402
+from pharmacy import catalog, db  # noqa: E402
+from pharmacy.compact import CompactCatalog  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", ".data")
+
+
+def measure(build):
+    """
+    Build a structure and return (it, bytes still allocated for it, seconds to build).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size, elapsed
+
+
+def time_filter(run, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = run()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory use of catalog representations.")
+    parser.add_argument("--medicines", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = os.path.join(DATA_DIR, f"bench-{args.medicines}-0-10-{args.seed}.db")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    fixtures.generate(path, args.medicines, orders=0, users=10, seed=args.seed)
+
+    today = date.today()
+    limit = (today + timedelta(days=90)).isoformat()
+    results = []
+    with db.connection(path) as conn:
+        rows, size, elapsed = measure(lambda: catalog.list_medicines(conn))
+        seconds, matched = time_filter(lambda: [
+            row for row in rows
+            if row[2] > 0 and today.isoformat() <= row[3] <= limit and 100 <= row[4] <= 500])
+        results.append(("rows", size, elapsed, seconds, len(matched)))
+
+        try:
+            import pandas as pd
+        except ImportError:
+            pd = None
+        if pd is not None:
+            frame, size, elapsed = measure(lambda: pd.DataFrame(
+                rows, columns=["medicine_id", "name", "stock", "expiry_date", "price", "info"]))
+            seconds, matched = time_filter(lambda: frame[
+                (frame.stock > 0) & (frame.expiry_date >= today.isoformat()) & (frame.expiry_date <= limit)
+                & frame.price.between(100, 500)])
+            results.append(("dataframe", size, elapsed, seconds, len(matched)))
+        del rows
+
+        compact, size, elapsed = measure(lambda: CompactCatalog.from_conn(conn))
+        seconds, matched = time_filter(lambda: (
+            compact.in_stock() & compact.expiring_within(90, today) & compact.price_between(100, 500)).sum())
+        results.append(("compact", size, elapsed, seconds, int(matched)))
+
+    print(f"{args.medicines} medicines")
+    print(f"{'representation':<16}{'memory MB':>12}{'build ms':>12}{'filter ms':>12}{'matches':>10}")
+    for name, size, elapsed, seconds, matched in results:
+        print(f"{name:<16}{size / 1e6:>12.1f}{elapsed * 1000:>12.1f}{seconds * 1000:>12.2f}{matched:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Synthetic pharmacy.db fixtures at configurable scale.
+#
+# Usage: python benchmarks/fixtures.py bench.db --medicines 100000 --orders 2000000 --users 5000
+#
+# The schema is pharmacy.db.SCHEMA, the same one the apps create. Generation is deterministic for a given
+# --seed, and an existing file built with the same parameters is reused as-is.
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pharmacy import auth, db, ledger  # noqa: E402
+
+# Every fixture user logs in with this password
+PASSWORD = "bench-password"
+
+DRUG_STEMS = [
+    "Paracetamol", "Ibuprofen", "Amoxicillin", "Lisinopril", "Metformin", "Atorvastatin",
+    "Omeprazole", "Levothyroxine", "Amlodipine", "Simvastatin", "Losartan", "Metoprolol",
+    "Albuterol", "Gabapentin", "Hydrochlorothiazide", "Sertraline", "Prednisone", "Tramadol",
+    "Citalopram", "Warfarin", "Cetirizine", "Azithromycin", "Pantoprazole", "Dolo",
+]
+STRENGTHS = ["50", "100", "250", "400", "500", "650", "1000"]
+
+BATCH = 50_000
+
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(path, medicines=10_000, orders=100_000, users=1_000, admins=5, seed=0):
+    """
+    Build (or reuse) a fixture database and return its parameters.
+    """
+    params = {"medicines": medicines, "orders": orders, "users": users, "admins": admins, "seed": seed}
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            row = conn.execute("SELECT value FROM bench_meta WHERE key = 'params'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row and json.loads(row[0]) == params:
+            # Pick up indexes and tables added to the schema since the fixture was built
+            db.migrate(conn)
+            for statement in db.SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            conn.close()
+            return params
+        conn.close()
+        os.remove(path)
+
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    conn = sqlite3.connect(path)
+    # Bulk load settings; the file is rebuilt from scratch if anything goes wrong
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for statement in db.SCHEMA:
+        conn.execute(statement)
+    conn.execute("CREATE TABLE bench_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # One hash shared by every user keeps generation fast; logins still pay the full KDF
+    password_hash = auth.hash_password(PASSWORD)
+    conn.executemany(
+        "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+        ((f"{'admin' if i < admins else 'user'}{i}", password_hash, "admin" if i < admins else "customer")
+         for i in range(users + admins)))
+
+    def medicine_rows():
+        for i in range(medicines):
+            name = f"{rng.choice(DRUG_STEMS)} {rng.choice(STRENGTHS)}"
+            if i >= len(DRUG_STEMS) * len(STRENGTHS):
+                name = f"{name} #{i}"  # Keep names unique past the natural combinations
+            expiry = today + timedelta(days=rng.randint(-60, 900))
+            yield (name, rng.randint(0, 500), expiry.strftime('%Y-%m-%d'), round(rng.uniform(5, 2000), 2), None)
+
+    for batch in _batched(medicine_rows()):
+        conn.executemany("INSERT INTO medicines (name, stock, expiry_date, price, info) VALUES (?, ?, ?, ?, ?)", batch)
+
+    # Opening balances, so the ledger agrees with the generated stock
+    ledger.init_ledger(conn)
+
+    start = datetime.now() - timedelta(days=730)
+    customer_ids = range(admins + 1, admins + users + 1)
+
+    def order_rows():
+        for _ in range(orders):
+            quantity = rng.randint(1, 5)
+            when = start + timedelta(seconds=rng.randint(0, 730 * 86400))
+            yield (when.strftime('%Y-%m-%d %H:%M:%S'), rng.choice(customer_ids), rng.randint(1, medicines),
+                   quantity, round(quantity * rng.uniform(5, 2000), 2))
+
+    for batch in _batched(order_rows()):
+        conn.executemany(
+            "INSERT INTO orders (order_date, customer_id, drug_id, quantity, total_amount) VALUES (?, ?, ?, ?, ?)", batch)
+
+    conn.execute("INSERT INTO bench_meta (key, value) VALUES ('params', ?)", (json.dumps(params),))
+    conn.commit()
+    conn.close()
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic pharmacy.db fixture.")
+    parser.add_argument("path")
+    parser.add_argument("--medicines", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.path, args.medicines, args.orders, args.users, args.admins, args.seed)
+    print(f"{args.path}: {os.path.getsize(args.path) / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# The app's key user flows, expressed against a plain sqlite3 connection.
+#
+# Each flow calls the same pharmacy service functions the Streamlit pages run for
+# one interaction, so it can be timed without a browser or a script rerun.
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pharmacy import catalog, dashboard, inventory, ledger, orders, pos, users  # noqa: E402
+from benchmarks.fixtures import PASSWORD  # noqa: E402
+
+
+class Context:
+    """
+    Per-thread state shared by the flows: RNG, fixture sizes and a session cart.
+    """
+    def __init__(self, rng, params, drug_names):
+        self.rng = rng
+        self.params = params
+        self.drug_names = drug_names
+        self.cart = []
+
+    def customer_id(self):
+        return self.rng.randint(self.params["admins"] + 1, self.params["admins"] + self.params["users"])
+
+    def drug_id(self):
+        return self.rng.randint(1, self.params["medicines"])
+
+
+def login(conn, ctx):
+    user_id = ctx.customer_id()
+    # Usernames are numbered from 0, user ids from 1
+    return users.authenticate(conn, f"user{user_id - 1}", PASSWORD)
+
+
+def customer_home(conn, ctx):
+    return dashboard.customer_dashboard(conn, ctx.customer_id())
+
+
+def buy_drugs(conn, ctx):
+    # The Buy Drugs page: the catalog from the compact cache (rebuilt only after a catalog change),
+    # then the grid's stock and expiry colours in one vectorized pass
+    drugs = catalog.cached_medicines(conn)
+    return drugs, inventory.grid_status(drugs)
+
+
+def search(conn, ctx):
+    names = ctx.rng.sample(ctx.drug_names, 3)
+    return catalog.find_by_names(conn, names)
+
+
+def add_to_cart(conn, ctx):
+    # The card already holds the drug row; adding to the cart is a session-state update
+    drug = catalog.get_medicine(conn, ctx.drug_id())
+    item = next((item for item in ctx.cart if item['drug_id'] == drug[0]), None)
+    if item:
+        item['quantity'] += 1
+        item['total'] = item['quantity'] * item['price']
+    else:
+        ctx.cart.append({'drug_id': drug[0], 'drug_name': drug[1], 'quantity': 1,
+                         'price': drug[4], 'total': drug[4]})
+    return ctx.cart
+
+
+def place_order_from_cart(conn, ctx):
+    cart = [{'drug_id': ctx.drug_id(), 'drug_name': '', 'quantity': ctx.rng.randint(1, 3), 'total': 100.0}
+            for _ in range(3)]
+    try:
+        orders.place_order(conn, ctx.customer_id(), cart)
+    except orders.InsufficientStock:
+        return False
+    return True
+
+
+def pos_sale(conn, ctx):
+    # Three scans by typed prefix, then the whole basket in one transaction
+    basket = []
+    for _ in range(3):
+        name = ctx.rng.choice(ctx.drug_names)
+        drug = pos.search(conn, name[:ctx.rng.randint(3, len(name))], limit=1)[0]
+        basket.append({'drug_id': drug[0], 'drug_name': drug[1], 'quantity': 1, 'total': drug[4]})
+    try:
+        orders.place_order(conn, None, basket)
+    except orders.InsufficientStock:
+        return False
+    return True
+
+
+def view_orders(conn, ctx):
+    return orders.all_orders(conn)
+
+
+def view_order_history(conn, ctx):
+    return orders.customer_orders_page(conn, ctx.customer_id())
+
+
+def export_order_history(conn, ctx):
+    return sum(1 for _ in orders.export_orders_csv(conn, ctx.customer_id()))
+
+
+def expiry_alerts(conn, ctx):
+    # As on Manage Drugs: column filters over the cached compact catalog, not queries
+    today = date.today()
+    compact = catalog.compact_catalog(conn)
+    near_expiry = compact.select(compact.expiring_within(90, today))
+    return near_expiry, inventory.grid_status(near_expiry, today), compact.select(compact.expired(today))
+
+
+def reconcile_stock(conn, ctx):
+    return ledger.reconcile(conn)
+
+
+FLOWS = {
+    "login": login,
+    "customer_home": customer_home,
+    "buy_drugs": buy_drugs,
+    "search": search,
+    "add_to_cart": add_to_cart,
+    "place_order_from_cart": place_order_from_cart,
+    "pos_sale": pos_sale,
+    "view_orders": view_orders,
+    "view_order_history": view_order_history,
+    "export_order_history": export_order_history,
+    "expiry_alerts": expiry_alerts,
+    "reconcile_stock": reconcile_stock,
+}
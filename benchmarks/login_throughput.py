@@ -0,0 +1,93 @@
+# Login throughput under concurrent sessions.
+#
+# Usage: python benchmarks/login_throughput.py --users 200 --sessions 16 --logins 400
+#
+# Builds a throwaway users table, then has `--sessions` threads (one per simulated
+# Streamlit session) log in as random users, mixing in a share of bad passwords.
+# Reports successful and rejected logins per second, and per-login latency.
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pharmacy import auth  # noqa: E402
+
+
+def build_db(path, n_users, plaintext_share):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, password TEXT, role TEXT)")
+    conn.execute("CREATE UNIQUE INDEX idx_users_username ON users (username)")
+    rows = []
+    for i in range(n_users):
+        password = f"pw-{i}"
+        # Some accounts start out with legacy plaintext passwords to exercise the migration
+        stored = password if random.random() < plaintext_share else auth.hash_password(password)
+        rows.append((f"user{i}", stored, "customer"))
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def session(path, n_users, logins, bad_share, latencies, results, lock):
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    for _ in range(logins):
+        i = random.randrange(n_users)
+        password = f"pw-{i}" if random.random() >= bad_share else "wrong"
+        start = time.perf_counter()
+        try:
+            outcome = "ok" if auth.authenticate(conn, f"user{i}", password) else "rejected"
+        except auth.LoginThrottled:
+            outcome = "throttled"
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            results[outcome] = results.get(outcome, 0) + 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput under concurrent sessions.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent login threads")
+    parser.add_argument("--logins", type=int, default=400, help="total login attempts")
+    parser.add_argument("--bad-share", type=float, default=0.1, help="share of attempts with a wrong password")
+    parser.add_argument("--plaintext-share", type=float, default=0.5, help="share of users with legacy passwords")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_db(path, args.users, args.plaintext_share)
+
+        latencies, results, lock = [], {}, threading.Lock()
+        per_session = max(1, args.logins // args.sessions)
+        threads = [
+            threading.Thread(target=session,
+                             args=(path, args.users, per_session, args.bad_share, latencies, results, lock))
+            for _ in range(args.sessions)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"KDF workers: {auth.KDF_WORKERS}, sessions: {args.sessions}, attempts: {total}")
+    print(f"Outcomes: {results}")
+    print(f"Throughput: {total / wall:.1f} attempts/s over {wall:.2f}s")
+    print(f"Latency p50: {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95: {latencies[int(total * 0.95) - 1] * 1000:.1f} ms, "
+          f"max: {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# End-to-end benchmark of the app's key flows on a synthetic database.
+#
+# Usage:
+#   python benchmarks/run.py --medicines 100000 --orders 1000000 --output baseline.json
+#   python benchmarks/run.py --compare baseline.json      # exits 1 on a p95 regression
+#
+# The fixture is generated once (see fixtures.py) and every run works on a fresh
+# copy of it, so writes from earlier runs never skew later ones.
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fixtures  # noqa: E402
+from benchmarks.flows import FLOWS, Context  # noqa: E402
+from pharmacy import db  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_flow(path, params, flow, iterations, concurrency, seed):
+    """
+    Run one flow `iterations` times across `concurrency` threads.
+    Returns latency percentiles (ms) and throughput (ops/s).
+    """
+    latencies, errors, lock = [], [], threading.Lock()
+    # The shared catalog cache file lives next to the database; keep it beside this copy
+    db.DB_PATH = path
+    conn = sqlite3.connect(path)
+    drug_names = [row[0] for row in conn.execute("SELECT name FROM medicines LIMIT 10000")]
+    conn.close()
+
+    def worker(worker_id, count):
+        ctx = Context(random.Random(seed * 1000 + worker_id), params, drug_names)
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        local = []
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                flow(conn, ctx)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    per_thread = [iterations // concurrency + (1 if i < iterations % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(per_thread) if n]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "count": len(latencies),
+        "errors": len(errors),
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "ops_per_sec": len(latencies) / wall,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline, current, threshold):
+    """
+    Print per-flow changes against a baseline; return the flows whose p95 regressed past `threshold`.
+    """
+    regressions = []
+    print(f"\n{'flow':<24}{'p50 base':>12}{'p50 now':>12}{'p95 base':>12}{'p95 now':>12}{'change':>10}",
+          file=sys.stderr)
+    for name, now in current["flows"].items():
+        base = baseline["flows"].get(name)
+        if not base:
+            continue
+        change = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        flag = "  <-- regression" if change > threshold else ""
+        print(f"{name:<24}{base['p50_ms']:>12.2f}{now['p50_ms']:>12.2f}"
+              f"{base['p95_ms']:>12.2f}{now['p95_ms']:>12.2f}{change:>+10.0%}{flag}", file=sys.stderr)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DawaKhana's key flows and report a JSON baseline.")
+    parser.add_argument("--db", help="fixture path (default: benchmarks/.data/bench-<scale>.db)")
+    parser.add_argument("--medicines", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--flows", default=",".join(FLOWS), help="comma-separated subset of: " + ", ".join(FLOWS))
+    parser.add_argument("--iterations", type=int, default=50, help="runs per flow")
+    parser.add_argument("--concurrency", type=int, default=1, help="threads per flow")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed p95 slowdown before failing --compare")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(DATA_DIR, f"bench-{args.medicines}-{args.orders}-{args.users}-{args.seed}.db")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    start = time.perf_counter()
+    params = fixtures.generate(path, args.medicines, args.orders, args.users, seed=args.seed)
+    print(f"Fixture ready in {time.perf_counter() - start:.1f}s: {params}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "fixture": params,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+        },
+        "flows": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.flows.split(","):
+            # Fresh copy per flow so writes (orders, stock, rehashes) never leak between flows
+            work_path = os.path.join(tmp, f"{name}.db")
+            shutil.copyfile(path, work_path)
+            result = run_flow(work_path, params, FLOWS[name], args.iterations, args.concurrency, args.seed)
+            report["flows"][name] = result
+            print(f"{name:<24} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"{result['ops_per_sec']:9.1f} ops/s", file=sys.stderr)
+            os.remove(work_path)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"\np95 regressed by more than {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
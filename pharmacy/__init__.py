@@ -0,0 +1,27 @@
+# pharmacy/__init__.py
+#
+# UI-independent data access for DawaKhana. The Streamlit apps, the benchmarks
+# and any other entry point share these modules:
+#   db         - connections and schema
+#   postgres   - optional PostgreSQL backend (connection pool, row locks, COPY loads)
+#   catalog    - medicines (listing, search, add/edit/delete)
+#   compact    - the catalog as column arrays for in-process caching
+#   inventory  - stock and expiry checks
+#   orders     - checkout and order history
+#   pdf        - minimal streaming PDF writer for exports
+#   ledger     - append-only stock movements, snapshots and reconciliation
+#   users      - accounts and login
+#   carts      - saved carts
+#   prescriptions - stored prescriptions and refills
+#   phash      - perceptual hashes for spotting re-uploaded prescriptions
+#   dashboard  - customer landing page aggregates, cached per customer and refreshed in the background
+#   pos        - in-memory prefix index for the point-of-sale counter
+#   ocr        - OCR engines (persistent tesserocr, pytesseract fallback) and parallel region OCR
+#   entities   - offline prescription entity extraction (spaCy entity ruler over the catalog)
+#   cache      - cache shared by all server processes, invalidated by version counters
+#   writer     - per-process writer thread for checkout
+#   readers    - read-only snapshot connections for admin reports
+#   maintenance - scheduled backups, planner statistics and vacuuming of the database file
+#
+# Every function takes an open connection (see db.connection()) so callers
+# decide how connections are reused and where transactions begin and end.
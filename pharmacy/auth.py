@@ -0,0 +1,178 @@
+# pharmacy/auth.py
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt parameters (~16 MB and ~50 ms per hash on a typical server core)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+# PBKDF2 is only used when the OpenSSL build behind hashlib lacks scrypt
+PBKDF2_ITERATIONS = 600_000
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# Failed logins allowed in a burst, and how fast the allowance comes back
+LOGIN_BURST = 5
+LOGIN_REFILL_SECONDS = 30
+
+# The KDF is deliberately slow, so it runs on a small shared pool instead of
+# the Streamlit script thread. The pool size caps how many hashes (and how much
+# scrypt memory) can be in flight at once, no matter how many sessions log in.
+KDF_WORKERS = min(4, os.cpu_count() or 1)
+_kdf_pool = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix="kdf")
+
+
+class LoginThrottled(Exception):
+    """
+    Raised when a username has used up its failed-login allowance.
+    """
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed attempts. Try again in {retry_after:.0f} seconds.")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    In-memory token bucket keyed by an arbitrary string (here, the username).
+    Each key starts with `capacity` tokens and regains one every `refill_seconds`.
+    """
+    def __init__(self, capacity, refill_seconds):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self._buckets = {}  # key -> (tokens, last_refill)
+        self._lock = threading.Lock()
+
+    def _refill(self, key, now):
+        tokens, last = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) / self.refill_seconds)
+        if tokens >= self.capacity:
+            # Full buckets carry no information, so drop them to keep memory bounded
+            self._buckets.pop(key, None)
+        else:
+            self._buckets[key] = (tokens, now)
+        return tokens
+
+    def retry_after(self, key):
+        """
+        Seconds until `key` has a token available (0 if it has one now).
+        """
+        with self._lock:
+            tokens = self._refill(key, time.monotonic())
+            return 0.0 if tokens >= 1 else (1 - tokens) * self.refill_seconds
+
+    def consume(self, key):
+        """
+        Take one token for `key`. Returns False if the bucket was already empty.
+        """
+        with self._lock:
+            now = time.monotonic()
+            tokens = self._refill(key, now)
+            if tokens < 1:
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            return True
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+_failed_logins = TokenBucket(LOGIN_BURST, LOGIN_REFILL_SECONDS)
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p + 2), dklen=KEY_BYTES)
+
+
+def hash_password(password):
+    """
+    Hash a password with a fresh random salt.
+    Returns a self-describing string, e.g. "scrypt$16384$8$1$<salt>$<hash>".
+    """
+    salt = os.urandom(SALT_BYTES)
+    if hasattr(hashlib, "scrypt"):
+        key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${key.hex()}"
+    key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ITERATIONS, KEY_BYTES)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${key.hex()}"
+
+
+def is_hashed(stored):
+    return stored.startswith(("scrypt$", "pbkdf2_sha256$"))
+
+
+def verify_password(password, stored):
+    """
+    Check a password against a stored value.
+    Legacy plaintext values are still accepted so they can be migrated on login.
+    """
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            key = _scrypt(password, bytes.fromhex(parts[4]), n, r, p)
+            return hmac.compare_digest(key.hex(), parts[5])
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            key = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(parts[2]),
+                                      int(parts[1]), KEY_BYTES)
+            return hmac.compare_digest(key.hex(), parts[3])
+    except ValueError:
+        return False
+    return hmac.compare_digest(password.encode(), stored.encode())
+
+
+def needs_rehash(stored):
+    """
+    True for plaintext passwords and hashes made with older parameters.
+    """
+    if not hasattr(hashlib, "scrypt"):
+        return not stored.startswith(f"pbkdf2_sha256${PBKDF2_ITERATIONS}$")
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+def hash_password_pooled(password):
+    """
+    Hash on the KDF pool and block until it is done. The calling thread waits
+    either way; the pool only bounds how many hashes run at once.
+    """
+    return _kdf_pool.submit(hash_password, password).result()
+
+
+# Verified against when the username does not exist, so unknown and known
+# usernames take the same time to reject.
+_DUMMY_HASH = hash_password(os.urandom(8).hex())
+
+
+def authenticate(conn, username, password):
+    """
+    Look up a user by username and verify the password.
+    Returns (user_id, username, role) on success and None on bad credentials.
+    Raises LoginThrottled when the username has too many recent failures.
+    Plaintext or outdated hashes are replaced with a fresh hash on success.
+    """
+    retry_after = _failed_logins.retry_after(username)
+    if retry_after > 0:
+        raise LoginThrottled(retry_after)
+
+    # Served by idx_users_username
+    c = conn.cursor()
+    c.execute("SELECT user_id, username, password, role FROM users WHERE username = ?", (username,))
+    user = c.fetchone()
+
+    stored = user[2] if user and user[2] else _DUMMY_HASH
+    ok = _kdf_pool.submit(verify_password, password, stored).result()
+    if not user or not ok:
+        _failed_logins.consume(username)
+        return None
+
+    _failed_logins.reset(username)
+    if needs_rehash(stored):
+        c.execute("UPDATE users SET password = ? WHERE user_id = ?",
+                  (hash_password_pooled(password), user[0]))
+        conn.commit()
+    return user[0], user[1], user[3]
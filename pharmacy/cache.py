@@ -0,0 +1,103 @@
+# pharmacy/cache.py
+#
+# A cache shared by every server process on one machine: a small SQLite file
+# (DAWAKHANA_CACHE, default next to the database) fronted by an in-process LRU.
+#
+# Entries are stored with the version they were computed at, e.g. the
+# catalog_version counter. Any process that writes bumps that counter in the
+# main database, so every other process sees the new version on its next read
+# and recomputes instead of serving what it holds.
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from pharmacy import db
+
+# Entries kept in each process's memory, and in the shared file
+MEMORY_SIZE = 256
+FILE_SIZE = 10_000
+
+_memory = OrderedDict()  # key -> (version, value)
+_memory_lock = threading.Lock()
+_local = threading.local()
+_puts = 0
+
+
+def cache_path():
+    return os.environ.get("DAWAKHANA_CACHE") or os.path.splitext(db.DB_PATH)[0] + "-cache.db"
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = sqlite3.connect(cache_path(), timeout=db.BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute('''CREATE TABLE IF NOT EXISTS entries
+                        (key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL, used_at REAL)''')
+        conn.commit()
+    return conn
+
+
+def _remember(key, version, value):
+    with _memory_lock:
+        _memory[key] = (version, value)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+def get(key, version):
+    """
+    The value cached for `key` at `version`, or None if there isn't one.
+    """
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry and entry[0] == version:
+            _memory.move_to_end(key)
+            return entry[1]
+
+    row = _conn().execute("SELECT value FROM entries WHERE key = ? AND version = ?", (key, version)).fetchone()
+    if row is None:
+        return None
+    value = pickle.loads(row[0])
+    _remember(key, version, value)
+    return value
+
+
+def put(key, version, value):
+    global _puts
+    _remember(key, version, value)
+    conn = _conn()
+    conn.execute("INSERT OR REPLACE INTO entries (key, version, value, used_at) VALUES (?, ?, ?, ?)",
+                 (key, version, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time()))
+    _puts += 1
+    if _puts % 100 == 0:
+        # Trim the least recently written entries now and then rather than on every put
+        conn.execute("""
+            DELETE FROM entries WHERE key IN
+            (SELECT key FROM entries ORDER BY used_at DESC LIMIT -1 OFFSET ?)
+        """, (FILE_SIZE,))
+    conn.commit()
+
+
+def get_or_compute(key, version, compute):
+    """
+    Return the cached value for `key` at `version`, computing and sharing it on a miss.
+    """
+    value = get(key, version)
+    if value is None:
+        value = compute()
+        put(key, version, value)
+    return value
+
+
+def clear():
+    with _memory_lock:
+        _memory.clear()
+    conn = _conn()
+    conn.execute("DELETE FROM entries")
+    conn.commit()
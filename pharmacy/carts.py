@@ -0,0 +1,39 @@
+# pharmacy/carts.py
+#
+# Saved carts, so a customer's cart follows them to whichever server process
+# serves their next session. Items are the same dicts the cart page uses.
+import json
+import sqlite3
+from datetime import datetime
+
+
+def load_cart(conn: sqlite3.Connection, user_id: int) -> list[dict]:
+    row = conn.execute("SELECT items FROM carts WHERE user_id = ?", (user_id,)).fetchone()
+    return json.loads(row[0]) if row else []
+
+
+def save_cart(conn: sqlite3.Connection, user_id: int, items: list[dict]) -> None:
+    if items:
+        conn.execute("""
+            INSERT INTO carts (user_id, items, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET items = excluded.items, updated_at = excluded.updated_at
+        """, (user_id, json.dumps(items), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    else:
+        conn.execute("DELETE FROM carts WHERE user_id = ?", (user_id,))
+    conn.commit()
+
+
+def merge_items(cart: list[dict], items: list[dict]) -> list[dict]:
+    """
+    Add items to a cart in place, adding quantities to lines already in it.
+    """
+    for item in items:
+        line = next((line for line in cart if line['drug_id'] == item['drug_id']), None)
+        if line is None:
+            cart.append(dict(item))
+        else:
+            line['quantity'] += item['quantity']
+            line['total'] = line['quantity'] * line['price']
+            if item.get('prescription_id'):
+                line['prescription_id'] = item['prescription_id']
+    return cart
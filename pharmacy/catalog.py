@@ -0,0 +1,168 @@
+# pharmacy/catalog.py
+import sqlite3
+from datetime import date
+
+from pharmacy import cache, ledger, postgres
+from pharmacy.compact import CompactCatalog, MedicineView
+from pharmacy.drug_info import delete_monograph, refresh_monograph, save_monograph
+
+# Medicine rows are (medicine_id, name, stock, expiry_date, price, info)
+MEDICINE_COLUMNS = "medicine_id, name, stock, expiry_date, price, info"
+
+
+def list_medicines(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    Every medicine in the catalog.
+    """
+    return conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines").fetchall()
+
+
+def compact_catalog(conn: sqlite3.Connection) -> CompactCatalog:
+    """
+    The whole catalog as column arrays, served from the shared cache until any
+    process changes the catalog.
+    """
+    return cache.get_or_compute("catalog:compact", version(conn), lambda: CompactCatalog.from_conn(conn))
+
+
+def cached_medicines(conn: sqlite3.Connection) -> list[MedicineView]:
+    """
+    Every medicine, as row views over compact_catalog() (indexable like list_medicines() rows).
+    """
+    return compact_catalog(conn).select()
+
+
+def page_medicines(conn: sqlite3.Connection, limit: int, offset: int = 0) -> list[tuple]:
+    """
+    One page of the catalog in medicine_id order.
+    """
+    return conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines ORDER BY medicine_id LIMIT ? OFFSET ?",
+                        (limit, offset)).fetchall()
+
+
+def count_medicines(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT count(*) FROM medicines").fetchone()[0]
+
+
+def version(conn: sqlite3.Connection) -> int:
+    """
+    The catalog_version counter; it changes whenever any medicine row is written.
+    """
+    row = conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def names_version(conn: sqlite3.Connection) -> int:
+    """
+    The catalog_names_version counter; it changes only when medicines are added,
+    removed or renamed, not on stock or price updates.
+    """
+    row = conn.execute("SELECT version FROM catalog_names_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def medicine_names(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    (medicine_id, name) for every medicine.
+    """
+    return conn.execute("SELECT medicine_id, name FROM medicines").fetchall()
+
+
+def get_medicines(conn: sqlite3.Connection, medicine_ids: list[int]) -> list[tuple]:
+    """
+    The medicines with these ids, in the order the ids are given.
+    """
+    if not medicine_ids:
+        return []
+    rows = conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines WHERE medicine_id IN "
+                        f"({','.join(['?'] * len(medicine_ids))})", medicine_ids).fetchall()
+    by_id = {row[0]: row for row in rows}
+    return [by_id[medicine_id] for medicine_id in medicine_ids if medicine_id in by_id]
+
+
+def get_medicine(conn: sqlite3.Connection, medicine_id: int) -> tuple | None:
+    return conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines WHERE medicine_id = ?",
+                        (medicine_id,)).fetchone()
+
+
+def find_by_names(conn: sqlite3.Connection, names: list[str]) -> list[tuple]:
+    """
+    Medicines whose name exactly matches one of `names`.
+    """
+    if not names:
+        return []
+    query = f"SELECT {MEDICINE_COLUMNS} FROM medicines WHERE name IN ({','.join(['?'] * len(names))})"
+    return conn.execute(query, names).fetchall()
+
+
+def find_matching(conn: sqlite3.Connection, names: list[str]) -> list[tuple]:
+    """
+    Medicines whose name contains any of `names`, e.g. drug names read off a prescription.
+    Each medicine appears once even if several names match it.
+    """
+    matches = {}
+    for name in names:
+        for row in conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines WHERE name LIKE ?", (f"%{name}%",)):
+            matches.setdefault(row[0], row)
+    return list(matches.values())
+
+
+def add_medicine(conn: sqlite3.Connection, name: str, stock: int, expiry_date: date, price: float,
+                 info: str | None = None) -> int:
+    """
+    Add a medicine (and its description, if given). Returns the new medicine_id.
+    """
+    c = conn.cursor()
+    c.execute("INSERT INTO medicines (name, stock, expiry_date, price) VALUES (?, ?, ?, ?)",
+              (name, stock, expiry_date.strftime('%Y-%m-%d'), price))
+    if stock:
+        ledger.record(conn, c.lastrowid, ledger.RESTOCK, stock, note="initial stock")
+    conn.commit()
+    if info:
+        save_monograph(conn, c.lastrowid, name, info)
+    return c.lastrowid
+
+
+def update_medicine(conn: sqlite3.Connection, medicine_id: int, name: str, stock: int, expiry_date: date,
+                    price: float) -> None:
+    """
+    Overwrite a medicine's details. A changed stock count is recorded in the
+    ledger as an adjustment.
+    """
+    c = conn.cursor()
+    ledger.begin(conn)
+    try:
+        c.execute("SELECT name, stock FROM medicines WHERE medicine_id = ?" + postgres.for_update(conn), (medicine_id,))
+        old = c.fetchone()
+        c.execute("""
+            UPDATE medicines
+            SET name = ?, stock = ?, expiry_date = ?, price = ?
+            WHERE medicine_id = ?
+        """, (name, stock, expiry_date.strftime('%Y-%m-%d'), price, medicine_id))
+        if old and stock != (old[1] or 0):
+            ledger.record(conn, medicine_id, ledger.ADJUSTMENT, stock - (old[1] or 0), note="edited by admin")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if old and old[0] != name:
+        refresh_monograph(conn, medicine_id)  # Re-render the heading
+
+
+def delete_medicine(conn: sqlite3.Connection, medicine_id: int) -> None:
+    """
+    Delete a medicine. Its remaining stock is recorded in the ledger as an
+    adjustment out, so its ledger balance closes at zero.
+    """
+    ledger.begin(conn)
+    try:
+        row = conn.execute("SELECT stock FROM medicines WHERE medicine_id = ?" + postgres.for_update(conn),
+                           (medicine_id,)).fetchone()
+        conn.execute("DELETE FROM medicines WHERE medicine_id = ?", (medicine_id,))
+        if row and row[0]:
+            ledger.record(conn, medicine_id, ledger.ADJUSTMENT, -row[0], note="medicine deleted")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    delete_monograph(conn, medicine_id)
@@ -0,0 +1,202 @@
+# pharmacy/compact.py
+#
+# The catalog held column-wise for in-process caching. Instead of one tuple
+# (and five boxed values) per medicine, ids, stock, prices and expiry dates
+# live in NumPy arrays and names in one list of interned strings. Filters run
+# over whole columns and return boolean masks; MedicineView gives a single
+# row the same shape as a sqlite3 row where code still expects one.
+import sys
+from array import array
+from datetime import date
+
+import numpy as np
+
+# Rows read from the cursor per fetchmany() while building
+FETCH_SIZE = 5000
+
+# expiry_ord for medicines with a missing or unparseable expiry date
+NO_EXPIRY = np.iinfo(np.int32).max
+
+# Field order of a medicines row (catalog.MEDICINE_COLUMNS)
+_FIELDS = ("medicine_id", "name", "stock", "expiry_date", "price", "info")
+
+
+def _ordinal(expiry_date):
+    try:
+        return date.fromisoformat(expiry_date).toordinal()
+    except (TypeError, ValueError):
+        return NO_EXPIRY
+
+
+# date.toordinal() of 1970-01-01, the epoch of datetime64[D]
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _ordinals(expiry_dates):
+    """
+    Day ordinals for a list of ISO date strings, parsed in one NumPy call.
+    """
+    try:
+        days = np.asarray(expiry_dates, dtype="datetime64[D]")
+    except ValueError:
+        return np.fromiter((_ordinal(d) for d in expiry_dates), dtype=np.int32, count=len(expiry_dates))
+    return np.where(np.isnat(days), NO_EXPIRY, days.astype(np.int64) + _EPOCH_ORDINAL).astype(np.int32)
+
+
+class MedicineView:
+    """
+    One catalog row, read from the columns on access. Indexes like a
+    medicines row: (medicine_id, name, stock, expiry_date, price, info).
+    info is not kept in the compact catalog and is always None.
+    """
+    __slots__ = ("_catalog", "_row")
+
+    def __init__(self, catalog, row):
+        self._catalog = catalog
+        self._row = row
+
+    @property
+    def medicine_id(self):
+        return int(self._catalog.ids[self._row])
+
+    @property
+    def name(self):
+        return self._catalog.names[self._row]
+
+    @property
+    def stock(self):
+        return int(self._catalog.stock[self._row])
+
+    @property
+    def expiry_date(self):
+        ordinal = int(self._catalog.expiry_ord[self._row])
+        return None if ordinal == NO_EXPIRY else date.fromordinal(ordinal).isoformat()
+
+    @property
+    def price(self):
+        return float(self._catalog.price[self._row])
+
+    @property
+    def info(self):
+        return None
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return tuple(self)[i]
+        return getattr(self, _FIELDS[i])
+
+    def __len__(self):
+        return len(_FIELDS)
+
+    def __iter__(self):
+        return (getattr(self, field) for field in _FIELDS)
+
+    def __repr__(self):
+        return f"MedicineView({self.medicine_id}, {self.name!r})"
+
+
+class CompactCatalog:
+    """
+    Column arrays for the whole catalog, ordered by medicine_id.
+    """
+    __slots__ = ("ids", "names", "stock", "price", "expiry_ord")
+
+    def __init__(self, ids, names, stock, price, expiry_ord):
+        self.ids = ids
+        self.names = names
+        self.stock = stock
+        self.price = price
+        self.expiry_ord = expiry_ord
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build from any iterable of (medicine_id, name, stock, expiry_date, price, ...) rows,
+        e.g. a cursor, without holding all of them at once.
+        """
+        ids, stock, expiry, price = array("q"), array("q"), array("q"), array("d")
+        names = []
+        for row in rows:
+            ids.append(row[0])
+            names.append(sys.intern(row[1] or ""))
+            stock.append(row[2] or 0)
+            expiry.append(_ordinal(row[3]))
+            price.append(row[4] or 0.0)
+        return cls(np.frombuffer(ids, dtype=np.int64).copy(), names,
+                   np.frombuffer(stock, dtype=np.int64).astype(np.int32),
+                   np.frombuffer(price, dtype=np.float64).copy(),
+                   np.frombuffer(expiry, dtype=np.int64).astype(np.int32))
+
+    @classmethod
+    def from_conn(cls, conn):
+        cursor = conn.execute("SELECT medicine_id, name, stock, expiry_date, price FROM medicines ORDER BY medicine_id")
+
+        def rows():
+            while batch := cursor.fetchmany(FETCH_SIZE):
+                yield from batch
+        return cls.from_rows(rows())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        """
+        Bytes held by the column arrays and the name list (not the shared string objects).
+        """
+        return (self.ids.nbytes + self.stock.nbytes + self.price.nbytes + self.expiry_ord.nbytes
+                + sys.getsizeof(self.names))
+
+    # Filters: each returns a boolean mask over all rows; combine with & and |
+    def in_stock(self, minimum=1):
+        return self.stock >= minimum
+
+    def expiring_within(self, days, today=None):
+        today = (today or date.today()).toordinal()
+        return (self.expiry_ord >= today) & (self.expiry_ord <= today + days)
+
+    def expired(self, today=None):
+        return self.expiry_ord < (today or date.today()).toordinal()
+
+    def price_between(self, low=None, high=None):
+        mask = np.ones(len(self.ids), dtype=bool)
+        if low is not None:
+            mask &= self.price >= low
+        if high is not None:
+            mask &= self.price <= high
+        return mask
+
+    def positions(self, medicine_ids):
+        """
+        Row positions of the given medicine ids (ids not in the catalog are skipped).
+        """
+        wanted = np.asarray(medicine_ids, dtype=np.int64)
+        found = np.searchsorted(self.ids, wanted)
+        found = np.minimum(found, max(len(self.ids) - 1, 0))
+        return found[self.ids[found] == wanted] if len(self.ids) else found[:0]
+
+    def view(self, row):
+        return MedicineView(self, int(row))
+
+    def select(self, mask_or_positions=None):
+        """
+        MedicineViews for a mask or array of row positions (all rows if None).
+        """
+        if mask_or_positions is None:
+            rows = range(len(self.ids))
+        else:
+            selector = np.asarray(mask_or_positions)
+            rows = np.flatnonzero(selector) if selector.dtype == bool else selector
+        return [MedicineView(self, int(row)) for row in rows]
+
+
+def columns(drugs):
+    """
+    (stock, expiry_ord) arrays for a list of MedicineViews or medicines rows.
+    Views of one CompactCatalog are read straight from its columns.
+    """
+    if drugs and all(isinstance(drug, MedicineView) and drug._catalog is drugs[0]._catalog for drug in drugs):
+        catalog = drugs[0]._catalog
+        rows = np.fromiter((drug._row for drug in drugs), dtype=np.int64, count=len(drugs))
+        return catalog.stock[rows], catalog.expiry_ord[rows]
+    stock = np.fromiter((drug[2] or 0 for drug in drugs), dtype=np.int32, count=len(drugs))
+    return stock, _ordinals([drug[3] for drug in drugs])
@@ -0,0 +1,183 @@
+# pharmacy/dashboard.py
+#
+# The customer landing page's data: what sells best across the shop and what
+# this customer ordered recently. Both are aggregates over orders, kept in
+# this process's memory for TTL seconds per customer and database. A background
+# thread per database recomputes them every REFRESH_EVERY seconds for customers
+# seen lately, so a page load normally reads memory; a stale entry is served as-is while the
+# thread refreshes it. Only the handful of medicines shown are read live.
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from pharmacy import catalog, db
+
+# Seconds an entry is served before it counts as stale, and between background refreshes
+TTL = 120
+REFRESH_EVERY = 60
+
+# Top sellers are counted over this many days of orders
+TOP_SELLER_DAYS = 30
+# Medicines shown in each section
+SECTION_SIZE = 8
+
+_GLOBAL = None  # entry key for the shop-wide aggregates
+
+_entries = {}  # (database, customer_id or _GLOBAL) -> (computed_at, value)
+_used = {}  # (database, customer_id or _GLOBAL) -> when a page last read the entry
+_pending = set()  # stale keys queued for a refresh, so each is queued once however often it's read
+_entries_lock = threading.Lock()
+_refreshers = {}  # database -> Refresher
+_refreshers_lock = threading.Lock()
+
+
+def top_sellers(conn: sqlite3.Connection, days: int = TOP_SELLER_DAYS, limit: int = SECTION_SIZE) -> list[tuple]:
+    """
+    (drug_id, units sold) of the best sellers over the last `days` days.
+    """
+    since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    return conn.execute("""
+        SELECT drug_id, sum(quantity) AS units FROM orders
+        WHERE order_date >= ?
+        GROUP BY drug_id ORDER BY units DESC, drug_id LIMIT ?
+    """, (since, limit)).fetchall()
+
+
+def recently_ordered(conn: sqlite3.Connection, customer_id: int, limit: int = SECTION_SIZE) -> list[tuple]:
+    """
+    (drug_id, last quantity, last ordered) of the customer's most recently
+    ordered distinct medicines, newest first.
+    """
+    # The customer's orders come from idx_orders_customer_date; each drug keeps its latest order's row
+    return conn.execute("""
+        SELECT drug_id, quantity, order_date AS last_ordered FROM (
+            SELECT drug_id, quantity, order_date,
+                   row_number() OVER (PARTITION BY drug_id ORDER BY order_date DESC, order_id DESC) AS latest
+            FROM orders WHERE customer_id = ?
+        ) ranked
+        WHERE latest = 1
+        ORDER BY last_ordered DESC LIMIT ?
+    """, (customer_id, limit)).fetchall()
+
+
+def _compute(conn, key):
+    if key is _GLOBAL:
+        return top_sellers(conn)
+    return recently_ordered(conn, key)
+
+
+def _database(conn):
+    # The SQLite file conn is open on; None for the PostgreSQL pool, which db.connect() reopens
+    if not isinstance(conn, sqlite3.Connection):
+        return None
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def _get(conn, database, key):
+    key = (database, key)
+    with _entries_lock:
+        entry = _entries.get(key)
+        _used[key] = time.monotonic()
+    if entry is None:
+        value = _compute(conn, key[1])
+        with _entries_lock:
+            _entries[key] = (time.monotonic(), value)
+        return value
+    if time.monotonic() - entry[0] > TTL:
+        with _entries_lock:
+            queued = key in _pending
+            _pending.add(key)
+        if not queued:
+            _background(database).refresh(key)
+    return entry[1]
+
+
+class Refresher:
+    """
+    Recomputes one database's cached entries on its own connection to it: on
+    request, and every REFRESH_EVERY seconds for each entry read within the
+    last TTL seconds. Entries idle for longer are dropped. On PostgreSQL
+    (path None) a pooled connection is borrowed for each batch instead of held.
+    """
+    def __init__(self, path: str | None):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="pharmacy-dashboard", daemon=True)
+        self._thread.start()
+
+    def refresh(self, key) -> None:
+        self._queue.put(key)
+
+    def _loop(self):
+        held = db.connect(self.path) if self.path is not None else None
+        next_round = time.monotonic() + REFRESH_EVERY
+        while True:
+            try:
+                keys = [self._queue.get(timeout=max(next_round - time.monotonic(), 0))]
+            except queue.Empty:
+                next_round = time.monotonic() + REFRESH_EVERY
+                with _entries_lock:
+                    keys = [key for key in _entries if key[0] == self.path]
+            if not keys:
+                continue
+            try:
+                with nullcontext(held) if held is not None else db.connection() as conn:
+                    for key in keys:
+                        self._refresh(conn, key)
+            except Exception:
+                pass  # e.g. no pooled connection free in time; stale entries are queued again when read
+            finally:
+                with _entries_lock:
+                    _pending.difference_update(keys)
+
+    def _refresh(self, conn, key):
+        with _entries_lock:
+            if time.monotonic() - _used.get(key, 0) > TTL:
+                _entries.pop(key, None)
+                _used.pop(key, None)
+                return
+        try:
+            value = _compute(conn, key[1])
+        except sqlite3.Error:
+            return
+        with _entries_lock:
+            _entries[key] = (time.monotonic(), value)
+
+
+def _background(database):
+    with _refreshers_lock:
+        if database not in _refreshers:
+            _refreshers[database] = Refresher(database)
+        return _refreshers[database]
+
+
+def customer_dashboard(conn: sqlite3.Connection, customer_id: int) -> dict:
+    """
+    The landing page for one customer: {"top_sellers": [(row, units sold)],
+    "recent": [(row, last quantity, last ordered)]}, where row is a live medicines row.
+    """
+    database = _database(conn)
+    sellers = _get(conn, database, _GLOBAL)
+    recent = _get(conn, database, customer_id)
+    _background(database)
+    rows = catalog.get_medicines(conn, list(dict.fromkeys(
+        [drug_id for drug_id, _ in sellers] + [drug_id for drug_id, _, _ in recent])))
+    by_id = {row[0]: row for row in rows}
+    return {
+        "top_sellers": [(by_id[drug_id], units) for drug_id, units in sellers if drug_id in by_id],
+        "recent": [(by_id[drug_id], quantity, last_ordered)
+                   for drug_id, quantity, last_ordered in recent if drug_id in by_id],
+    }
+
+
+def invalidate(customer_id: int) -> None:
+    """
+    Forget a customer's entries, e.g. after they place an order, so their next load is current.
+    """
+    with _entries_lock:
+        for key in [key for key in _entries if key[1] == customer_id]:
+            _entries.pop(key, None)
+            _used.pop(key, None)
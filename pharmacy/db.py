@@ -0,0 +1,164 @@
+# pharmacy/db.py
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from pharmacy import postgres
+from pharmacy.drug_info import init_monographs
+from pharmacy.ledger import init_ledger
+from pharmacy.perf import TimedConnection
+
+# Database file, overridable so benchmarks and tests can point at a fixture
+DB_PATH = os.environ.get("DAWAKHANA_DB", "pharmacy.db")
+
+# The SQLite file above, unless DAWAKHANA_DATABASE_URL points at a PostgreSQL server (see postgres.py)
+BACKEND = "postgres" if postgres.DATABASE_URL.startswith(("postgres://", "postgresql://")) else "sqlite"
+
+# Seconds a connection waits for another process's write lock before "database is locked"
+BUSY_TIMEOUT = float(os.environ.get("DAWAKHANA_BUSY_TIMEOUT", "30"))
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS customers
+       (customer_id INTEGER PRIMARY KEY, name TEXT, contact TEXT, address TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS medicines
+       (medicine_id INTEGER PRIMARY KEY, name TEXT, stock INTEGER, expiry_date TEXT, price REAL, info TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS orders
+       (order_id INTEGER PRIMARY KEY, order_date TEXT, customer_id INTEGER, drug_id INTEGER, quantity INTEGER, total_amount REAL,
+        prescription_id INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS users
+       (user_id INTEGER PRIMARY KEY, username TEXT, password TEXT, role TEXT)''',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)''',
+    # Bumped by every write to medicines, from any process, so catalog readers
+    # (ETags, response caches) can tell whether what they hold is stale
+    '''CREATE TABLE IF NOT EXISTS catalog_version
+       (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)''',
+    '''INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)''',
+    '''CREATE TRIGGER IF NOT EXISTS medicines_insert_version AFTER INSERT ON medicines
+       BEGIN UPDATE catalog_version SET version = version + 1; END''',
+    '''CREATE TRIGGER IF NOT EXISTS medicines_update_version AFTER UPDATE ON medicines
+       BEGIN UPDATE catalog_version SET version = version + 1; END''',
+    '''CREATE TRIGGER IF NOT EXISTS medicines_delete_version AFTER DELETE ON medicines
+       BEGIN UPDATE catalog_version SET version = version + 1; END''',
+    # Same idea, but only for changes to the set of names (inserts, deletes, renames)
+    '''CREATE TABLE IF NOT EXISTS catalog_names_version
+       (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)''',
+    '''INSERT OR IGNORE INTO catalog_names_version (id, version) VALUES (1, 0)''',
+    '''CREATE TRIGGER IF NOT EXISTS medicines_insert_names_version AFTER INSERT ON medicines
+       BEGIN UPDATE catalog_names_version SET version = version + 1; END''',
+    '''CREATE TRIGGER IF NOT EXISTS medicines_rename_names_version AFTER UPDATE OF name ON medicines
+       WHEN old.name IS NOT new.name
+       BEGIN UPDATE catalog_names_version SET version = version + 1; END''',
+    '''CREATE TRIGGER IF NOT EXISTS medicines_delete_names_version AFTER DELETE ON medicines
+       BEGIN UPDATE catalog_names_version SET version = version + 1; END''',
+    # Order history pages walk this index newest-first (see orders.customer_orders_page)
+    '''CREATE INDEX IF NOT EXISTS idx_orders_customer_date ON orders (customer_id, order_date)''',
+    # Stock ledger (see ledger.py)
+    '''CREATE TABLE IF NOT EXISTS stock_movements
+       (movement_id INTEGER PRIMARY KEY, medicine_id INTEGER NOT NULL, moved_at TEXT NOT NULL,
+        kind TEXT NOT NULL CHECK (kind IN ('sale', 'restock', 'adjustment', 'expiry_write_off')),
+        quantity INTEGER NOT NULL, order_id INTEGER, note TEXT)''',
+    '''CREATE INDEX IF NOT EXISTS idx_stock_movements_medicine ON stock_movements (medicine_id, moved_at)''',
+    '''CREATE TABLE IF NOT EXISTS stock_snapshots
+       (snapshot_id INTEGER PRIMARY KEY, taken_at TEXT NOT NULL, last_movement_id INTEGER NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS stock_snapshot_items
+       (snapshot_id INTEGER NOT NULL, medicine_id INTEGER NOT NULL, stock INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, medicine_id))''',
+    # Carts live in the database so they survive a session moving to another server process
+    '''CREATE TABLE IF NOT EXISTS carts
+       (user_id INTEGER PRIMARY KEY, items TEXT NOT NULL, updated_at TEXT)''',
+    # Prescriptions read from uploads (see prescriptions.py); items keep the order they were written in
+    '''CREATE TABLE IF NOT EXISTS prescriptions
+       (prescription_id INTEGER PRIMARY KEY, customer_id INTEGER NOT NULL, uploaded_at TEXT NOT NULL,
+        doctor_name TEXT, patient_name TEXT, source TEXT,
+        image_hash INTEGER, duplicate_of INTEGER, needs_review INTEGER NOT NULL DEFAULT 0)''',
+    '''CREATE INDEX IF NOT EXISTS idx_prescriptions_customer_date ON prescriptions (customer_id, uploaded_at)''',
+    # Re-uploads waiting for a pharmacist (see prescriptions.flagged)
+    '''CREATE INDEX IF NOT EXISTS idx_prescriptions_review ON prescriptions (prescription_id) WHERE needs_review''',
+    '''CREATE TABLE IF NOT EXISTS prescription_items
+       (prescription_id INTEGER NOT NULL, position INTEGER NOT NULL, drug_name TEXT NOT NULL,
+        medicine_id INTEGER, quantity INTEGER, PRIMARY KEY (prescription_id, position))''',
+    # Orders placed from a prescription
+    '''CREATE INDEX IF NOT EXISTS idx_orders_prescription ON orders (prescription_id) WHERE prescription_id IS NOT NULL''',
+    # Last run of each maintenance task (see maintenance.py)
+    '''CREATE TABLE IF NOT EXISTS maintenance_runs
+       (task TEXT PRIMARY KEY, ran_at TEXT NOT NULL, seconds REAL, result TEXT)''',
+]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """
+    Bring tables created by earlier versions in line with SCHEMA. Run before it.
+    """
+    # The old free-text prescriptions table (drugs and quantities as strings) is kept aside
+    columns = _columns(conn, "prescriptions")
+    if columns and "prescription_id" not in columns:
+        conn.execute("ALTER TABLE prescriptions RENAME TO prescriptions_legacy")
+    elif columns and "image_hash" not in columns:
+        conn.execute("ALTER TABLE prescriptions ADD COLUMN image_hash INTEGER")
+        conn.execute("ALTER TABLE prescriptions ADD COLUMN duplicate_of INTEGER")
+        conn.execute("ALTER TABLE prescriptions ADD COLUMN needs_review INTEGER NOT NULL DEFAULT 0")
+    columns = _columns(conn, "orders")
+    if columns and "prescription_id" not in columns:
+        conn.execute("ALTER TABLE orders ADD COLUMN prescription_id INTEGER")
+    # The first pharmacy.db keyed medicines and users by `id`, and had no prices or monographs
+    columns = _columns(conn, "medicines")
+    if "id" in columns:
+        conn.execute("ALTER TABLE medicines RENAME COLUMN id TO medicine_id")
+    if columns and "price" not in columns:
+        conn.execute("ALTER TABLE medicines ADD COLUMN price REAL")
+    if columns and "info" not in columns:
+        conn.execute("ALTER TABLE medicines ADD COLUMN info TEXT")
+    if "id" in _columns(conn, "users"):
+        conn.execute("ALTER TABLE users RENAME COLUMN id TO user_id")
+
+
+def connect(path: str | None = None) -> sqlite3.Connection:
+    """
+    Open a connection whose statements are timed for the Performance page.
+    Writers from other processes are waited on for up to BUSY_TIMEOUT seconds.
+    On the PostgreSQL backend, a connection from the pool unless `path` names a SQLite file.
+    """
+    if path is None and BACKEND == "postgres":
+        return postgres.connect()
+    conn = sqlite3.connect(path or DB_PATH, timeout=BUSY_TIMEOUT, check_same_thread=False, factory=TimedConnection)
+    # Under WAL, NORMAL is still corruption-safe and skips an fsync on every commit
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+@contextmanager
+def connection(path: str | None = None):
+    """
+    Context manager around connect() that always closes the connection.
+    """
+    conn = connect(path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """
+    Create any missing tables and indexes, and switch the file to WAL so readers
+    in every server process keep going while one of them writes.
+    """
+    if postgres.is_postgres(conn):
+        postgres.init_db(conn)
+        init_monographs(conn)
+        init_ledger(conn)
+        return
+    c = conn.cursor()
+    # Only takes effect on a new, empty file; lets maintenance.vacuum() release free pages a few at a time
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    c.execute("PRAGMA journal_mode = WAL")
+    migrate(conn)
+    for statement in SCHEMA:
+        c.execute(statement)
+    conn.commit()
+    init_monographs(conn)
+    init_ledger(conn)
@@ -0,0 +1,112 @@
+# pharmacy/drug_info.py
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Starter descriptions for common drugs, copied into medicines.info on first run
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "drug_monographs.json")
+
+# How many rendered monographs to keep in memory per process
+CACHE_SIZE = 1024
+
+_cache = OrderedDict()  # (medicine_id, version, updated_at) -> rendered markdown
+_cache_lock = threading.Lock()
+_seeded = False
+
+
+def init_monographs(conn):
+    """
+    Create the drug_monographs table and seed medicines.info from SEED_FILE.
+    medicines.info holds the source text; drug_monographs holds the rendered
+    markdown and a version that is bumped on every edit.
+    """
+    global _seeded
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS drug_monographs
+                 (medicine_id INTEGER PRIMARY KEY, version INTEGER NOT NULL, rendered TEXT NOT NULL, updated_at TEXT)''')
+    if not _seeded:
+        with open(SEED_FILE, encoding="utf-8") as f:
+            seed = json.load(f)
+        c.executemany("UPDATE medicines SET info = ? WHERE name = ? AND (info IS NULL OR info = '')",
+                      [(body, name) for name, body in seed.items()])
+        _seeded = True
+    conn.commit()
+
+
+def render_monograph(name, body):
+    """
+    Build the markdown shown in the "More Info" dialog.
+    """
+    return f"### {name} Details\n\n{body}"
+
+
+def save_monograph(conn, medicine_id, name, body):
+    """
+    Store a drug description and its pre-rendered markdown, bumping the version
+    so stale cached copies are never served.
+    """
+    c = conn.cursor()
+    c.execute("UPDATE medicines SET info = ? WHERE medicine_id = ?", (body, medicine_id))
+    c.execute("""
+        INSERT INTO drug_monographs (medicine_id, version, rendered, updated_at) VALUES (?, 1, ?, ?)
+        ON CONFLICT (medicine_id) DO UPDATE
+        SET version = drug_monographs.version + 1, rendered = excluded.rendered, updated_at = excluded.updated_at
+    """, (medicine_id, render_monograph(name, body), datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')))
+    conn.commit()
+
+
+def get_monograph(conn, medicine_id):
+    """
+    Return the rendered monograph for a drug, or None if it has no description.
+    Only the version and write time are read on a cache hit; together they tell
+    a reused medicine_id's monograph from a deleted drug's, whose version also started at 1.
+    """
+    c = conn.cursor()
+    c.execute("SELECT version, updated_at FROM drug_monographs WHERE medicine_id = ?", (medicine_id,))
+    row = c.fetchone()
+
+    if row is None:
+        # Descriptions written straight into medicines.info are rendered on first view
+        refresh_monograph(conn, medicine_id)
+        c.execute("SELECT version, updated_at FROM drug_monographs WHERE medicine_id = ?", (medicine_id,))
+        row = c.fetchone()
+        if row is None:
+            return None
+
+    key = (medicine_id, row[0], row[1])
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    c.execute("SELECT rendered FROM drug_monographs WHERE medicine_id = ?", (medicine_id,))
+    rendered = c.fetchone()[0]
+    with _cache_lock:
+        _cache[key] = rendered
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rendered
+
+
+def refresh_monograph(conn, medicine_id):
+    """
+    Re-render a drug's monograph from medicines.info, e.g. after a rename.
+    """
+    c = conn.cursor()
+    c.execute("SELECT name, info FROM medicines WHERE medicine_id = ?", (medicine_id,))
+    drug = c.fetchone()
+    if drug and drug[1]:
+        save_monograph(conn, medicine_id, drug[0], drug[1])
+
+
+def delete_monograph(conn, medicine_id):
+    """
+    Drop a deleted drug's monograph and any cached copies of it.
+    """
+    conn.execute("DELETE FROM drug_monographs WHERE medicine_id = ?", (medicine_id,))
+    conn.commit()
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == medicine_id]:
+            del _cache[key]
@@ -0,0 +1,131 @@
+# pharmacy/entities.py
+#
+# Offline prescription entity extraction. A blank spaCy English pipeline with
+# an EntityRuler whose phrase patterns are the medicine names in the catalog
+# (and their short forms, e.g. "Dolo 650" for "Dolo 650 Tablet"), plus token
+# patterns for doctors, quantities and doses. It runs in-process on the CPU in
+# milliseconds and is built once per process, again only when medicines are
+# added, removed or renamed (catalog_names_version), like pos.prefix_index.
+import re
+import sqlite3
+import threading
+
+import spacy
+
+from pharmacy import catalog
+from pharmacy.perf import timed
+
+# Trailing words dropped from catalog names to get the short form prescriptions use
+NAME_SUFFIXES = re.compile(r"(\s+#\d+|\s+(tablets?|tabs?|capsules?|caps?|syrup|injection|suspension|drops|cream|ointment))+$",
+                           re.IGNORECASE)
+
+QUANTITY_KEYWORDS = ["tot", "total", "qty", "quantity", "x", "×"]
+QUANTITY_UNITS = ["tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "strip", "strips",
+                  "nos", "bottle", "bottles", "units"]
+DOSE_UNITS = ["mg", "mcg", "g", "ml", "iu", "%"]
+DURATION_UNITS = ["day", "days", "week", "weeks", "month", "months"]
+# Qualifications printed after a doctor's name
+DEGREES = {"mbbs", "md", "ms", "bds", "dnb", "frcs", "mrcp", "dm", "mch", "dch"}
+
+PATTERNS = [
+    # "Dr. Ravi Sharma", "DR RAVI", "Doctor: Mehta"
+    {"label": "DOCTOR", "pattern": [{"LOWER": {"IN": ["dr", "dr.", "doctor"]}}, {"ORTH": {"IN": [".", ":"]}, "OP": "?"},
+                                    {"IS_ALPHA": True, "IS_LOWER": False, "OP": "{1,3}"}]},
+    # "Tot: 10", "Qty 2", "x 3"
+    {"label": "QUANTITY", "pattern": [{"LOWER": {"IN": QUANTITY_KEYWORDS}}, {"ORTH": ":", "OP": "?"},
+                                      {"LIKE_NUM": True}]},
+    # "10 tabs", "2 strips"
+    {"label": "QUANTITY", "pattern": [{"LIKE_NUM": True}, {"LOWER": {"IN": QUANTITY_UNITS}}]},
+    # "500 mg" is a dose and "x 5 days" a duration, never quantities
+    {"label": "DOSE", "pattern": [{"LIKE_NUM": True}, {"LOWER": {"IN": DOSE_UNITS}}]},
+    {"label": "DURATION", "pattern": [{"LOWER": {"IN": ["x", "×", "for"]}, "OP": "?"}, {"LIKE_NUM": True},
+                                      {"LOWER": {"IN": DURATION_UNITS}}]},
+]
+
+# "PATIENT (M) / 34Y Ravi Kumar", "Patient Name: Ravi Kumar", "Patient: Ravi"
+PATIENT_LINE = re.compile(r"PATIENT\s*\([MF]\)\s*/\s*\d+Y\s*(.+)|Patient(?:'s)?(?:\s+Name)?\s*[:\-]\s*(.+)",
+                          re.IGNORECASE)
+
+
+def short_name(name: str) -> str:
+    return NAME_SUFFIXES.sub("", name).strip()
+
+
+class Extractor:
+    """
+    Doctor, patient, drug and quantity entities of prescription text, in the
+    JSON shape the LLM prompt asked for.
+    """
+    def __init__(self, names):
+        self.nlp = spacy.blank("en")
+        ruler = self.nlp.add_pipe("entity_ruler", config={"phrase_matcher_attr": "LOWER"})
+        drug_names = {}
+        for _, name in names:
+            for alias in (name, short_name(name or "")):
+                if alias and alias.lower() not in drug_names:
+                    drug_names[alias.lower()] = alias
+        ruler.add_patterns(PATTERNS + [{"label": "DRUG", "pattern": alias, "id": alias}
+                                       for alias in drug_names.values()])
+
+    @timed("stage", "entities")
+    def extract(self, text: str) -> dict:
+        entities = {"doctor_name": "", "patient_name": "", "drug_name": [], "quantity": []}
+        for ent in self.nlp(text).ents:
+            if ent.label_ == "DRUG":
+                if ent.ent_id_ not in entities["drug_name"]:
+                    entities["drug_name"].append(ent.ent_id_)
+                    entities["quantity"].append("")
+            elif ent.label_ == "QUANTITY":
+                # Quantities follow their drugs, on its line or a later one, so
+                # each goes to the earliest drug seen so far that has none yet
+                missing = entities["quantity"].index("") if "" in entities["quantity"] else None
+                if missing is not None:
+                    entities["quantity"][missing] = next(token.text for token in ent if token.like_num)
+            elif ent.label_ == "DOCTOR" and not entities["doctor_name"]:
+                entities["doctor_name"] = " ".join(token.text for token in ent[1:]
+                                                   if token.is_alpha and token.lower_ not in DEGREES)
+
+        patient = PATIENT_LINE.search(text)
+        if patient:
+            entities["patient_name"] = (patient.group(1) or patient.group(2)).strip()
+        return entities
+
+
+_extractor = None  # (catalog names version, Extractor)
+_extractor_lock = threading.Lock()
+
+
+def extractor(conn: sqlite3.Connection) -> Extractor:
+    """
+    This process's extractor for the current catalog.
+    """
+    global _extractor
+    version = catalog.names_version(conn)
+    with _extractor_lock:
+        if _extractor is None or _extractor[0] != version:
+            _extractor = (version, Extractor(catalog.medicine_names(conn)))
+        return _extractor[1]
+
+
+def merge(total: dict, page: dict) -> dict:
+    """
+    Add one page's entities to those of the pages before it: the first doctor
+    and patient name found are kept, and new drugs are added with their quantities.
+    """
+    for key in ("doctor_name", "patient_name"):
+        total[key] = total.get(key) or page.get(key, "")
+    drugs = total.setdefault("drug_name", [])
+    quantities = total.setdefault("quantity", [])
+    for drug, quantity in zip(page.get("drug_name", []), page.get("quantity", [])):
+        if drug not in drugs:
+            drugs.append(drug)
+            quantities.append(quantity)
+    return total
+
+
+def extract(conn: sqlite3.Connection, text: str) -> dict:
+    """
+    {"doctor_name": str, "patient_name": str, "drug_name": [str], "quantity": [str]}
+    for prescription text; quantity[i] is "" where none was found for drug_name[i].
+    """
+    return extractor(conn).extract(text)
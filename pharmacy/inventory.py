@@ -0,0 +1,48 @@
+# pharmacy/inventory.py
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from pharmacy.catalog import MEDICINE_COLUMNS
+from pharmacy.compact import columns
+
+# Stock above these levels shows green / orange, otherwise red
+STOCK_GREEN_ABOVE = 50
+STOCK_ORANGE_ABOVE = 20
+
+
+def drugs_near_expiry(conn: sqlite3.Connection, threshold_days: int = 90) -> list[tuple]:
+    """
+    Medicines expiring between today and `threshold_days` from now.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    threshold_date = (datetime.now() + timedelta(days=threshold_days)).strftime('%Y-%m-%d')
+    return conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines WHERE expiry_date <= ? AND expiry_date >= ?",
+                        (threshold_date, today)).fetchall()
+
+
+def expired_drugs(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    Medicines whose expiry date has passed.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    return conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines WHERE expiry_date < ?", (today,)).fetchall()
+
+
+def stock_of(conn: sqlite3.Connection, medicine_id: int) -> int | None:
+    row = conn.execute("SELECT stock FROM medicines WHERE medicine_id = ?", (medicine_id,)).fetchone()
+    return row[0] if row else None
+
+
+def grid_status(drugs, today: date | None = None, expiry_red_below: int = 90,
+                expiry_orange_below: int = 180) -> list[tuple]:
+    """
+    (stock_color, days_to_expiry, expiry_color) for every drug on a page, computed
+    over whole columns in one pass with a single "today", so cards only format them.
+    """
+    stock, expiry_ord = columns(drugs)
+    days = expiry_ord.astype(np.int64) - (today or date.today()).toordinal()
+    stock_colors = np.select([stock > STOCK_GREEN_ABOVE, stock > STOCK_ORANGE_ABOVE], ["green", "orange"], "red")
+    expiry_colors = np.select([days < expiry_red_below, days < expiry_orange_below], ["red", "orange"], "green")
+    return list(zip(stock_colors.tolist(), days.tolist(), expiry_colors.tolist()))
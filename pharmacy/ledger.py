@@ -0,0 +1,219 @@
+# pharmacy/ledger.py
+#
+# Append-only history of every stock change. medicines.stock stays the fast
+# "current stock" column; each change to it is paired, in the same
+# transaction, with a stock_movements row saying why (sale, restock,
+# adjustment, expiry write-off).
+#
+# Snapshots record every medicine's ledger balance up to a movement id, so
+# stock on any past date is the nearest earlier snapshot plus the movements
+# after it, never a replay from the beginning.
+#
+#   python -m pharmacy.ledger snapshot     take a snapshot now
+#   python -m pharmacy.ledger reconcile    compare medicines.stock with the ledger
+import argparse
+import sqlite3
+from datetime import datetime
+
+from pharmacy import postgres
+
+SALE = "sale"
+RESTOCK = "restock"
+ADJUSTMENT = "adjustment"
+EXPIRY_WRITE_OFF = "expiry_write_off"
+
+# Take a new snapshot once this many movements have piled up since the last
+# one; checked at startup and by the maintenance scheduler (maintenance.snapshot)
+SNAPSHOT_EVERY = 10_000
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def begin(conn: sqlite3.Connection) -> None:
+    """
+    Start a write transaction now, unless the caller already has one open, so
+    reads made before the first write can't be invalidated by another writer.
+    (On PostgreSQL the reads lock their rows instead; see postgres.for_update.)
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def record(conn: sqlite3.Connection, medicine_id: int, kind: str, quantity: int,
+           order_id: int | None = None, note: str | None = None) -> None:
+    """
+    Append one movement (quantity is signed: negative for stock going out).
+    Does not commit; call it inside the transaction that changes medicines.stock.
+    """
+    conn.execute("INSERT INTO stock_movements (medicine_id, moved_at, kind, quantity, order_id, note) "
+                 "VALUES (?, ?, ?, ?, ?, ?)", (medicine_id, _now(), kind, quantity, order_id, note))
+
+
+def init_ledger(conn: sqlite3.Connection) -> None:
+    """
+    Called from db.init_db(). Gives medicines that predate the ledger an opening
+    balance so the ledger agrees with medicines.stock from the start.
+    """
+    conn.execute("""
+        INSERT INTO stock_movements (medicine_id, moved_at, kind, quantity, note)
+        SELECT medicine_id, ?, 'adjustment', coalesce(stock, 0), 'opening balance'
+        FROM medicines
+        WHERE NOT EXISTS (SELECT 1 FROM stock_movements WHERE stock_movements.medicine_id = medicines.medicine_id)
+    """, (_now(),))
+    conn.commit()
+    maybe_snapshot(conn)
+
+
+def restock(conn: sqlite3.Connection, medicine_id: int, quantity: int, note: str | None = None) -> None:
+    begin(conn)
+    try:
+        conn.execute("UPDATE medicines SET stock = stock + ? WHERE medicine_id = ?", (quantity, medicine_id))
+        record(conn, medicine_id, RESTOCK, quantity, note=note)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def write_off_expired(conn: sqlite3.Connection) -> int:
+    """
+    Zero the stock of every expired medicine, recording each as an expiry
+    write-off. Returns the number of medicines written off.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    begin(conn)
+    try:
+        expired = conn.execute("SELECT medicine_id, stock FROM medicines WHERE expiry_date < ? AND stock > 0"
+                               + postgres.for_update(conn), (today,)).fetchall()
+        for medicine_id, stock in expired:
+            conn.execute("UPDATE medicines SET stock = 0 WHERE medicine_id = ?", (medicine_id,))
+            record(conn, medicine_id, EXPIRY_WRITE_OFF, -stock)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(expired)
+
+
+def _latest_snapshot(conn, before=None):
+    if before is None:
+        return conn.execute("SELECT snapshot_id, last_movement_id FROM stock_snapshots "
+                            "ORDER BY snapshot_id DESC LIMIT 1").fetchone()
+    return conn.execute("SELECT snapshot_id, last_movement_id FROM stock_snapshots WHERE taken_at <= ? "
+                        "ORDER BY taken_at DESC, snapshot_id DESC LIMIT 1", (before,)).fetchone()
+
+
+def take_snapshot(conn: sqlite3.Connection) -> int:
+    """
+    Record every medicine's ledger balance as of the latest movement, built from
+    the previous snapshot plus the movements since. Returns the snapshot id.
+    """
+    begin(conn)
+    try:
+        previous = _latest_snapshot(conn) or (None, 0)
+        last_movement_id = conn.execute("SELECT coalesce(max(movement_id), 0) FROM stock_movements").fetchone()[0]
+        c = conn.cursor()
+        c.execute("INSERT INTO stock_snapshots (taken_at, last_movement_id) VALUES (?, ?)", (_now(), last_movement_id))
+        snapshot_id = c.lastrowid
+        c.execute("""
+            INSERT INTO stock_snapshot_items (snapshot_id, medicine_id, stock)
+            SELECT ?, medicine_id, sum(quantity) FROM (
+                SELECT medicine_id, stock AS quantity FROM stock_snapshot_items WHERE snapshot_id = ?
+                UNION ALL
+                SELECT medicine_id, quantity FROM stock_movements WHERE movement_id > ? AND movement_id <= ?
+            ) balances
+            GROUP BY medicine_id
+        """, (snapshot_id, previous[0], previous[1], last_movement_id))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return snapshot_id
+
+
+def maybe_snapshot(conn: sqlite3.Connection, every: int = SNAPSHOT_EVERY) -> int | None:
+    """
+    Take a snapshot if at least `every` movements were recorded since the last one.
+    """
+    previous = _latest_snapshot(conn) or (None, 0)
+    pending = conn.execute("SELECT count(*) FROM stock_movements WHERE movement_id > ?", (previous[1],)).fetchone()[0]
+    return take_snapshot(conn) if pending >= every else None
+
+
+def stock_at(conn: sqlite3.Connection, medicine_id: int, when: str) -> int:
+    """
+    Stock of one medicine at `when` ('YYYY-MM-DD HH:MM:SS'; a bare date means the
+    start of that day), from the latest snapshot taken by then plus the movements after it.
+    """
+    snapshot = _latest_snapshot(conn, before=when)
+    base = 0
+    if snapshot:
+        row = conn.execute("SELECT stock FROM stock_snapshot_items WHERE snapshot_id = ? AND medicine_id = ?",
+                           (snapshot[0], medicine_id)).fetchone()
+        base = row[0] if row else 0
+    tail = conn.execute("""
+        SELECT coalesce(sum(quantity), 0) FROM stock_movements
+        WHERE medicine_id = ? AND moved_at <= ? AND movement_id > ?
+    """, (medicine_id, when, snapshot[1] if snapshot else 0)).fetchone()[0]
+    return base + tail
+
+
+def reconcile(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    Medicines whose stock column disagrees with the ledger, as
+    (medicine_id, name, stock, ledger_stock). Deleted medicines count as zero
+    stock (name None), so their ledger must have been closed. An empty list
+    means all agree.
+    """
+    snapshot = _latest_snapshot(conn) or (None, 0)
+    return conn.execute("""
+        SELECT b.medicine_id, m.name, coalesce(m.stock, 0), b.ledger_stock FROM (
+            SELECT medicine_id, sum(quantity) AS ledger_stock FROM (
+                SELECT medicine_id, stock AS quantity FROM stock_snapshot_items WHERE snapshot_id = ?
+                UNION ALL
+                SELECT medicine_id, quantity FROM stock_movements WHERE movement_id > ?
+                UNION ALL
+                SELECT medicine_id, 0 FROM medicines
+            ) parts
+            GROUP BY medicine_id
+        ) b
+        LEFT JOIN medicines m ON m.medicine_id = b.medicine_id
+        WHERE coalesce(m.stock, 0) != b.ledger_stock
+        ORDER BY b.medicine_id
+    """, (snapshot[0], snapshot[1])).fetchall()
+
+
+def movements(conn: sqlite3.Connection, medicine_id: int, limit: int = 50) -> list[tuple]:
+    """
+    The latest movements of one medicine as (moved_at, kind, quantity, order_id, note).
+    """
+    return conn.execute("""
+        SELECT moved_at, kind, quantity, order_id, note FROM stock_movements
+        WHERE medicine_id = ? ORDER BY moved_at DESC, movement_id DESC LIMIT ?
+    """, (medicine_id, limit)).fetchall()
+
+
+def main():
+    from pharmacy import db
+
+    parser = argparse.ArgumentParser(description="Stock ledger maintenance.")
+    parser.add_argument("command", choices=["snapshot", "reconcile"])
+    parser.add_argument("--db", help="database path (default: DAWAKHANA_DB or pharmacy.db)")
+    args = parser.parse_args()
+
+    with db.connection(args.db) as conn:
+        db.init_db(conn)
+        if args.command == "snapshot":
+            print(f"Snapshot {take_snapshot(conn)} taken.")
+        else:
+            mismatches = reconcile(conn)
+            for medicine_id, name, stock, ledger_stock in mismatches:
+                print(f"{medicine_id}\t{name or '(deleted)'}\tstock {stock}\tledger {ledger_stock}")
+            print(f"{len(mismatches)} medicine(s) out of step with the ledger.")
+            raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
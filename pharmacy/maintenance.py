@@ -0,0 +1,266 @@
+# pharmacy/maintenance.py
+#
+# Upkeep of the database file, run by a background thread in each server
+# process during quiet periods (no commit from any connection for
+# QUIET_SECONDS):
+#   backup    copy the live file with SQLite's online backup API, a few pages
+#             per step so checkout keeps writing in between, check the copy
+#             and keep the newest BACKUPS_KEPT
+#   optimize  refresh planner statistics (bounded ANALYZE, PRAGMA optimize)
+#   vacuum    hand free pages back to the file system with incremental_vacuum
+#   snapshot  snapshot the stock ledger once SNAPSHOT_EVERY movements have
+#             piled up since the last one (see ledger.maybe_snapshot)
+# Each task's last run is kept in maintenance_runs; a process claims a due
+# task there before running it, so several processes sharing one file don't
+# repeat each other's work.
+#
+#   python -m pharmacy.maintenance backup|optimize|vacuum|snapshot|stats
+import argparse
+import glob
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pharmacy import db, ledger
+from pharmacy.perf import timer
+
+BACKUP_DIR = os.environ.get("DAWAKHANA_BACKUP_DIR", "backups")
+BACKUPS_KEPT = int(os.environ.get("DAWAKHANA_BACKUPS_KEPT", "7"))
+# Set DAWAKHANA_MAINTENANCE=off to leave maintenance to the command line (or cron)
+ENABLED = os.environ.get("DAWAKHANA_MAINTENANCE", "on").lower() not in ("off", "0", "false")
+
+# Seconds between runs of each task
+BACKUP_EVERY = int(os.environ.get("DAWAKHANA_BACKUP_HOURS", "24")) * 3600
+OPTIMIZE_EVERY = 6 * 3600
+VACUUM_EVERY = 24 * 3600
+SNAPSHOT_CHECK_EVERY = 3600
+
+# The database counts as quiet once nothing has been committed for this long
+QUIET_SECONDS = 120
+CHECK_EVERY = 30
+
+# Pages copied per backup step, and the pause between steps
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_SLEEP = 0.05
+# Rows ANALYZE samples per index, so statistics stay cheap to refresh on a large file
+ANALYSIS_LIMIT = 1000
+# Free pages released per vacuum run
+VACUUM_PAGES = 5000
+# Free fraction of the file above which a file without incremental auto-vacuum is rebuilt once to get it
+REBUILD_FRAGMENTATION = 0.1
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def backup(conn: sqlite3.Connection, backup_dir: str | None = None, keep: int = BACKUPS_KEPT) -> str:
+    """
+    Copy the database to a timestamped file in `backup_dir` while it stays in
+    use, check the copy and drop all but the newest `keep`. Returns the copy's path.
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(conn.execute("PRAGMA database_list").fetchone()[2] or "memory"))[0]
+    path = os.path.join(backup_dir, f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+    partial = f"{path}.part"
+    target = sqlite3.connect(partial)
+    try:
+        # A step that finds the source changed by another connection restarts
+        # the copy, which is why this waits for a quiet period
+        conn.backup(target, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP)
+        check = _pragma(target, "quick_check")
+    except BaseException:
+        target.close()
+        os.remove(partial)
+        raise
+    target.close()
+    if check != "ok":
+        os.remove(partial)
+        raise sqlite3.DatabaseError(f"Backup failed its integrity check: {check}")
+    os.replace(partial, path)
+    for old in sorted(glob.glob(os.path.join(backup_dir, f"{stem}-*.db")))[:-keep]:
+        os.remove(old)
+    return path
+
+
+def optimize(conn: sqlite3.Connection) -> None:
+    """
+    Refresh the statistics the query planner picks indexes by.
+    """
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
+def vacuum(conn: sqlite3.Connection, pages: int = VACUUM_PAGES) -> int:
+    """
+    Release up to `pages` free pages to the file system. Returns how many were released.
+    """
+    free = _pragma(conn, "freelist_count")
+    if _pragma(conn, "auto_vacuum") != 2:
+        # Files created before init_db turned on incremental auto-vacuum need a
+        # one-off rebuild to switch; only worth it once there is a lot to reclaim
+        if free <= REBUILD_FRAGMENTATION * _pragma(conn, "page_count"):
+            return 0
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return free
+    # The pragma frees one page per step, and sqlite3's execute() steps a statement only once
+    conn.executescript(f"PRAGMA incremental_vacuum({pages});")
+    return free - _pragma(conn, "freelist_count")
+
+
+def snapshot(conn: sqlite3.Connection) -> int | None:
+    """
+    Snapshot the stock ledger if enough movements have piled up. Returns the snapshot id, if one was taken.
+    """
+    return ledger.maybe_snapshot(conn, ledger.SNAPSHOT_EVERY)
+
+
+def database_stats(conn: sqlite3.Connection) -> dict:
+    """
+    Size and fragmentation of the main database file: page size and count,
+    free pages, the free fraction, bytes in the file and in its WAL, the
+    auto-vacuum mode and the page cache budget of one connection, in bytes.
+    """
+    page_size = _pragma(conn, "page_size")
+    # cache_size is in pages when positive and in KiB when negative
+    cache_size = _pragma(conn, "cache_size")
+    pages = _pragma(conn, "page_count")
+    free = _pragma(conn, "freelist_count")
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    wal_path = f"{path}-wal"
+    return {
+        "page_size": page_size,
+        "pages": pages,
+        "free_pages": free,
+        "fragmentation": free / pages if pages else 0.0,
+        "size_bytes": page_size * pages,
+        "wal_bytes": os.path.getsize(wal_path) if path and os.path.exists(wal_path) else 0,
+        "auto_vacuum": AUTO_VACUUM_MODES.get(_pragma(conn, "auto_vacuum"), "unknown"),
+        "cache_bytes": cache_size * page_size if cache_size > 0 else -cache_size * 1024,
+    }
+
+
+def last_runs(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    (task, ran_at, seconds, result) of each task's most recent run.
+    """
+    return conn.execute("SELECT task, ran_at, seconds, result FROM maintenance_runs WHERE seconds IS NOT NULL "
+                        "ORDER BY task").fetchall()
+
+
+def run_task(conn: sqlite3.Connection, task: str) -> str:
+    """
+    Run one task now and record its outcome in maintenance_runs.
+    """
+    _, fn = TASKS[task]
+    ran_at, start = _now(), time.perf_counter()
+    try:
+        with timer("maintenance", task):
+            result = fn(conn)
+        result = "ok" if result is None else f"ok: {result}"
+    except (sqlite3.Error, OSError) as e:
+        result = f"failed: {e}"
+    conn.execute("INSERT INTO maintenance_runs (task, ran_at, seconds, result) VALUES (?, ?, ?, ?) "
+                 "ON CONFLICT (task) DO UPDATE SET ran_at = excluded.ran_at, seconds = excluded.seconds, "
+                 "result = excluded.result",
+                 (task, ran_at, time.perf_counter() - start, result))
+    conn.commit()
+    return result
+
+
+def _claim(conn, task, every):
+    # One process wins the UPDATE for a due task; the others see it already ran
+    due_before = (datetime.now() - timedelta(seconds=every)).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute("INSERT OR IGNORE INTO maintenance_runs (task, ran_at) VALUES (?, '')", (task,))
+    claimed = conn.execute("UPDATE maintenance_runs SET ran_at = ? WHERE task = ? AND ran_at <= ?",
+                           (_now(), task, due_before)).rowcount
+    conn.commit()
+    return claimed == 1
+
+
+TASKS = {
+    "backup": (BACKUP_EVERY, backup),
+    "optimize": (OPTIMIZE_EVERY, optimize),
+    "vacuum": (VACUUM_EVERY, vacuum),
+    "snapshot": (SNAPSHOT_CHECK_EVERY, snapshot),
+}
+
+
+class Scheduler:
+    """
+    Runs due tasks on its own connection once the database has been quiet for QUIET_SECONDS.
+    """
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._thread = threading.Thread(target=self._loop, name="pharmacy-maintenance", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        conn = db.connect(self.path)
+        last_version, quiet_since = None, time.monotonic()
+        while True:
+            time.sleep(CHECK_EVERY)
+            try:
+                # data_version changes whenever another connection commits
+                version = _pragma(conn, "data_version")
+                if version != last_version:
+                    last_version, quiet_since = version, time.monotonic()
+                    continue
+                if time.monotonic() - quiet_since < QUIET_SECONDS:
+                    continue
+                for task, (every, _) in TASKS.items():
+                    if _claim(conn, task, every):
+                        run_task(conn, task)
+                last_version = _pragma(conn, "data_version")
+            except sqlite3.Error:
+                continue
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start() -> None:
+    """
+    Start this process's scheduler, unless DAWAKHANA_MAINTENANCE is off or the
+    database is PostgreSQL (whose autovacuum and backups are the server's business).
+    """
+    global _scheduler
+    if not ENABLED or db.BACKEND != "sqlite" or _scheduler is not None:
+        return
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database maintenance.")
+    parser.add_argument("command", choices=[*TASKS, "stats"])
+    parser.add_argument("--db", help="database path (default: DAWAKHANA_DB or pharmacy.db)")
+    args = parser.parse_args()
+
+    with db.connection(args.db) as conn:
+        db.init_db(conn)
+        if args.command == "stats":
+            for key, value in database_stats(conn).items():
+                print(f"{key}\t{value}")
+        else:
+            result = run_task(conn, args.command)
+            print(f"{args.command}: {result}")
+            raise SystemExit(0 if result.startswith("ok") else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# pharmacy/ocr.py
+#
+# OCR engines for prescriptions. The preferred backend keeps a process-wide
+# pool of tesserocr.PyTessBaseAPI objects, so the language model is loaded
+# once per API rather than per call (or per Streamlit rerun, each of which runs
+# on a fresh thread) and images are handed over in memory; pytesseract, which starts a
+# tesseract process and writes a temp file per call, is the fallback when
+# tesserocr isn't installed.
+#
+# Results are Words: one row per recognised word with its box, confidence and
+# line number, held column-wise like compact.CompactCatalog, so callers can
+# drop low-confidence noise or keep just one region of the page.
+#
+# A page is cut into text regions (lines merged into blocks by dilation) and
+# the crops are recognised in parallel on a thread pool; tesserocr releases
+# the GIL while recognising, so the workers really run side by side.
+#
+# Settings come from the environment:
+#   DAWAKHANA_OCR_LANG      tesseract languages, e.g. "eng" or "eng+hin" (default eng)
+#   DAWAKHANA_OCR_PSM       page segmentation mode for whole pages (default 3, automatic)
+#   DAWAKHANA_OCR_OEM       engine mode (default 3, whatever is available)
+#   DAWAKHANA_OCR_WORKERS   region OCR threads (default: CPU count)
+#   DAWAKHANA_TESSDATA      tessdata directory, if not the system default
+#   DAWAKHANA_TESSERACT_CMD tesseract executable for the pytesseract fallback (default: found on PATH)
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+from pharmacy.perf import timed
+
+LANG = os.environ.get("DAWAKHANA_OCR_LANG", "eng")
+PSM = int(os.environ.get("DAWAKHANA_OCR_PSM", "3"))
+OEM = int(os.environ.get("DAWAKHANA_OCR_OEM", "3"))
+WORKERS = int(os.environ.get("DAWAKHANA_OCR_WORKERS", "0")) or os.cpu_count() or 1
+TESSDATA = os.environ.get("DAWAKHANA_TESSDATA")
+TESSERACT_CMD = os.environ.get("DAWAKHANA_TESSERACT_CMD")
+
+# Page segmentation mode for one region crop: a uniform block of text
+REGION_PSM = 6
+# Regions smaller than this (pixels) are specks, not text
+MIN_REGION_HEIGHT = 8
+MIN_REGION_WIDTH = 8
+# White border added around each crop; tesseract reads text touching the edge poorly
+REGION_PADDING = 10
+
+
+class Words:
+    """
+    Recognised words in reading order, column-wise (image_to_data style): text,
+    box (left, top, width, height in page pixels), confidence 0-100 and line,
+    a number shared by the words of one text line and increasing down the page.
+    """
+    __slots__ = ("text", "left", "top", "width", "height", "conf", "line")
+
+    def __init__(self, text, left, top, width, height, conf, line):
+        self.text = text
+        self.left = np.asarray(left, dtype=np.int32)
+        self.top = np.asarray(top, dtype=np.int32)
+        self.width = np.asarray(width, dtype=np.int32)
+        self.height = np.asarray(height, dtype=np.int32)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.line = np.asarray(line, dtype=np.int32)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [], [])
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        One Words from (words, dx, dy) parts, e.g. region crops, shifting each
+        part's boxes by its offset and renumbering lines so they stay distinct.
+        """
+        parts = [(words, dx, dy) for words, dx, dy in parts if len(words)]
+        if not parts:
+            return cls.empty()
+        lines, next_line = [], 0
+        for words, _, _ in parts:
+            lines.append(np.unique(words.line, return_inverse=True)[1] + next_line)
+            next_line = int(lines[-1].max()) + 1
+        return cls([text for words, _, _ in parts for text in words.text],
+                   np.concatenate([words.left + dx for words, dx, _ in parts]),
+                   np.concatenate([words.top + dy for words, _, dy in parts]),
+                   np.concatenate([words.width for words, _, _ in parts]),
+                   np.concatenate([words.height for words, _, _ in parts]),
+                   np.concatenate([words.conf for words, _, _ in parts]),
+                   np.concatenate(lines))
+
+    def __len__(self):
+        return len(self.text)
+
+    def select(self, mask):
+        rows = np.flatnonzero(mask)
+        return Words([self.text[row] for row in rows], self.left[rows], self.top[rows], self.width[rows],
+                     self.height[rows], self.conf[rows], self.line[rows])
+
+    # Masks over all words; combine with & and |
+    def confident(self, minimum):
+        return self.conf >= minimum
+
+    def below(self, y):
+        return self.top >= y
+
+    def lines(self, mask=None) -> list[tuple[int, int, str]]:
+        """
+        (line, top, text) for each line with a word in `mask` (all words if None).
+        """
+        words = self if mask is None else self.select(mask)
+        result = []
+        for line in np.unique(words.line):
+            rows = np.flatnonzero(words.line == line)
+            result.append((int(line), int(words.top[rows].min()), " ".join(words.text[row] for row in rows)))
+        return result
+
+    def joined(self, mask=None) -> str:
+        return "\n".join(text for _, _, text in self.lines(mask))
+
+
+class TesserocrEngine:
+    """
+    Up to `size` persistent PyTessBaseAPIs, shared by every thread of the
+    process and handed out one call at a time.
+    """
+    def __init__(self, lang: str = LANG, psm: int = PSM, oem: int = OEM, tessdata: str | None = TESSDATA,
+                 size: int = WORKERS):
+        self.lang = lang
+        self.psm = psm
+        self.oem = oem
+        self.tessdata = tessdata
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        options = {"lang": self.lang, "oem": tesserocr.OEM(self.oem)}
+        if self.tessdata:
+            options["path"] = self.tessdata
+        return tesserocr.PyTessBaseAPI(**options)
+
+    @contextmanager
+    def _api(self):
+        # An API is used by one thread at a time; more callers than APIs wait for one to come back
+        with self._slots:
+            try:
+                api = self._idle.get_nowait()
+            except queue.Empty:
+                api = self._open()
+            try:
+                yield api
+            except BaseException:
+                api.End()
+                raise
+            self._idle.put(api)
+
+    def recognize(self, image: Image.Image, psm: int | None = None) -> Words:
+        with self._api() as api:
+            return self._recognize(api, image, psm)
+
+    def _recognize(self, api, image, psm):
+        api.SetPageSegMode(tesserocr.PSM(self.psm if psm is None else psm))
+        api.SetImage(image)
+        api.Recognize()
+        columns = ([], [], [], [], [], [], [])
+        line = -1
+        iterator = api.GetIterator()
+        if iterator is None:
+            return Words.empty()
+        for word in tesserocr.iterate_level(iterator, tesserocr.RIL.WORD):
+            if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line += 1
+            text = word.GetUTF8Text(tesserocr.RIL.WORD)
+            if not text or not text.strip():
+                continue
+            x1, y1, x2, y2 = word.BoundingBox(tesserocr.RIL.WORD)
+            for column, value in zip(columns, (text, x1, y1, x2 - x1, y2 - y1,
+                                               word.Confidence(tesserocr.RIL.WORD), max(line, 0))):
+                column.append(value)
+        return Words(*columns)
+
+
+class PytesseractEngine:
+    """
+    A tesseract process per call. Slower, but needs only the tesseract binary.
+    """
+    def __init__(self, lang: str = LANG, psm: int = PSM, oem: int = OEM, tessdata: str | None = TESSDATA):
+        import pytesseract
+        if TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.psm = psm
+        self.oem = oem
+        self.tessdata = tessdata
+
+    def recognize(self, image: Image.Image, psm: int | None = None) -> Words:
+        config = f"--psm {self.psm if psm is None else psm} --oem {self.oem}"
+        if self.tessdata:
+            config += f' --tessdata-dir "{self.tessdata}"'
+        data = self._pytesseract.image_to_data(image, lang=self.lang, config=config,
+                                               output_type=self._pytesseract.Output.DICT)
+        # Level 5 rows are words; lines are numbered within paragraphs within blocks
+        rows = [i for i, level in enumerate(data["level"]) if level == 5 and data["text"][i].strip()]
+        line_keys = [(data["block_num"][i], data["par_num"][i], data["line_num"][i]) for i in rows]
+        line_numbers = {key: number for number, key in enumerate(dict.fromkeys(line_keys))}
+        return Words([data["text"][i] for i in rows], [data["left"][i] for i in rows],
+                     [data["top"][i] for i in rows], [data["width"][i] for i in rows],
+                     [data["height"][i] for i in rows], [float(data["conf"][i]) for i in rows],
+                     [line_numbers[key] for key in line_keys])
+
+
+_engine = None
+_pool = None
+_lock = threading.Lock()
+
+
+def engine():
+    """
+    This process's OCR engine: tesserocr if it is installed, otherwise pytesseract.
+    """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = TesserocrEngine() if tesserocr is not None else PytesseractEngine()
+    return _engine
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="pharmacy-ocr")
+    return _pool
+
+
+def text_regions(binary: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """
+    Bounding boxes (x, y, w, h) of the text regions of a black-on-white page,
+    top to bottom then left to right. Characters are smeared together
+    horizontally into lines, and lines a short gap apart into blocks.
+    """
+    height, width = binary.shape
+    ink = cv2.bitwise_not(binary)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // 40, 15), max(height // 200, 3)))
+    merged = cv2.dilate(ink, kernel, iterations=2)
+    contours, _ = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(contour) for contour in contours]
+    boxes = [box for box in boxes if box[2] >= MIN_REGION_WIDTH and box[3] >= MIN_REGION_HEIGHT]
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def _crop(binary, box):
+    x, y, w, h = box
+    region = binary[y:y + h, x:x + w]
+    padded = cv2.copyMakeBorder(region, REGION_PADDING, REGION_PADDING, REGION_PADDING, REGION_PADDING,
+                                cv2.BORDER_CONSTANT, value=255)
+    return Image.fromarray(padded)
+
+
+@timed("stage", "ocr_regions")
+def recognize_page(image: Image.Image, parallel: bool = True) -> Words:
+    """
+    Words of one preprocessed (binary, black text on white) page. Regions are
+    recognised concurrently and their words placed back in page coordinates,
+    in reading order; a page with a single region, or none found, is recognised whole.
+    """
+    ocr = engine()
+    if not parallel:
+        return ocr.recognize(image)
+    binary = np.array(image.convert("L"))
+    boxes = text_regions(binary)
+    if len(boxes) <= 1:
+        return ocr.recognize(image)
+
+    crops = [_crop(binary, box) for box in boxes]
+    results = _executor().map(lambda crop: ocr.recognize(crop, psm=REGION_PSM), crops)
+    return Words.concat((words, x - REGION_PADDING, y - REGION_PADDING)
+                        for words, (x, y, _, _) in zip(results, boxes))
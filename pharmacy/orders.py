@@ -0,0 +1,161 @@
+# pharmacy/orders.py
+import csv
+import io
+import sqlite3
+from datetime import datetime
+
+from pharmacy import ledger, pdf, postgres
+
+# Order rows are (order_id, order_date, drug_name, quantity, total_amount)
+ORDER_SELECT = """
+    SELECT orders.order_id, orders.order_date, medicines.name, orders.quantity, orders.total_amount
+    FROM orders
+    JOIN medicines ON orders.drug_id = medicines.medicine_id
+"""
+
+# Rows per page of order history, and per batch when exporting
+HISTORY_PAGE_SIZE = 50
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_HEADER = ["Order ID", "Order Date", "Drug Name", "Quantity", "Total Amount"]
+# Column widths of the PDF export, in characters
+PDF_WIDTHS = [9, 19, 40, 8, 12]
+
+
+class InsufficientStock(Exception):
+    """
+    Raised by place_order when a cart item asks for more than is in stock.
+    """
+    def __init__(self, drug_name, available):
+        super().__init__(f"Insufficient stock for {drug_name}. Available: {available}")
+        self.drug_name = drug_name
+        self.available = available
+
+
+def place_order(conn: sqlite3.Connection, customer_id: int, items: list[dict]) -> list[int]:
+    """
+    Place one order row per cart item, decrement stock and record each sale in
+    the stock ledger, all in one transaction.
+    Items are cart dicts with drug_id, drug_name, quantity and total, and a
+    prescription_id if they were added from a stored prescription.
+    Nothing is written if any item is short on stock. Returns the new order ids,
+    none for an empty cart.
+    """
+    if not items:
+        return []
+    c = conn.cursor()
+    order_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    order_ids = []
+    try:
+        if postgres.is_postgres(conn):
+            # Lock the cart's medicines up front, in id order, so checkouts sharing
+            # drugs queue on those rows (and only those) instead of deadlocking
+            drug_ids = sorted({item['drug_id'] for item in items})
+            c.execute(f"SELECT medicine_id FROM medicines WHERE medicine_id IN ({','.join(['?'] * len(drug_ids))}) "
+                      "ORDER BY medicine_id FOR UPDATE", drug_ids)
+        for item in items:
+            # Check and decrement in one statement so concurrent checkouts (other
+            # sessions, the HTTP API) can never both take the last units
+            c.execute("UPDATE medicines SET stock = stock - ? WHERE medicine_id = ? AND stock >= ?",
+                      (item['quantity'], item['drug_id'], item['quantity']))
+            if c.rowcount == 0:
+                c.execute("SELECT stock FROM medicines WHERE medicine_id = ?", (item['drug_id'],))
+                row = c.fetchone()
+                raise InsufficientStock(item['drug_name'], row[0] if row else 0)
+
+            c.execute("INSERT INTO orders (order_date, customer_id, drug_id, quantity, total_amount, prescription_id) "
+                      "VALUES (?, ?, ?, ?, ?, ?)",
+                      (order_date, customer_id, item['drug_id'], item['quantity'], item['total'],
+                       item.get('prescription_id')))
+            order_ids.append(c.lastrowid)
+            ledger.record(conn, item['drug_id'], ledger.SALE, -item['quantity'], order_id=c.lastrowid)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return order_ids
+
+
+def all_orders(conn: sqlite3.Connection) -> list[tuple]:
+    return conn.execute(ORDER_SELECT).fetchall()
+
+
+def customer_orders(conn: sqlite3.Connection, customer_id: int) -> list[tuple]:
+    return conn.execute(ORDER_SELECT + " WHERE orders.customer_id = ?", (customer_id,)).fetchall()
+
+
+def customer_orders_page(conn: sqlite3.Connection, customer_id: int, limit: int = HISTORY_PAGE_SIZE,
+                         after: tuple | None = None) -> list[tuple]:
+    """
+    One page of a customer's orders, newest first. Pass the last row of the
+    previous page as `after` to get the next one. Each page is a range scan on
+    idx_orders_customer_date, so page 100 costs the same as page 1.
+    """
+    if after is None:
+        return conn.execute(ORDER_SELECT + """
+            WHERE orders.customer_id = ?
+            ORDER BY orders.order_date DESC, orders.order_id DESC LIMIT ?
+        """, (customer_id, limit)).fetchall()
+    return conn.execute(ORDER_SELECT + """
+        WHERE orders.customer_id = ? AND (orders.order_date, orders.order_id) < (?, ?)
+        ORDER BY orders.order_date DESC, orders.order_id DESC LIMIT ?
+    """, (customer_id, after[1], after[0], limit)).fetchall()
+
+
+def customer_baskets_page(conn: sqlite3.Connection, customer_id: int, limit: int = HISTORY_PAGE_SIZE,
+                          after: tuple | None = None) -> list[tuple]:
+    """
+    One page of a customer's baskets (the orders placed in one checkout), newest
+    first, as (order_date, items, units, total_amount). Pass the last row of the
+    previous page as `after` to get the next one.
+    """
+    where = "customer_id = ?" if after is None else "customer_id = ? AND order_date < ?"
+    params = (customer_id,) if after is None else (customer_id, after[0])
+    return conn.execute(f"""
+        SELECT order_date, count(*), sum(quantity), sum(total_amount)
+        FROM orders
+        WHERE {where}
+        GROUP BY order_date
+        ORDER BY order_date DESC LIMIT ?
+    """, params + (limit,)).fetchall()
+
+
+def iter_customer_orders(conn: sqlite3.Connection, customer_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Every order of a customer, newest first, fetched `batch_size` rows at a time.
+    """
+    after = None
+    while True:
+        rows = customer_orders_page(conn, customer_id, batch_size, after)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1]
+
+
+def export_orders_csv(conn: sqlite3.Connection, customer_id: int):
+    """
+    A customer's order history as CSV, yielded line by line so the whole
+    history is never held in memory.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        return buffer.getvalue()
+
+    yield line(EXPORT_HEADER)
+    for row in iter_customer_orders(conn, customer_id):
+        yield line(row)
+
+
+def export_orders_pdf(conn: sqlite3.Connection, customer_id: int):
+    """
+    A customer's order history as a PDF, yielded a page at a time (see pdf.py).
+    """
+    rows = ((order_id, order_date, name, quantity, f"{total:,.2f}")
+            for order_id, order_date, name, quantity, total in iter_customer_orders(conn, customer_id))
+    yield from pdf.stream_table("Order history", EXPORT_HEADER, rows, PDF_WIDTHS)
@@ -0,0 +1,89 @@
+# pharmacy/pdf.py
+#
+# A minimal PDF writer for tabular exports. Pages are built one at a time and
+# yielded as bytes as soon as they are full, so a long report never sits in
+# memory; only the byte offset of each object is kept, for the cross-reference
+# table at the end. Text is set in Courier (one of the 14 fonts every PDF
+# reader has), so columns line up without font metrics and nothing is embedded.
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4, in points
+MARGIN = 40
+FONT_SIZE = 9
+LEADING = 12
+CHAR_WIDTH = FONT_SIZE * 0.6  # every Courier glyph is 600/1000 em wide
+
+_CATALOG, _PAGES, _FONT = 1, 2, 3
+
+
+def _text(value):
+    # Latin-1 covers the font's WinAnsi encoding closely enough for names and numbers
+    text = str(value).encode("latin-1", "replace")
+    return text.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _fit(values, widths):
+    cells = []
+    for value, width in zip(values, widths):
+        value = "" if value is None else str(value)
+        cells.append(value[:width - 1] + "~" if len(value) > width else value.ljust(width))
+    return " ".join(cells).rstrip()
+
+
+def stream_table(title: str, header: list[str], rows, widths: list[int]):
+    """
+    Yield a PDF of `rows` (any iterable, read once) under a title and a column
+    header repeated on every page. `widths` are column widths in characters;
+    longer values are cut short and end in "~".
+    """
+    lines_per_page = (PAGE_HEIGHT - 2 * MARGIN) // LEADING - 3  # title, header and a blank line
+    offsets = {}
+    position = 0
+    page_ids = []
+    next_id = _FONT + 1
+
+    def obj(object_id, body):
+        nonlocal position
+        offsets[object_id] = position
+        data = b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+        position += len(data)
+        return data
+
+    def page(lines, number):
+        nonlocal next_id
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        page_ids.append(page_id)
+        text = [b"BT", b"/F1 %d Tf" % FONT_SIZE, b"%d TL" % LEADING,
+                b"%d %d Td" % (MARGIN, PAGE_HEIGHT - MARGIN - FONT_SIZE),
+                b"(%s) Tj T*" % _text(f"{title} - page {number}"), b"T*",
+                b"(%s) Tj T*" % _text(_fit(header, widths))]
+        text += [b"(%s) Tj T*" % _text(line) for line in lines]
+        text.append(b"ET")
+        stream = b"\n".join(text)
+        return (obj(content_id, b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+                + obj(page_id, b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                               b"/Resources << /Font << /F1 %d 0 R >> >> >>"
+                      % (_PAGES, PAGE_WIDTH, PAGE_HEIGHT, content_id, _FONT)))
+
+    header_bytes = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header_bytes)
+    yield header_bytes
+    yield obj(_CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % _PAGES)
+    yield obj(_FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+
+    lines = []
+    for row in rows:
+        lines.append(_fit(row, widths))
+        if len(lines) == lines_per_page:
+            yield page(lines, len(page_ids) + 1)
+            lines = []
+    if lines or not page_ids:
+        yield page(lines, len(page_ids) + 1)
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    yield obj(_PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+
+    xref = [b"xref\n0 %d\n" % next_id, b"0000000000 65535 f \n"]
+    xref += [b"%010d 00000 n \n" % offsets[object_id] for object_id in range(1, next_id)]
+    yield b"".join(xref) + b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        next_id, _CATALOG, position)
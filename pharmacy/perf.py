@@ -0,0 +1,247 @@
+# pharmacy/perf.py
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Samples kept per (kind, name) for percentiles; counts and sums cover the whole process lifetime
+SAMPLE_WINDOW = 1000
+# Queries slower than this are kept (with their parameters) for EXPLAIN QUERY PLAN;
+# parameters of statements on these tables (password hashes) are kept as NULLs
+SLOW_QUERY_SECONDS = float(os.environ.get("DAWAKHANA_SLOW_QUERY_MS", "50")) / 1000
+SLOW_LOG_SIZE = 50
+REDACTED_TABLES = re.compile(r"\busers\b", re.IGNORECASE)
+# Prometheus textfile-collector output, written at most every METRICS_FILE_INTERVAL seconds
+METRICS_FILE = os.environ.get("DAWAKHANA_METRICS_FILE")
+METRICS_FILE_INTERVAL = 15
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=SAMPLE_WINDOW))  # (kind, name) -> recent durations
+_counts = defaultdict(int)
+_totals = defaultdict(float)
+_errors = defaultdict(int)
+_slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+_last_metrics_write = 0.0
+
+
+def record(kind, name, seconds, error=False):
+    """
+    Record one timing. `kind` groups related spans ("query", "stage", "page", ...).
+    """
+    key = (kind, name)
+    with _lock:
+        _samples[key].append(seconds)
+        _counts[key] += 1
+        _totals[key] += seconds
+        if error:
+            _errors[key] += 1
+
+
+@contextmanager
+def timer(kind, name):
+    """
+    Time the enclosed block and record it under (kind, name).
+    """
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record(kind, name, time.perf_counter() - start, error)
+
+
+def timed(kind, name=None):
+    """
+    Decorator form of timer(); the span name defaults to the function name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(kind, name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _query_name(sql):
+    # Collapse whitespace so the same statement always lands in the same bucket
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _redact(sql, params):
+    # Same shape as the original, so the statement can still be explained
+    if not REDACTED_TABLES.search(sql):
+        return params
+    if isinstance(params, dict):
+        return dict.fromkeys(params)
+    return (None,) * len(params)
+
+
+def record_query(sql, params, seconds, error=False, many=False):
+    """
+    Record one statement under ("query", <normalized SQL>), keeping it for the
+    slow query log if it took SLOW_QUERY_SECONDS or more.
+    """
+    name = _query_name(sql)
+    record("query", name, seconds, error)
+    if seconds >= SLOW_QUERY_SECONDS and not many:
+        with _lock:
+            _slow_queries.append({
+                "at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "sql": name,
+                "params": _redact(name, params),
+                "ms": seconds * 1000,
+            })
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that records every statement under ("query", <normalized SQL>)
+    and keeps slow ones for the slow query log.
+    """
+    def _timed(self, method, sql, params, many=False):
+        start = time.perf_counter()
+        error = False
+        try:
+            return method(sql, params)
+        except Exception:
+            error = True
+            raise
+        finally:
+            record_query(sql, params, time.perf_counter() - start, error, many)
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(super().executemany, sql, seq_of_params, many=True)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors (including conn.execute shortcuts) are TimedCursors.
+    Use with sqlite3.connect(..., factory=TimedConnection).
+    """
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def stats(kind=None):
+    """
+    Summaries per (kind, name): count, errors, p50/p95/max over the recent window and total time.
+    Sorted by total time, so the hottest paths come first.
+    """
+    with _lock:
+        snapshot = [(key, sorted(samples), _counts[key], _totals[key], _errors[key])
+                    for key, samples in _samples.items() if kind is None or key[0] == kind]
+    rows = []
+    for (k, name), samples, count, total, errors in snapshot:
+        rows.append({
+            "kind": k,
+            "name": name,
+            "count": count,
+            "errors": errors,
+            "p50_ms": _percentile(samples, 0.50) * 1000,
+            "p95_ms": _percentile(samples, 0.95) * 1000,
+            "max_ms": samples[-1] * 1000,
+            "total_ms": total * 1000,
+        })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def slow_queries():
+    """
+    Most recent slow queries, newest first.
+    """
+    with _lock:
+        return list(reversed(_slow_queries))
+
+
+def explain(conn, sql, params=()):
+    """
+    EXPLAIN QUERY PLAN for a statement, as a list of plan detail strings.
+    """
+    if not isinstance(conn, sqlite3.Connection):
+        return conn.explain(sql, params)  # postgres.Connection
+    c = sqlite3.Connection.cursor(conn)  # Plain cursor, so explaining is not itself recorded
+    c.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [row[3] for row in c.fetchall()]
+
+
+def reset():
+    with _lock:
+        for store in (_samples, _counts, _totals, _errors):
+            store.clear()
+        _slow_queries.clear()
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def render_prometheus():
+    """
+    All recorded spans in the Prometheus text exposition format.
+    """
+    lines = [
+        "# HELP dawakhana_duration_seconds Time spent per query, pipeline stage and page.",
+        "# TYPE dawakhana_duration_seconds summary",
+    ]
+    rows = stats()
+    for row in rows:
+        labels = f'kind="{_label(row["kind"])}",name="{_label(row["name"])}"'
+        lines.append(f'dawakhana_duration_seconds{{{labels},quantile="0.5"}} {row["p50_ms"] / 1000:.6f}')
+        lines.append(f'dawakhana_duration_seconds{{{labels},quantile="0.95"}} {row["p95_ms"] / 1000:.6f}')
+        lines.append(f'dawakhana_duration_seconds_sum{{{labels}}} {row["total_ms"] / 1000:.6f}')
+        lines.append(f'dawakhana_duration_seconds_count{{{labels}}} {row["count"]}')
+    lines.append("# HELP dawakhana_errors_total Spans that raised an exception.")
+    lines.append("# TYPE dawakhana_errors_total counter")
+    for row in rows:
+        labels = f'kind="{_label(row["kind"])}",name="{_label(row["name"])}"'
+        lines.append(f'dawakhana_errors_total{{{labels}}} {row["errors"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """
+    Write metrics atomically, for node_exporter's textfile collector.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def maybe_write_prometheus():
+    """
+    Write METRICS_FILE if it is configured and the last write is old enough.
+    Cheap enough to call at the end of every rerun.
+    """
+    global _last_metrics_write
+    if not METRICS_FILE:
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _last_metrics_write < METRICS_FILE_INTERVAL:
+            return
+        _last_metrics_write = now
+    write_prometheus(METRICS_FILE)
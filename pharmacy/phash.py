@@ -0,0 +1,48 @@
+# pharmacy/phash.py
+#
+# Perceptual hashes of prescription images, so a re-upload of the same
+# prescription (re-compressed, rescaled, slightly re-cropped) is recognised
+# without reading it again. The hash is the DCT pHash: the sign pattern of the
+# lowest 8x8 frequencies of a 32x32 thumbnail against their median, which
+# survives the pixel-level changes those edits make. Hashes are 64-bit and
+# stored as signed SQLite integers; similarity is the Hamming distance.
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+THUMBNAIL_SIZE = 32
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(THUMBNAIL_SIZE)
+
+
+def phash(image: Image.Image) -> int:
+    """
+    64-bit perceptual hash of an image, as a signed integer.
+    """
+    thumbnail = np.asarray(image.convert("L").resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS),
+                           dtype=np.float64)
+    low = (_DCT @ thumbnail @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is the average brightness, which says nothing about layout
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big", signed=True)
+
+
+def distances(hashes: np.ndarray, image_hash: int) -> np.ndarray:
+    """
+    Hamming distance from `image_hash` to every hash in an int64 array.
+    """
+    # Unsigned, since bitwise_count counts the bits of a signed integer's absolute value
+    xor = (hashes ^ np.int64(image_hash)).view(np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    # NumPy < 2.0
+    return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
@@ -0,0 +1,73 @@
+# pharmacy/pos.py
+#
+# Lookups for the point-of-sale counter. Medicine names are held in memory as
+# a sorted list of keys, so a scan or a typed prefix is a binary search instead
+# of a LIKE query. The index only holds ids and names, so it is rebuilt when
+# catalog_names_version moves, not on every sale; stock and price are read
+# fresh for the handful of matches.
+import sqlite3
+import threading
+from bisect import bisect_left
+
+from pharmacy import catalog
+
+# Most matches returned for one typed prefix
+MAX_MATCHES = 8
+
+
+class PrefixIndex:
+    """
+    Medicine ids searchable by code (the medicine_id) or by a prefix of any
+    word of the name, e.g. "dolo", "dolo 6" and "650 t" all find "Dolo 650 Tablet".
+    """
+    def __init__(self, names):
+        self.ids = set()
+        entries = []
+        for medicine_id, name in names:
+            self.ids.add(medicine_id)
+            words = (name or "").lower().split()
+            for i in range(len(words)):
+                entries.append((" ".join(words[i:]), medicine_id))
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._ids = [medicine_id for _, medicine_id in entries]
+
+    def lookup(self, query: str, limit: int = MAX_MATCHES) -> list[int]:
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+        # Scanned or typed codes are medicine ids
+        if query.isdigit() and int(query) in self.ids:
+            return [int(query)]
+
+        matches = []
+        for i in range(bisect_left(self._keys, query), len(self._keys)):
+            if len(matches) == limit or not self._keys[i].startswith(query):
+                break
+            if self._ids[i] not in matches:
+                matches.append(self._ids[i])
+        return matches
+
+
+_index = None  # (catalog names version, PrefixIndex)
+_index_lock = threading.Lock()
+
+
+def prefix_index(conn: sqlite3.Connection) -> PrefixIndex:
+    """
+    This process's index of the current catalog, rebuilt after medicines are
+    added, removed or renamed anywhere.
+    """
+    global _index
+    version = catalog.names_version(conn)
+    with _index_lock:
+        if _index is None or _index[0] != version:
+            _index = (version, PrefixIndex(catalog.medicine_names(conn)))
+        return _index[1]
+
+
+def search(conn: sqlite3.Connection, query: str, limit: int = MAX_MATCHES) -> list[tuple]:
+    """
+    Medicine rows (with live stock and price) matching a scanned code or typed prefix.
+    """
+    return catalog.get_medicines(conn, prefix_index(conn).lookup(query, limit))
@@ -0,0 +1,430 @@
+# pharmacy/postgres.py
+#
+# PostgreSQL backend. When DAWAKHANA_DATABASE_URL is a postgresql:// URL,
+# db.connect() hands out connections from a per-process psycopg pool instead
+# of opening the SQLite file, so several branches (and many server processes)
+# can share one database and concurrent checkouts only wait on the medicines
+# rows they have in common, not on one file lock.
+#
+# The data access modules keep their SQL and their conn-first functions. A
+# Connection here behaves like the sqlite3 connections they were written
+# against: `?` placeholders, cursor.lastrowid, commit/rollback and sqlite3's
+# exception types. The few dialect differences in their SQL are rewritten per
+# statement (see _translate); where a caller needs different SQL, it asks
+# is_postgres(conn) or for_update(conn). Transactions start the way sqlite3's
+# do: a write (or a locking read) opens one, plain reads run on their own, so a
+# connection held between requests isn't left idle in a transaction.
+#
+# Stock decrements lock the rows they change with SELECT ... FOR UPDATE (see
+# orders.place_order), and bulk loads go through COPY (copy_rows, load_sqlite).
+# Needs `pip install "psycopg[binary]" psycopg_pool`.
+#
+#   python -m pharmacy.postgres init                create the schema
+#   python -m pharmacy.postgres load pharmacy.db    copy a SQLite database in with COPY
+import argparse
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import psycopg
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    psycopg = None
+
+from pharmacy import perf
+
+DATABASE_URL = os.environ.get("DAWAKHANA_DATABASE_URL", "")
+# Server connections per process, and seconds to wait for a free one
+POOL_MIN_SIZE = int(os.environ.get("DAWAKHANA_PG_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.environ.get("DAWAKHANA_PG_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.environ.get("DAWAKHANA_PG_POOL_TIMEOUT", "30"))
+
+# Tables whose key the database assigns, for cursor.lastrowid
+GENERATED_KEYS = {
+    "customers": "customer_id",
+    "medicines": "medicine_id",
+    "orders": "order_id",
+    "users": "user_id",
+    "stock_movements": "movement_id",
+    "stock_snapshots": "snapshot_id",
+    "prescriptions": "prescription_id",
+}
+
+_ID = "BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY"
+
+# db.SCHEMA in PostgreSQL's dialect. The catalog version counters are bumped
+# by deferred triggers, so the counter row is only locked while a transaction
+# commits rather than for the whole of every checkout.
+SCHEMA = [
+    f'''CREATE TABLE IF NOT EXISTS customers
+       (customer_id {_ID}, name TEXT, contact TEXT, address TEXT)''',
+    f'''CREATE TABLE IF NOT EXISTS medicines
+       (medicine_id {_ID}, name TEXT, stock INTEGER, expiry_date TEXT, price DOUBLE PRECISION, info TEXT)''',
+    f'''CREATE TABLE IF NOT EXISTS orders
+       (order_id {_ID}, order_date TEXT, customer_id BIGINT, drug_id BIGINT, quantity INTEGER,
+        total_amount DOUBLE PRECISION, prescription_id BIGINT)''',
+    f'''CREATE TABLE IF NOT EXISTS users
+       (user_id {_ID}, username TEXT, password TEXT, role TEXT)''',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)''',
+    '''CREATE TABLE IF NOT EXISTS catalog_version
+       (id INTEGER PRIMARY KEY CHECK (id = 1), version BIGINT NOT NULL)''',
+    '''INSERT INTO catalog_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING''',
+    '''CREATE TABLE IF NOT EXISTS catalog_names_version
+       (id INTEGER PRIMARY KEY CHECK (id = 1), version BIGINT NOT NULL)''',
+    '''INSERT INTO catalog_names_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING''',
+    '''CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger LANGUAGE plpgsql AS $$
+       BEGIN UPDATE catalog_version SET version = version + 1; RETURN NULL; END $$''',
+    '''CREATE OR REPLACE FUNCTION bump_catalog_names_version() RETURNS trigger LANGUAGE plpgsql AS $$
+       BEGIN UPDATE catalog_names_version SET version = version + 1; RETURN NULL; END $$''',
+    '''DROP TRIGGER IF EXISTS medicines_version ON medicines''',
+    '''CREATE CONSTRAINT TRIGGER medicines_version AFTER INSERT OR UPDATE OR DELETE ON medicines
+       DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION bump_catalog_version()''',
+    '''DROP TRIGGER IF EXISTS medicines_names_version ON medicines''',
+    '''CREATE CONSTRAINT TRIGGER medicines_names_version AFTER INSERT OR DELETE ON medicines
+       DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION bump_catalog_names_version()''',
+    '''DROP TRIGGER IF EXISTS medicines_rename_names_version ON medicines''',
+    '''CREATE CONSTRAINT TRIGGER medicines_rename_names_version AFTER UPDATE OF name ON medicines
+       DEFERRABLE INITIALLY DEFERRED FOR EACH ROW WHEN (old.name IS DISTINCT FROM new.name)
+       EXECUTE FUNCTION bump_catalog_names_version()''',
+    '''CREATE INDEX IF NOT EXISTS idx_orders_customer_date ON orders (customer_id, order_date)''',
+    f'''CREATE TABLE IF NOT EXISTS stock_movements
+       (movement_id {_ID}, medicine_id BIGINT NOT NULL, moved_at TEXT NOT NULL,
+        kind TEXT NOT NULL CHECK (kind IN ('sale', 'restock', 'adjustment', 'expiry_write_off')),
+        quantity INTEGER NOT NULL, order_id BIGINT, note TEXT)''',
+    '''CREATE INDEX IF NOT EXISTS idx_stock_movements_medicine ON stock_movements (medicine_id, moved_at)''',
+    f'''CREATE TABLE IF NOT EXISTS stock_snapshots
+       (snapshot_id {_ID}, taken_at TEXT NOT NULL, last_movement_id BIGINT NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS stock_snapshot_items
+       (snapshot_id BIGINT NOT NULL, medicine_id BIGINT NOT NULL, stock INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, medicine_id))''',
+    '''CREATE TABLE IF NOT EXISTS carts
+       (user_id BIGINT PRIMARY KEY, items TEXT NOT NULL, updated_at TEXT)''',
+    f'''CREATE TABLE IF NOT EXISTS prescriptions
+       (prescription_id {_ID}, customer_id BIGINT NOT NULL, uploaded_at TEXT NOT NULL,
+        doctor_name TEXT, patient_name TEXT, source TEXT,
+        image_hash BIGINT, duplicate_of BIGINT, needs_review BOOLEAN NOT NULL DEFAULT FALSE)''',
+    '''CREATE INDEX IF NOT EXISTS idx_prescriptions_customer_date ON prescriptions (customer_id, uploaded_at)''',
+    '''CREATE INDEX IF NOT EXISTS idx_prescriptions_review ON prescriptions (prescription_id) WHERE needs_review''',
+    '''CREATE TABLE IF NOT EXISTS prescription_items
+       (prescription_id BIGINT NOT NULL, position INTEGER NOT NULL, drug_name TEXT NOT NULL,
+        medicine_id BIGINT, quantity INTEGER, PRIMARY KEY (prescription_id, position))''',
+    '''CREATE INDEX IF NOT EXISTS idx_orders_prescription ON orders (prescription_id) WHERE prescription_id IS NOT NULL''',
+]
+
+# Tables load_sqlite() copies, parents first. The version counters are left
+# alone; the load bumps them once at the end.
+TABLES = ["customers", "users", "medicines", "drug_monographs", "orders", "stock_movements", "stock_snapshots",
+          "stock_snapshot_items", "carts", "prescriptions", "prescription_items"]
+
+_INSERT = re.compile(r"\s*INSERT\s+(OR\s+IGNORE\s+)?INTO\s+(\w+)", re.IGNORECASE)
+# Statements that open a transaction when none is open
+_WRITE = re.compile(r"\s*(INSERT|UPDATE|DELETE)\b|.*\bFOR\s+UPDATE\b", re.IGNORECASE | re.DOTALL)
+
+
+@functools.lru_cache(maxsize=1024)
+def _translate(sql):
+    """
+    (PostgreSQL statement, whether a generated key was appended with RETURNING)
+    for a statement written for SQLite; None for BEGIN (any of SQLite's kinds).
+    """
+    if re.match(r"\s*BEGIN\b", sql, re.IGNORECASE):
+        return None
+    translated = sql.replace("%", "%%").replace("?", "%s")
+    # SQLite's LIKE ignores ASCII case
+    translated = re.sub(r"\bLIKE\b", "ILIKE", translated)
+    translated = re.sub(r"\bgroup_concat\(", "string_agg(", translated, flags=re.IGNORECASE)
+    insert = _INSERT.match(translated)
+    if insert is None:
+        return translated, False
+    if insert.group(1):
+        translated = f"INSERT INTO {insert.group(2)}{translated[insert.end():]} ON CONFLICT DO NOTHING"
+    key = GENERATED_KEYS.get(insert.group(2).lower())
+    if key is None or re.search(r"\b(RETURNING|ON\s+CONFLICT)\b", translated, re.IGNORECASE):
+        return translated, False
+    return f"{translated.rstrip().rstrip(';')} RETURNING {key}", True
+
+
+@contextmanager
+def _sqlite_errors():
+    # Callers catch sqlite3's exception types; keep that true on this backend
+    try:
+        yield
+    except psycopg.IntegrityError as e:
+        raise sqlite3.IntegrityError(str(e)) from e
+    except psycopg.DataError as e:
+        raise sqlite3.DataError(str(e)) from e
+    except psycopg.Error as e:
+        raise sqlite3.OperationalError(str(e)) from e
+
+
+class Cursor:
+    """
+    A psycopg cursor taking SQLite-dialect statements. Statements are timed like perf.TimedCursor's.
+    """
+    def __init__(self, conn):
+        self.connection = conn
+        self._cursor = conn._raw.cursor()
+        self.lastrowid = None
+        self._params = ()
+
+    def _run(self, sql, run, many=False):
+        translated = _translate(sql)
+        if translated is None or _WRITE.match(sql):
+            self.connection._begin()
+        if translated is None:
+            return self
+        statement, returns_key = translated
+        start = time.perf_counter()
+        error = False
+        try:
+            with _sqlite_errors():
+                run(statement)
+                if returns_key and not many:
+                    rows = self._cursor.fetchall()
+                    self.lastrowid = rows[-1][0] if rows else None
+        except Exception:
+            error = True
+            raise
+        finally:
+            perf.record_query(sql, None if many else self._params, time.perf_counter() - start, error, many)
+        return self
+
+    def execute(self, sql, params=()):
+        self._params = params
+        return self._run(sql, lambda statement: self._cursor.execute(statement, tuple(params)))
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(sql, lambda statement: self._cursor.executemany(
+            statement, [tuple(params) for params in seq_of_params]), many=True)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone() if self._cursor.description else None
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size) if self._cursor.description else []
+
+    def fetchall(self):
+        return self._cursor.fetchall() if self._cursor.description else []
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """
+    A pooled server connection with the sqlite3.Connection methods the pharmacy modules use.
+    close() returns it to the pool.
+    """
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    @property
+    def in_transaction(self):
+        return self._raw.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+
+    def _begin(self):
+        # Row locks taken afterwards stand in for SQLite's BEGIN IMMEDIATE
+        if not self.in_transaction:
+            with _sqlite_errors():
+                self._raw.execute("BEGIN")
+
+    def cursor(self):
+        return Cursor(self)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        with _sqlite_errors():
+            self._raw.commit()
+
+    def rollback(self):
+        with _sqlite_errors():
+            self._raw.rollback()
+
+    def close(self):
+        if self._raw is None:
+            return
+        if self.in_transaction:
+            self._raw.rollback()
+        self._pool.putconn(self._raw)
+        self._raw = None
+
+    def explain(self, sql, params=()):
+        """
+        EXPLAIN for a statement, as a list of plan lines (see perf.explain).
+        """
+        statement, _ = _translate(sql)
+        with _sqlite_errors(), self._raw.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {statement}", tuple(params))
+            return [row[0] for row in cursor.fetchall()]
+
+
+def is_postgres(conn) -> bool:
+    return isinstance(conn, Connection)
+
+
+def for_update(conn) -> str:
+    """
+    Suffix for a SELECT whose rows the transaction goes on to change. SQLite
+    needs none: BEGIN IMMEDIATE (ledger.begin) already holds the write lock.
+    """
+    return " FOR UPDATE" if is_postgres(conn) else ""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _configure(raw):
+    # Connection._begin() opens transactions explicitly
+    raw.autocommit = True
+
+
+def pool():
+    """
+    This process's connection pool for DATABASE_URL.
+    """
+    global _pool
+    if psycopg is None:
+        raise RuntimeError('The PostgreSQL backend needs `pip install "psycopg[binary]" psycopg_pool`.')
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_URL, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                                       timeout=POOL_TIMEOUT, name="pharmacy", open=True,
+                                       configure=_configure)
+    return _pool
+
+
+def connect() -> Connection:
+    """
+    A connection from the pool; waits up to POOL_TIMEOUT seconds for one to be free.
+    """
+    connections = pool()
+    return Connection(connections, connections.getconn())
+
+
+@contextmanager
+def snapshot():
+    """
+    A read-only REPEATABLE READ transaction: every query sees the database as of the first one.
+    """
+    conn = connect()
+    try:
+        with _sqlite_errors():
+            conn._raw.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_db(conn: Connection) -> None:
+    """
+    Create any missing tables, indexes and triggers (called from db.init_db()).
+    """
+    with _sqlite_errors(), conn._raw.transaction():
+        # Processes starting together take turns
+        conn._raw.execute("SELECT pg_advisory_xact_lock(hashtext('pharmacy.init_db'))")
+        for statement in SCHEMA:
+            conn._raw.execute(statement)
+
+
+def copy_rows(conn: Connection, table: str, columns: list[str], rows) -> int:
+    """
+    Bulk-load rows into `table` with COPY ... FROM STDIN, inside the caller's
+    transaction. Returns the number of rows loaded.
+    """
+    count = 0
+    with _sqlite_errors(), conn._raw.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+    return count
+
+
+def load_sqlite(conn: Connection, path: str, batch_size: int = 10_000) -> dict:
+    """
+    Copy every table of a SQLite pharmacy database into this (empty) one, in
+    one transaction. Returns {table: rows copied}.
+    """
+    from pharmacy import db
+
+    source = sqlite3.connect(path)
+    db.migrate(source)
+    for statement in db.SCHEMA:
+        source.execute(statement)
+    copied = {}
+    try:
+        with _sqlite_errors(), conn._raw.transaction():
+            # The version triggers would fire once per medicine; bump the counters once instead
+            conn._raw.execute("ALTER TABLE medicines DISABLE TRIGGER USER")
+            for table in TABLES:
+                target_columns = [row[0] for row in conn._raw.execute(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position", (table,))]
+                source_columns = {row[1] for row in source.execute(f"PRAGMA table_info({table})")}
+                columns = [column for column in target_columns if column in source_columns]
+                if not columns:
+                    continue
+                cursor = source.execute(f"SELECT {', '.join(columns)} FROM {table}")
+
+                def rows():
+                    while batch := cursor.fetchmany(batch_size):
+                        yield from batch
+                copied[table] = copy_rows(conn, table, columns, rows())
+                key = GENERATED_KEYS.get(table)
+                if key:
+                    # Carry on numbering after the copied ids
+                    conn._raw.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                                      f"coalesce(max({key}), 0) + 1, false) FROM {table}")
+            conn._raw.execute("ALTER TABLE medicines ENABLE TRIGGER USER")
+            conn._raw.execute("UPDATE catalog_version SET version = version + 1")
+            conn._raw.execute("UPDATE catalog_names_version SET version = version + 1")
+    finally:
+        source.close()
+    return copied
+
+
+def main():
+    from pharmacy import db
+
+    parser = argparse.ArgumentParser(description="PostgreSQL backend setup (DAWAKHANA_DATABASE_URL).")
+    parser.add_argument("command", choices=["init", "load"])
+    parser.add_argument("sqlite_path", nargs="?", help="SQLite database to load (load only)")
+    args = parser.parse_args()
+    if db.BACKEND != "postgres":
+        raise SystemExit("Set DAWAKHANA_DATABASE_URL to a postgresql:// URL first.")
+
+    with db.connection() as conn:
+        db.init_db(conn)
+        if args.command == "load":
+            if not args.sqlite_path:
+                parser.error("load needs the SQLite database to copy")
+            for table, count in load_sqlite(conn, args.sqlite_path).items():
+                print(f"{table}\t{count} rows")
+
+
+if __name__ == "__main__":
+    main()
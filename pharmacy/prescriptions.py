@@ -0,0 +1,202 @@
+# pharmacy/prescriptions.py
+#
+# Prescriptions read from uploads, stored when their entities are extracted so
+# a repeat customer can refill one without uploading and reading it again.
+# Each item keeps the name as written and, where the catalog had a match at
+# upload time, the medicine it was matched to.
+#
+# Each original upload also keeps the perceptual hash of its first page (see
+# phash.py). A new upload within DUPLICATE_DISTANCE bits of one is flagged for a
+# pharmacist to review, since the same paper may be being used twice. If it is
+# the same customer's, it reuses that prescription's extraction instead of being
+# read again; another customer's upload is read as usual and never shown the original.
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from pharmacy import catalog, phash
+
+# Prescriptions listed per page on the customer's Prescriptions page
+PAGE_SIZE = 20
+# Hashes at most this many bits (of 64) apart are taken to be the same prescription
+DUPLICATE_DISTANCE = 8
+
+_hashes = (0, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))  # (last id read, ids, hashes)
+_hashes_lock = threading.Lock()
+
+
+def _quantity(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return None
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def save_prescription(conn: sqlite3.Connection, customer_id: int, entities: dict, source: str | None = None,
+                      image_hash: int | None = None, duplicate_of: int | None = None) -> int:
+    """
+    Store extracted entities ({doctor_name, patient_name, drug_name[], quantity[]})
+    as a prescription of `customer_id`, flagged for review if it is a
+    `duplicate_of` another customer's. Returns the new prescription_id.
+    """
+    quantities = list(entities.get("quantity") or [])
+    items = []
+    for position, drug_name in enumerate(entities.get("drug_name") or []):
+        matches = catalog.find_matching(conn, [drug_name])
+        # Prefer a match that is in stock, so a refill has something to put in the cart
+        match = next((row for row in matches if row[2] > 0), matches[0] if matches else None)
+        items.append((position, drug_name, match[0] if match else None,
+                      _quantity(quantities[position] if position < len(quantities) else None)))
+
+    c = conn.cursor()
+    try:
+        c.execute("INSERT INTO prescriptions (customer_id, uploaded_at, doctor_name, patient_name, source, image_hash, "
+                  "duplicate_of, needs_review) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                  (customer_id, _now(), entities.get("doctor_name") or None, entities.get("patient_name") or None,
+                   source, image_hash, duplicate_of, duplicate_of is not None))
+        prescription_id = c.lastrowid
+        c.executemany("INSERT INTO prescription_items (prescription_id, position, drug_name, medicine_id, quantity) "
+                      "VALUES (?, ?, ?, ?, ?)", [(prescription_id, *item) for item in items])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return prescription_id
+
+
+def find_duplicate(conn: sqlite3.Connection, image_hash: int,
+                   max_distance: int = DUPLICATE_DISTANCE) -> tuple[int, int] | None:
+    """
+    (prescription_id, customer_id) of the original prescription closest to
+    `image_hash`, if any is within `max_distance` bits, whoever uploaded it.
+    Hashes are held in memory and only new rows are read.
+    """
+    global _hashes
+    with _hashes_lock:
+        last_id, ids, hashes = _hashes
+        rows = conn.execute("SELECT prescription_id, image_hash FROM prescriptions "
+                            "WHERE prescription_id > ? AND image_hash IS NOT NULL AND duplicate_of IS NULL "
+                            "ORDER BY prescription_id", (last_id,)).fetchall()
+        if rows:
+            new = np.array(rows, dtype=np.int64)
+            _hashes = (int(new[-1, 0]), np.concatenate([ids, new[:, 0]]), np.concatenate([hashes, new[:, 1]]))
+            last_id, ids, hashes = _hashes
+    if not len(ids):
+        return None
+    distance = phash.distances(hashes, image_hash)
+    closest = int(np.argmin(distance))
+    if distance[closest] > max_distance:
+        return None
+    prescription_id = int(ids[closest])
+    return prescription_id, conn.execute("SELECT customer_id FROM prescriptions WHERE prescription_id = ?",
+                                         (prescription_id,)).fetchone()[0]
+
+
+def entities_of(conn: sqlite3.Connection, prescription_id: int) -> dict:
+    """
+    A stored prescription in the shape it was extracted in.
+    """
+    doctor_name, patient_name = conn.execute("SELECT doctor_name, patient_name FROM prescriptions "
+                                             "WHERE prescription_id = ?", (prescription_id,)).fetchone()
+    items = conn.execute("SELECT drug_name, quantity FROM prescription_items WHERE prescription_id = ? "
+                         "ORDER BY position", (prescription_id,)).fetchall()
+    return {"doctor_name": doctor_name or "", "patient_name": patient_name or "",
+            "drug_name": [drug_name for drug_name, _ in items],
+            "quantity": [str(quantity) if quantity else "" for _, quantity in items]}
+
+
+def save_duplicate(conn: sqlite3.Connection, customer_id: int, original_id: int, source: str | None = None) -> int:
+    """
+    Record a customer's re-upload of their own `original_id`, copying its items
+    rather than reading it again, and flag it for review. Returns the new prescription_id.
+    """
+    c = conn.cursor()
+    try:
+        c.execute("""
+            INSERT INTO prescriptions (customer_id, uploaded_at, doctor_name, patient_name, source,
+                                       duplicate_of, needs_review)
+            SELECT ?, ?, doctor_name, patient_name, ?, prescription_id, TRUE FROM prescriptions WHERE prescription_id = ?
+        """, (customer_id, _now(), source, original_id))
+        prescription_id = c.lastrowid
+        c.execute("""
+            INSERT INTO prescription_items (prescription_id, position, drug_name, medicine_id, quantity)
+            SELECT ?, position, drug_name, medicine_id, quantity FROM prescription_items WHERE prescription_id = ?
+        """, (prescription_id, original_id))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return prescription_id
+
+
+def flagged(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    Re-uploads waiting for review, oldest first, as (prescription_id, uploaded_at,
+    username, original prescription_id, original uploaded_at, original username).
+    """
+    return conn.execute("""
+        SELECT p.prescription_id, p.uploaded_at, u.username, o.prescription_id, o.uploaded_at, ou.username
+        FROM prescriptions p
+        JOIN prescriptions o ON o.prescription_id = p.duplicate_of
+        LEFT JOIN users u ON u.user_id = p.customer_id
+        LEFT JOIN users ou ON ou.user_id = o.customer_id
+        WHERE p.needs_review
+        ORDER BY p.prescription_id
+    """).fetchall()
+
+
+def mark_reviewed(conn: sqlite3.Connection, prescription_id: int) -> None:
+    conn.execute("UPDATE prescriptions SET needs_review = FALSE WHERE prescription_id = ?", (prescription_id,))
+    conn.commit()
+
+
+def customer_prescriptions(conn: sqlite3.Connection, customer_id: int, limit: int = PAGE_SIZE,
+                           after: tuple | None = None) -> list[tuple]:
+    """
+    One page of a customer's prescriptions, newest first, as (prescription_id,
+    uploaded_at, doctor_name, patient_name, drugs), where drugs is a
+    comma-separated list of the names as written. Pass the last row of the
+    previous page as `after` to get the next one.
+    """
+    where = "p.customer_id = ?" if after is None else "p.customer_id = ? AND (p.uploaded_at, p.prescription_id) < (?, ?)"
+    params = (customer_id,) if after is None else (customer_id, after[1], after[0])
+    return conn.execute(f"""
+        SELECT p.prescription_id, p.uploaded_at, p.doctor_name, p.patient_name,
+               (SELECT group_concat(drug_name, ', ') FROM
+                   (SELECT drug_name FROM prescription_items i WHERE i.prescription_id = p.prescription_id
+                    ORDER BY position) items)
+        FROM prescriptions p
+        WHERE {where}
+        ORDER BY p.uploaded_at DESC, p.prescription_id DESC LIMIT ?
+    """, (*params, limit)).fetchall()
+
+
+def refill_cart(conn: sqlite3.Connection, customer_id: int, prescription_id: int) -> tuple[list[dict], list[str]]:
+    """
+    Cart items for a past prescription of this customer, at today's prices and
+    capped at current stock, read in one query. Returns (items, names of drugs
+    that are unmatched or out of stock).
+    """
+    rows = conn.execute("""
+        SELECT i.drug_name, m.medicine_id, m.name, m.stock, m.price, coalesce(i.quantity, 1)
+        FROM prescriptions p
+        JOIN prescription_items i ON i.prescription_id = p.prescription_id
+        LEFT JOIN medicines m ON m.medicine_id = i.medicine_id
+        WHERE p.prescription_id = ? AND p.customer_id = ?
+        ORDER BY i.position
+    """, (prescription_id, customer_id)).fetchall()
+    items, unavailable = [], []
+    for drug_name, medicine_id, name, stock, price, quantity in rows:
+        if medicine_id is None or not stock:
+            unavailable.append(drug_name)
+            continue
+        quantity = min(quantity, stock)
+        items.append({'drug_id': medicine_id, 'drug_name': name, 'quantity': quantity, 'price': price,
+                      'total': quantity * price, 'prescription_id': prescription_id})
+    return items, unavailable
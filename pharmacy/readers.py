@@ -0,0 +1,82 @@
+# pharmacy/readers.py
+#
+# Read-only connections for admin reporting (View Orders, Manage Users, the
+# Manage Drugs catalog and its expiry alerts). Each report runs inside one
+# read transaction, so under WAL (see db.init_db) it reads a consistent
+# snapshot of the file without taking a lock checkout's writer waits on, and
+# commits made meanwhile simply aren't visible to it. Connections are opened
+# read-only with query_only set, so a report can never take the write lock,
+# and are kept in a small pool between page loads; at most POOL_SIZE reports
+# run at once in a process, the rest wait their turn rather than pile onto the
+# disk alongside checkout.
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from pharmacy import db, postgres
+from pharmacy.perf import TimedConnection
+
+# Read connections per process (and so concurrent reports)
+POOL_SIZE = int(os.environ.get("DAWAKHANA_READ_POOL", "4"))
+
+
+class ReadPool:
+    """
+    Up to `size` read-only connections to one database file, handed out one
+    snapshot at a time.
+    """
+    def __init__(self, path: str | None = None, size: int = POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        uri = Path(self.path or db.DB_PATH).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=db.BUSY_TIMEOUT, check_same_thread=False,
+                               factory=TimedConnection)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def snapshot(self):
+        """
+        A pooled connection inside a read transaction: every query run on it
+        sees the database as of the first one.
+        """
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                conn.execute("BEGIN")
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            # Ending the transaction lets checkpoints move past this snapshot
+            conn.rollback()
+            self._idle.put(conn)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def snapshot():
+    """
+    A snapshot of db.DB_PATH from this process's read pool, e.g.
+    `with readers.snapshot() as conn: rows = orders.all_orders(conn)`.
+    On the PostgreSQL backend, a read-only transaction on a pooled connection.
+    """
+    global _default
+    if db.BACKEND == "postgres":
+        return postgres.snapshot()
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = ReadPool()
+    return _default.snapshot()
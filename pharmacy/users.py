@@ -0,0 +1,47 @@
+# pharmacy/users.py
+import sqlite3
+
+from pharmacy.auth import LoginThrottled, authenticate, hash_password_pooled  # noqa: F401 (re-exported)
+
+
+class UsernameTaken(Exception):
+    def __init__(self, username):
+        super().__init__("Username already exists. Please choose a different username.")
+        self.username = username
+
+
+def create_user(conn: sqlite3.Connection, username: str, password: str, role: str = "customer") -> int:
+    """
+    Add a user with a hashed password. Raises UsernameTaken if the name is in use.
+    """
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM users WHERE username = ?", (username,))
+    if c.fetchone():
+        raise UsernameTaken(username)
+    try:
+        c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                  (username, hash_password_pooled(password), role))
+    except sqlite3.IntegrityError:
+        # Lost a race with another sign-up for the same name (idx_users_username)
+        raise UsernameTaken(username) from None
+    conn.commit()
+    return c.lastrowid
+
+
+def find_user(conn: sqlite3.Connection, username: str) -> tuple | None:
+    """
+    (user_id, username, role) for a username, or None.
+    """
+    return conn.execute("SELECT user_id, username, role FROM users WHERE username = ?", (username,)).fetchone()
+
+
+def list_users(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    All users as (user_id, username, role); password hashes are never returned.
+    """
+    return conn.execute("SELECT user_id, username, role FROM users").fetchall()
+
+
+def delete_user(conn: sqlite3.Connection, user_id: int) -> None:
+    conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+    conn.commit()
@@ -0,0 +1,69 @@
+# pharmacy/writer.py
+#
+# One writer thread per process for checkout. Sessions hand their order to the
+# queue instead of each opening a write transaction, so within a process only
+# one connection ever competes for SQLite's write lock, and across processes
+# the busy timeout (db.BUSY_TIMEOUT) queues the few remaining writers.
+# PostgreSQL locks rows rather than the whole database, so on that backend
+# each session writes on its own pooled connection instead.
+import queue
+import threading
+from concurrent.futures import Future
+
+from pharmacy import db
+
+
+class Writer:
+    """
+    Runs fn(conn, *args) calls one at a time on a dedicated connection.
+    """
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="pharmacy-writer", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        conn = None
+        while True:
+            fn, args, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if conn is None:
+                    # Opened on first use; if that fails the caller gets the error and the next call retries
+                    conn = db.connect(self.path)
+                future.set_result(fn(conn, *args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def run(self, fn, *args):
+        """
+        Queue fn(conn, *args) and wait for its result (or exception).
+        """
+        return self.submit(fn, *args).result()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def run(fn, *args):
+    """
+    Run fn(conn, *args) on this process's writer for db.DB_PATH, or on a
+    pooled connection of its own on the PostgreSQL backend.
+    """
+    global _default
+    if db.BACKEND == "postgres":
+        with db.connection() as conn:
+            return fn(conn, *args)
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = Writer()
+    return _default.run(fn, *args)
@@ -0,0 +1,34 @@
+# tests/conftest.py
+#
+# Every test gets its own SQLite file in a temporary directory, with the
+# process-wide caches (shared cache file, in-memory LRU) pointed at it too, so
+# tests never touch pharmacy.db and never see each other's data.
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pharmacy import cache, db  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "pharmacy.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    monkeypatch.setattr(db, "BACKEND", "sqlite")
+    monkeypatch.setenv("DAWAKHANA_CACHE", str(tmp_path / "pharmacy-cache.db"))
+    monkeypatch.setattr(cache, "_memory", OrderedDict())
+    monkeypatch.setattr(cache, "_local", threading.local())
+    with db.connection(path) as conn:
+        db.init_db(conn)
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    with db.connection(db_path) as conn:
+        yield conn
@@ -0,0 +1,79 @@
+# tests/test_api.py
+import threading
+from datetime import date, timedelta
+
+import pytest
+from starlette.testclient import TestClient
+
+import api
+from pharmacy import auth, catalog, maintenance, users, writer
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+@pytest.fixture
+def client(conn, monkeypatch):
+    monkeypatch.setattr(maintenance, "ENABLED", False)
+    monkeypatch.setattr(writer, "_default", None)
+    monkeypatch.setattr(api, "_local", threading.local())
+    monkeypatch.setattr(api, "_connections", [])
+    monkeypatch.setattr(auth, "_failed_logins", auth.TokenBucket(auth.LOGIN_BURST, auth.LOGIN_REFILL_SECONDS))
+    users.create_user(conn, "alice", "pw")
+    users.create_user(conn, "admin", "pw", role="admin")
+    with TestClient(api.app) as client:
+        yield client
+
+
+@pytest.fixture
+def drugs(conn):
+    return [catalog.add_medicine(conn, "Paracetamol", 5, EXPIRY, 2.5),
+            catalog.add_medicine(conn, "Ibuprofen", 1, EXPIRY, 4.0)]
+
+
+def _order(client, items, auth=("alice", "pw")):
+    return client.post("/orders", json={"items": [{"drug_id": d, "quantity": q} for d, q in items]}, auth=auth)
+
+
+def test_catalog_pages_and_etags(client, drugs):
+    response = client.get("/medicines?per_page=1&page=2")
+    assert response.status_code == 200
+    assert response.json()["total"] == 2
+    assert [item["name"] for item in response.json()["items"]] == ["Ibuprofen"]
+    etag = response.headers["etag"]
+    assert client.get("/medicines?per_page=1&page=2", headers={"If-None-Match": etag}).status_code == 304
+    _order(client, [(drugs[0], 1)])
+    assert client.get("/medicines?per_page=1&page=2", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_bad_paging_is_rejected(client):
+    assert client.get("/medicines?per_page=1000").status_code == 400
+
+
+def test_checkout_takes_server_prices_and_decrements_stock(client, drugs):
+    response = _order(client, [(drugs[0], 2)])
+    assert response.status_code == 201
+    assert response.json()["total_amount"] == 5.0
+    assert client.get(f"/medicines/{drugs[0]}/stock").json()["stock"] == 3
+
+
+def test_short_stock_conflicts_and_writes_nothing(client, drugs):
+    response = _order(client, [(drugs[0], 1), (drugs[1], 2)])
+    assert response.status_code == 409
+    assert response.json()["available"] == 1
+    assert client.get(f"/medicines/{drugs[0]}/stock").json()["stock"] == 5
+
+
+def test_checkout_needs_a_customer_login(client, drugs):
+    assert _order(client, [(drugs[0], 1)], auth=None).status_code == 401
+    assert _order(client, [(drugs[0], 1)], auth=("alice", "wrong")).status_code == 401
+    assert _order(client, [(drugs[0], 1)], auth=("admin", "pw")).status_code == 403
+    assert client.post("/orders", json={"items": []}, auth=("alice", "pw")).status_code == 400
+
+
+def test_export_streams_the_customers_orders(client, drugs):
+    _order(client, [(drugs[0], 1), (drugs[0], 2)])
+    response = client.get("/orders/export.csv", auth=("alice", "pw"))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert len(response.text.strip().splitlines()) == 3
+    assert client.get("/orders/export.xls", auth=("alice", "pw")).status_code == 404
@@ -0,0 +1,36 @@
+# tests/test_assets.py
+import os
+
+import pytest
+from PIL import Image
+
+import assets
+
+
+@pytest.fixture
+def thumbs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "THUMBS_DIR", str(tmp_path))
+    monkeypatch.setattr(assets, "_thumbnails", set())
+    return tmp_path
+
+
+def test_thumbnail_is_a_png(thumbs_dir):
+    url = assets.drug_thumbnail_url(7, "Paracetamol Forte")
+    assert url.startswith(f"{assets.STATIC_URL}/thumbs/drug_7_") and url.endswith(".png")
+    path = os.path.join(thumbs_dir, url.rsplit("/", 1)[1])
+    with Image.open(path) as image:
+        assert image.format == "PNG"
+        assert image.mode == "RGBA"
+        # Transparent around the bottle, opaque on it
+        assert image.getpixel((0, image.height - 1))[3] == 0
+        assert image.getpixel(assets.LABEL_CENTER)[3] == 255
+
+
+def test_renamed_drug_gets_a_new_thumbnail(thumbs_dir):
+    assert assets.drug_thumbnail_url(1, "Aspirin") != assets.drug_thumbnail_url(1, "Aspirin 75")
+    assert len(os.listdir(thumbs_dir)) == 2
+
+
+def test_static_url_is_versioned_by_content():
+    url = assets.static_url("pills_bottle_logo.png")
+    assert url.startswith(f"{assets.STATIC_URL}/pills_bottle_logo.png?v=")
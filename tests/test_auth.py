@@ -0,0 +1,51 @@
+# tests/test_auth.py
+import pytest
+
+from pharmacy import auth, users
+
+
+@pytest.fixture(autouse=True)
+def fresh_throttle(monkeypatch):
+    monkeypatch.setattr(auth, "_failed_logins", auth.TokenBucket(auth.LOGIN_BURST, auth.LOGIN_REFILL_SECONDS))
+
+
+def test_hash_round_trip():
+    stored = auth.hash_password_pooled("s3cret")
+    assert auth.is_hashed(stored)
+    assert auth.verify_password("s3cret", stored)
+    assert not auth.verify_password("wrong", stored)
+    assert not auth.needs_rehash(stored)
+
+
+def test_hashes_are_salted():
+    assert auth.hash_password("same") != auth.hash_password("same")
+
+
+def test_plaintext_is_accepted_and_rehashed_on_login(conn):
+    conn.execute("INSERT INTO users (username, password, role) VALUES ('old', 'plain', 'customer')")
+    conn.commit()
+    assert users.authenticate(conn, "old", "plain")[1] == "old"
+    stored = conn.execute("SELECT password FROM users WHERE username = 'old'").fetchone()[0]
+    assert auth.is_hashed(stored) and auth.verify_password("plain", stored)
+
+
+def test_failed_logins_are_throttled(conn):
+    users.create_user(conn, "alice", "right")
+    for _ in range(auth.LOGIN_BURST):
+        assert users.authenticate(conn, "alice", "wrong") is None
+    with pytest.raises(auth.LoginThrottled) as e:
+        users.authenticate(conn, "alice", "right")
+    assert e.value.retry_after > 0
+
+
+def test_unknown_user_is_rejected(conn):
+    assert users.authenticate(conn, "nobody", "x") is None
+
+
+def test_token_bucket_refills():
+    bucket = auth.TokenBucket(2, 0.01)
+    assert bucket.consume("k") and bucket.consume("k")
+    assert not bucket.consume("k")
+    assert bucket.retry_after("k") > 0
+    bucket.reset("k")
+    assert bucket.retry_after("k") == 0
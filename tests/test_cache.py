@@ -0,0 +1,60 @@
+# tests/test_cache.py
+from datetime import date, timedelta
+
+from pharmacy import cache, catalog, orders
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+def test_entries_are_keyed_by_version(db_path):
+    cache.put("k", 1, ["a"])
+    assert cache.get("k", 1) == ["a"]
+    assert cache.get("k", 2) is None
+
+
+def test_other_processes_read_the_shared_file(db_path):
+    cache.put("k", 1, {"x": 1})
+    # A process that never computed the entry has nothing in memory
+    cache._memory.clear()
+    assert cache.get("k", 1) == {"x": 1}
+
+
+def test_get_or_compute_computes_once_per_version(db_path):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute("k", 1, compute) == 1
+    assert cache.get_or_compute("k", 1, compute) == 1
+    assert cache.get_or_compute("k", 2, compute) == 2
+
+
+def test_every_medicine_write_bumps_the_catalog_version(conn):
+    versions = [catalog.version(conn)]
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    versions.append(catalog.version(conn))
+    orders.place_order(conn, 1, [{'drug_id': medicine_id, 'drug_name': "Paracetamol", 'quantity': 1, 'total': 1.0}])
+    versions.append(catalog.version(conn))
+    catalog.delete_medicine(conn, medicine_id)
+    versions.append(catalog.version(conn))
+    assert versions == sorted(set(versions))
+
+
+def test_names_version_ignores_stock_and_price(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    names = catalog.names_version(conn)
+    catalog.update_medicine(conn, medicine_id, "Paracetamol", 5, EXPIRY, 2.0)
+    assert catalog.names_version(conn) == names
+    catalog.update_medicine(conn, medicine_id, "Paracetamol 500", 5, EXPIRY, 2.0)
+    assert catalog.names_version(conn) == names + 1
+
+
+def test_cached_catalog_follows_writes(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    assert [row[2] for row in catalog.cached_medicines(conn)] == [10]
+    # A write from another process bumps the counter just the same
+    conn.execute("UPDATE medicines SET stock = 4 WHERE medicine_id = ?", (medicine_id,))
+    conn.commit()
+    assert [row[2] for row in catalog.cached_medicines(conn)] == [4]
@@ -0,0 +1,27 @@
+# tests/test_carts.py
+from pharmacy import carts
+
+
+def _line(drug_id, quantity, price=2.0, **extra):
+    return {'drug_id': drug_id, 'drug_name': f"drug {drug_id}", 'price': price, 'quantity': quantity,
+            'total': quantity * price, **extra}
+
+
+def test_saved_cart_round_trips(conn):
+    assert carts.load_cart(conn, 1) == []
+    carts.save_cart(conn, 1, [_line(1, 2)])
+    carts.save_cart(conn, 1, [_line(1, 3), _line(2, 1)])
+    assert carts.load_cart(conn, 1) == [_line(1, 3), _line(2, 1)]
+    assert carts.load_cart(conn, 2) == []
+
+
+def test_saving_an_empty_cart_deletes_it(conn):
+    carts.save_cart(conn, 1, [_line(1, 2)])
+    carts.save_cart(conn, 1, [])
+    assert conn.execute("SELECT count(*) FROM carts").fetchone()[0] == 0
+
+
+def test_merge_adds_to_existing_lines():
+    cart = [_line(1, 2)]
+    carts.merge_items(cart, [_line(1, 3, prescription_id=7), _line(2, 1)])
+    assert cart == [_line(1, 5, prescription_id=7), _line(2, 1)]
@@ -0,0 +1,38 @@
+# tests/test_catalog.py
+from datetime import date, timedelta
+
+import pytest
+
+from pharmacy import catalog
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+@pytest.fixture
+def drugs(conn):
+    return [catalog.add_medicine(conn, name, 10, EXPIRY, 1.0)
+            for name in ["Paracetamol", "Paracetamol Forte", "Ibuprofen", "Amoxicillin"]]
+
+
+def test_pages_cover_the_catalog_in_id_order(conn, drugs):
+    pages = [catalog.page_medicines(conn, 3, offset) for offset in (0, 3)]
+    assert [row[0] for page in pages for row in page] == drugs
+    assert catalog.count_medicines(conn) == 4
+
+
+def test_get_medicines_keeps_the_requested_order(conn, drugs):
+    assert [row[1] for row in catalog.get_medicines(conn, [drugs[2], 999, drugs[0]])] == ["Ibuprofen", "Paracetamol"]
+    assert catalog.get_medicines(conn, []) == []
+    assert catalog.get_medicine(conn, 999) is None
+
+
+def test_find_by_names_matches_whole_names(conn, drugs):
+    assert {row[1] for row in catalog.find_by_names(conn, ["Paracetamol", "Ibuprofen", "Aspirin"])} == \
+        {"Paracetamol", "Ibuprofen"}
+    assert catalog.find_by_names(conn, []) == []
+
+
+def test_find_matching_lists_each_medicine_once(conn, drugs):
+    assert [row[1] for row in catalog.find_matching(conn, ["paracetamol", "FORTE"])] == \
+        ["Paracetamol", "Paracetamol Forte"]
+    assert [row[1] for row in catalog.find_matching(conn, ["moxi", "Aspirin"])] == ["Amoxicillin"]
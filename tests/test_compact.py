@@ -0,0 +1,58 @@
+# tests/test_compact.py
+from datetime import date
+
+import numpy as np
+
+from pharmacy import catalog, compact
+
+TODAY = date(2026, 6, 1)
+ROWS = [
+    (1, "Paracetamol", 40, "2026-06-20", 2.5, "info"),
+    (2, "Ibuprofen", 0, "2026-05-01", 4.0, None),
+    (3, None, None, None, None, None),
+    (5, "Aspirin", 100, "2027-01-01", 1.0, None),
+]
+
+
+def test_views_read_like_medicine_rows():
+    compact_catalog = compact.CompactCatalog.from_rows(ROWS)
+    views = compact_catalog.select()
+    assert [tuple(view) for view in views] == [
+        (1, "Paracetamol", 40, "2026-06-20", 2.5, None),
+        (2, "Ibuprofen", 0, "2026-05-01", 4.0, None),
+        (3, "", 0, None, 0.0, None),
+        (5, "Aspirin", 100, "2027-01-01", 1.0, None),
+    ]
+    assert views[0][1:3] == ("Paracetamol", 40) and len(views[0]) == 6
+
+
+def test_filters_combine_as_masks():
+    compact_catalog = compact.CompactCatalog.from_rows(ROWS)
+    names = lambda mask: [view.name for view in compact_catalog.select(mask)]  # noqa: E731
+    assert names(compact_catalog.in_stock() & compact_catalog.expiring_within(30, TODAY)) == ["Paracetamol"]
+    assert names(compact_catalog.expired(TODAY)) == ["Ibuprofen"]
+    assert names(compact_catalog.price_between(low=2, high=4)) == ["Paracetamol", "Ibuprofen"]
+
+
+def test_positions_skip_unknown_ids():
+    compact_catalog = compact.CompactCatalog.from_rows(ROWS)
+    assert compact_catalog.positions([5, 4, 1, 99]).tolist() == [3, 0]
+    assert compact.CompactCatalog.from_rows([]).positions([1]).tolist() == []
+
+
+def test_columns_agree_for_views_and_rows():
+    compact_catalog = compact.CompactCatalog.from_rows(ROWS)
+    from_views = compact.columns(compact_catalog.select([3, 0]))
+    from_rows = compact.columns([ROWS[3], ROWS[0]])
+    for a, b in zip(from_views, from_rows):
+        assert np.array_equal(a, b)
+    # Unparseable dates count as never expiring, like missing ones
+    assert compact.columns([(1, "x", 1, "soon", 1.0)])[1].tolist() == [compact.NO_EXPIRY]
+
+
+def test_catalog_is_built_from_the_database(conn):
+    conn.executemany("INSERT INTO medicines (name, stock, expiry_date, price) VALUES (?, ?, ?, ?)",
+                     [(row[1], row[2], row[3], row[4]) for row in ROWS])
+    conn.commit()
+    assert [view.name for view in catalog.compact_catalog(conn).select()] == \
+        ["Paracetamol", "Ibuprofen", "", "Aspirin"]
@@ -0,0 +1,110 @@
+# tests/test_dashboard.py
+import os
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+
+from pharmacy import catalog, dashboard, db, orders
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+@pytest.fixture(autouse=True)
+def fresh_entries(monkeypatch):
+    monkeypatch.setattr(dashboard, "_entries", {})
+    monkeypatch.setattr(dashboard, "_used", {})
+    monkeypatch.setattr(dashboard, "_pending", set())
+    monkeypatch.setattr(dashboard, "_refreshers", {})
+
+
+@pytest.fixture
+def other(tmp_path, db_path, monkeypatch):
+    """
+    A second database beside db.DB_PATH, opened from a working directory with no pharmacy.db.
+    """
+    workdir = tmp_path / "elsewhere"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    with db.connection(str(tmp_path / "other.db")) as conn:
+        db.init_db(conn)
+        yield conn
+
+
+def _buy(conn, medicine_id, quantity):
+    orders.place_order(conn, 1, [{'drug_id': medicine_id, 'drug_name': "x", 'quantity': quantity,
+                                  'total': quantity * 1.0}])
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_dashboard_reads_the_callers_database(other, db_path):
+    medicine_id = catalog.add_medicine(other, "Paracetamol", 10, EXPIRY, 1.0)
+    _buy(other, medicine_id, 2)
+    home = dashboard.customer_dashboard(other, 1)
+    assert [(row[1], units) for row, units in home["top_sellers"]] == [("Paracetamol", 2)]
+    assert [row[1] for row, _, _ in home["recent"]] == ["Paracetamol"]
+    with db.connection(db_path) as default:
+        assert dashboard.customer_dashboard(default, 1) == {"top_sellers": [], "recent": []}
+
+
+def test_stale_entries_are_refreshed_from_the_same_database(other, db_path):
+    medicine_id = catalog.add_medicine(other, "Paracetamol", 10, EXPIRY, 1.0)
+    _buy(other, medicine_id, 2)
+    dashboard.customer_dashboard(other, 1)
+    _buy(other, medicine_id, 3)
+    key = (dashboard._database(other), dashboard._GLOBAL)
+    dashboard._entries[key] = (time.monotonic() - dashboard.TTL - 1, dashboard._entries[key][1])
+    dashboard.customer_dashboard(other, 1)  # served stale, refreshed in the background
+    _wait_for(lambda: dashboard._entries[key][1] == [(medicine_id, 5)])
+    assert list(dashboard._refreshers) == [key[0]]
+    assert key[0] == os.path.abspath(os.path.join(os.path.dirname(db_path), "other.db"))
+    assert not os.path.exists("pharmacy.db")
+
+
+def test_invalidate_forgets_the_customer_everywhere(other, db_path):
+    with db.connection(db_path) as default:
+        dashboard.customer_dashboard(default, 1)
+    dashboard.customer_dashboard(other, 1)
+    dashboard.invalidate(1)
+    assert {key[1] for key in dashboard._entries} == {dashboard._GLOBAL}
+
+
+def test_a_stale_entry_is_queued_once(conn, monkeypatch):
+    queued = []
+    monkeypatch.setattr(dashboard.Refresher, "refresh", lambda self, key: queued.append(key))
+    dashboard.customer_dashboard(conn, 1)
+    key = (dashboard._database(conn), dashboard._GLOBAL)
+    dashboard._entries[key] = (time.monotonic() - dashboard.TTL - 1, dashboard._entries[key][1])
+    for _ in range(3):
+        dashboard.customer_dashboard(conn, 1)
+    assert queued == [key]
+
+
+def test_a_pooled_refresher_returns_its_connection_after_each_batch(conn, monkeypatch):
+    # The PostgreSQL refresher (path None) borrows db.connection() rather than holding one
+    borrowed = []
+    real_connection = dashboard.db.connection
+
+    @contextmanager
+    def connection():
+        borrowed.append("out")
+        with real_connection() as conn:
+            yield conn
+        borrowed.append("in")
+
+    monkeypatch.setattr(dashboard.db, "connection", connection)
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    _buy(conn, medicine_id, 2)
+    key = (None, dashboard._GLOBAL)
+    dashboard._used[key] = time.monotonic()
+    dashboard._background(None).refresh(key)
+    _wait_for(lambda: key in dashboard._entries and borrowed[-1:] == ["in"])
+    assert borrowed == ["out", "in"]
+    assert dashboard._entries[key][1] == [(medicine_id, 2)]
@@ -0,0 +1,40 @@
+# tests/test_db.py
+from datetime import date, timedelta
+
+from pharmacy import catalog, db, users
+
+# The tables of the first pharmacy.db, as it was committed
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL);
+CREATE TABLE medicines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    stock INTEGER NOT NULL,
+    expiry_date TEXT NOT NULL);
+CREATE TABLE prescriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_name TEXT NOT NULL,
+    doctor_name TEXT NOT NULL,
+    drugs TEXT NOT NULL,
+    quantities TEXT NOT NULL);
+INSERT INTO users (username, password, role) VALUES ('admin', 'admin', 'admin');
+INSERT INTO medicines (name, stock, expiry_date) VALUES ('Paracetamol', 10, '2030-01-01');
+"""
+
+
+def test_init_db_upgrades_the_legacy_file(db_path, tmp_path):
+    path = str(tmp_path / "legacy.db")
+    with db.connection(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+        db.init_db(conn)
+        assert users.authenticate(conn, "admin", "admin") == (1, "admin", "admin")
+        assert catalog.get_medicine(conn, 1)[1] == "Paracetamol"
+        medicine_id = catalog.add_medicine(conn, "Ibuprofen", 5, date.today() + timedelta(days=30), 2.0)
+        assert catalog.get_medicine(conn, medicine_id)[4] == 2.0
+        assert conn.execute("SELECT COUNT(*) FROM prescriptions_legacy").fetchone() == (0,)
+        # A second run finds nothing left to migrate
+        db.init_db(conn)
@@ -0,0 +1,65 @@
+# tests/test_drug_info.py
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import pytest
+
+from pharmacy import catalog, db, drug_info
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(drug_info, "_cache", OrderedDict())
+
+
+def test_monograph_is_rendered_once_and_versioned(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0, "For fever.")
+    assert drug_info.get_monograph(conn, medicine_id) == "### Paracetamol Details\n\nFor fever."
+    drug_info.save_monograph(conn, medicine_id, "Paracetamol", "For fever and pain.")
+    assert drug_info.get_monograph(conn, medicine_id).endswith("For fever and pain.")
+    assert conn.execute("SELECT version FROM drug_monographs WHERE medicine_id = ?",
+                        (medicine_id,)).fetchone()[0] == 2
+
+
+def test_description_written_into_medicines_is_rendered_on_first_view(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    assert drug_info.get_monograph(conn, medicine_id) is None
+    conn.execute("UPDATE medicines SET info = 'Imported.' WHERE medicine_id = ?", (medicine_id,))
+    conn.commit()
+    assert drug_info.get_monograph(conn, medicine_id) == "### Paracetamol Details\n\nImported."
+
+
+def test_rename_rerenders_the_heading(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0, "For fever.")
+    drug_info.get_monograph(conn, medicine_id)
+    catalog.update_medicine(conn, medicine_id, "Crocin", 10, EXPIRY, 1.0)
+    assert drug_info.get_monograph(conn, medicine_id).startswith("### Crocin Details")
+
+
+def test_delete_drops_the_monograph(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0, "For fever.")
+    drug_info.get_monograph(conn, medicine_id)
+    catalog.delete_medicine(conn, medicine_id)
+    assert drug_info.get_monograph(conn, medicine_id) is None
+    assert not drug_info._cache
+
+
+def test_seed_descriptions_fill_empty_info(conn, monkeypatch):
+    monkeypatch.setattr(drug_info, "_seeded", False)
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    db.init_db(conn)
+    assert catalog.get_medicine(conn, medicine_id)[5]
+
+
+def test_reused_id_is_not_served_another_drugs_monograph(conn, db_path):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0, "For fever.")
+    drug_info.get_monograph(conn, medicine_id)
+    # Deleted by another process, whose cache clearing this one never sees
+    with db.connection(db_path) as other:
+        other.execute("DELETE FROM medicines WHERE medicine_id = ?", (medicine_id,))
+        other.execute("DELETE FROM drug_monographs WHERE medicine_id = ?", (medicine_id,))
+        other.commit()
+    assert catalog.add_medicine(conn, "Ibuprofen", 10, EXPIRY, 1.0, "For pain.") == medicine_id
+    assert drug_info.get_monograph(conn, medicine_id) == "### Ibuprofen Details\n\nFor pain."
@@ -0,0 +1,51 @@
+# tests/test_entities.py
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip("spacy")
+
+from pharmacy import catalog, entities  # noqa: E402
+
+EXPIRY = date.today() + timedelta(days=365)
+PRESCRIPTION = """Dr. Ravi Sharma MBBS MD
+PATIENT (M) / 34Y Anil Kumar
+Rx
+Tab dolo 650 1-0-1 x 5 days Tot: 10
+Amoxicillin 500 mg
+2 strips
+"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_extractor(monkeypatch):
+    monkeypatch.setattr(entities, "_extractor", None)
+
+
+def test_short_names_drop_the_form():
+    assert entities.short_name("Dolo 650 Tablets") == "Dolo 650"
+    assert entities.short_name("Benadryl Syrup #2") == "Benadryl"
+
+
+def test_prescription_entities():
+    extractor = entities.Extractor([(1, "Dolo 650 Tablet"), (2, "Amoxicillin")])
+    assert extractor.extract(PRESCRIPTION) == {
+        "doctor_name": "Ravi Sharma",
+        "patient_name": "Anil Kumar",
+        "drug_name": ["Dolo 650", "Amoxicillin"],
+        "quantity": ["10", "2"],
+    }
+
+
+def test_merge_keeps_the_first_names_and_adds_new_drugs():
+    total = entities.merge({}, {"doctor_name": "", "patient_name": "Anil", "drug_name": ["A"], "quantity": ["1"]})
+    entities.merge(total, {"doctor_name": "Ravi", "patient_name": "Other", "drug_name": ["A", "B"],
+                           "quantity": ["5", ""]})
+    assert total == {"doctor_name": "Ravi", "patient_name": "Anil", "drug_name": ["A", "B"], "quantity": ["1", ""]}
+
+
+def test_extractor_follows_the_catalog(conn):
+    medicine_id = catalog.add_medicine(conn, "Dolo 650 Tablet", 10, EXPIRY, 1.0)
+    assert entities.extract(conn, "Tab Crocin")["drug_name"] == []
+    catalog.update_medicine(conn, medicine_id, "Crocin", 10, EXPIRY, 1.0)
+    assert entities.extract(conn, "Tab Crocin")["drug_name"] == ["Crocin"]
@@ -0,0 +1,38 @@
+# tests/test_inventory.py
+from datetime import date, timedelta
+
+from pharmacy import catalog, inventory
+
+TODAY = date.today()
+
+
+def test_expiry_reports(conn):
+    soon = catalog.add_medicine(conn, "Soon", 10, TODAY + timedelta(days=30), 1.0)
+    catalog.add_medicine(conn, "Later", 10, TODAY + timedelta(days=300), 1.0)
+    expired = catalog.add_medicine(conn, "Expired", 10, TODAY - timedelta(days=1), 1.0)
+    assert [row[0] for row in inventory.drugs_near_expiry(conn)] == [soon]
+    assert [row[0] for row in inventory.drugs_near_expiry(conn, threshold_days=400)] == [soon, soon + 1]
+    assert [row[0] for row in inventory.expired_drugs(conn)] == [expired]
+
+
+def test_stock_of(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 7, TODAY, 1.0)
+    assert inventory.stock_of(conn, medicine_id) == 7
+    assert inventory.stock_of(conn, 999) is None
+
+
+def test_grid_status_colours():
+    drugs = [(1, "a", 60, (TODAY + timedelta(days=200)).isoformat(), 1.0),
+             (2, "b", 30, (TODAY + timedelta(days=100)).isoformat(), 1.0),
+             (3, "c", None, None, 1.0)]
+    status = inventory.grid_status(drugs, today=TODAY)
+    assert [(stock, expiry) for stock, _, expiry in status] == [("green", "green"), ("orange", "orange"),
+                                                                 ("red", "green")]
+    assert [days for _, days, _ in status][:2] == [200, 100]
+
+
+def test_grid_status_reads_cached_views(conn):
+    catalog.add_medicine(conn, "Paracetamol", 10, TODAY + timedelta(days=10), 1.0)
+    drugs = catalog.cached_medicines(conn)
+    assert inventory.grid_status(drugs, today=TODAY) == [("red", 10, "red")]
+    assert inventory.grid_status([]) == []
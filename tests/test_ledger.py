@@ -0,0 +1,84 @@
+# tests/test_ledger.py
+from datetime import date, timedelta
+
+from pharmacy import catalog, ledger, maintenance, orders
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+def _buy(conn, medicine_id, quantity):
+    return orders.place_order(conn, 1, [{'drug_id': medicine_id, 'drug_name': "x", 'quantity': quantity,
+                                         'total': quantity * 1.0}])
+
+
+def test_every_stock_change_is_in_the_ledger(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    _buy(conn, medicine_id, 3)
+    ledger.restock(conn, medicine_id, 5, note="delivery")
+    catalog.update_medicine(conn, medicine_id, "Paracetamol", 20, EXPIRY, 1.0)
+    kinds = [row[1] for row in reversed(ledger.movements(conn, medicine_id))]
+    assert kinds == [ledger.RESTOCK, ledger.SALE, ledger.RESTOCK, ledger.ADJUSTMENT]
+    assert ledger.reconcile(conn) == []
+
+
+def test_expired_stock_is_written_off(conn):
+    expired = catalog.add_medicine(conn, "Old", 4, date.today() - timedelta(days=1), 1.0)
+    catalog.add_medicine(conn, "Fresh", 4, EXPIRY, 1.0)
+    assert ledger.write_off_expired(conn) == 1
+    assert ledger.movements(conn, expired, limit=1)[0][1:3] == (ledger.EXPIRY_WRITE_OFF, -4)
+    assert ledger.reconcile(conn) == []
+
+
+def test_reconcile_finds_stock_changed_behind_the_ledger(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    conn.execute("UPDATE medicines SET stock = 7 WHERE medicine_id = ?", (medicine_id,))
+    conn.commit()
+    assert ledger.reconcile(conn) == [(medicine_id, "Paracetamol", 7, 10)]
+
+
+def test_deleting_a_medicine_closes_its_ledger(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    ledger.take_snapshot(conn)
+    catalog.delete_medicine(conn, medicine_id)
+    assert ledger.movements(conn, medicine_id, limit=1)[0][1:3] == (ledger.ADJUSTMENT, -10)
+    assert ledger.reconcile(conn) == []
+
+
+def test_deleted_medicine_with_an_open_balance_is_reported(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    conn.execute("DELETE FROM medicines WHERE medicine_id = ?", (medicine_id,))
+    conn.commit()
+    assert ledger.reconcile(conn) == [(medicine_id, None, 0, 10)]
+
+
+def test_stock_at_uses_snapshots(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    conn.execute("UPDATE stock_movements SET moved_at = '2026-01-01 09:00:00'")
+    conn.commit()
+    ledger.take_snapshot(conn)
+    _buy(conn, medicine_id, 4)
+    conn.execute("UPDATE stock_movements SET moved_at = '2026-01-02 09:00:00' WHERE kind = 'sale'")
+    conn.execute("UPDATE stock_snapshots SET taken_at = '2026-01-01 12:00:00'")
+    conn.commit()
+    assert ledger.stock_at(conn, medicine_id, "2026-01-01 10:00:00") == 10
+    assert ledger.stock_at(conn, medicine_id, "2026-01-03") == 6
+    # A snapshot built on the previous one agrees with a replay from the start
+    ledger.take_snapshot(conn)
+    assert ledger.reconcile(conn) == []
+
+
+def test_maybe_snapshot_waits_for_enough_movements(conn):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 100, EXPIRY, 1.0)
+    assert ledger.maybe_snapshot(conn, every=3) is None
+    _buy(conn, medicine_id, 1)
+    _buy(conn, medicine_id, 1)
+    snapshot_id = ledger.maybe_snapshot(conn, every=3)
+    assert snapshot_id is not None
+    assert ledger.maybe_snapshot(conn, every=3) is None
+
+
+def test_maintenance_takes_ledger_snapshots(conn, monkeypatch):
+    monkeypatch.setattr(ledger, "SNAPSHOT_EVERY", 1)
+    catalog.add_medicine(conn, "Paracetamol", 100, EXPIRY, 1.0)
+    assert maintenance.run_task(conn, "snapshot").startswith("ok: ")
+    assert conn.execute("SELECT count(*) FROM stock_snapshots").fetchone()[0] == 1
@@ -0,0 +1,62 @@
+# tests/test_maintenance.py
+import os
+import sqlite3
+
+import pytest
+
+from pharmacy import maintenance
+
+
+@pytest.fixture
+def fragmented(conn):
+    """
+    A database with a few hundred free pages, left by dropping a table.
+    """
+    conn.execute("CREATE TABLE filler (data BLOB)")
+    conn.executemany("INSERT INTO filler VALUES (zeroblob(4000))", [()] * 500)
+    conn.commit()
+    conn.execute("DROP TABLE filler")
+    conn.commit()
+    free = maintenance._pragma(conn, "freelist_count")
+    assert free > 400
+    return free
+
+
+def test_vacuum_releases_every_free_page(conn, fragmented):
+    assert maintenance._pragma(conn, "auto_vacuum") == 2
+    assert maintenance.vacuum(conn) == fragmented
+    assert maintenance._pragma(conn, "freelist_count") == 0
+
+
+def test_vacuum_stops_at_the_page_budget(conn, fragmented):
+    assert maintenance.vacuum(conn, pages=100) == 100
+    assert maintenance._pragma(conn, "freelist_count") == fragmented - 100
+
+
+def test_a_due_task_is_claimed_once(conn):
+    assert maintenance._claim(conn, "vacuum", maintenance.VACUUM_EVERY)
+    assert not maintenance._claim(conn, "vacuum", maintenance.VACUUM_EVERY)
+
+
+def test_run_task_records_its_outcome(conn, fragmented):
+    assert maintenance.run_task(conn, "vacuum") == f"ok: {fragmented}"
+    assert [row[0] for row in maintenance.last_runs(conn)] == ["vacuum"]
+
+
+def test_stats_report_the_page_cache_budget(conn):
+    conn.execute("PRAGMA cache_size = -4096")
+    assert maintenance.database_stats(conn)["cache_bytes"] == 4096 * 1024
+    conn.execute("PRAGMA cache_size = 100")
+    stats = maintenance.database_stats(conn)
+    assert stats["cache_bytes"] == 100 * stats["page_size"]
+
+
+def test_a_failed_backup_leaves_no_partial_file(conn, tmp_path, monkeypatch):
+    def interrupted(target, **kwargs):
+        target.execute("CREATE TABLE half (x)")
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(conn, "backup", interrupted)
+    with pytest.raises(sqlite3.OperationalError):
+        maintenance.backup(conn, str(tmp_path / "backups"))
+    assert os.listdir(tmp_path / "backups") == []
@@ -0,0 +1,41 @@
+# tests/test_ocr.py
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from pharmacy import ocr
+
+
+def test_concat_shifts_boxes_and_keeps_lines_apart():
+    first = ocr.Words(["Tab", "Crocin"], [0, 40], [0, 0], [30, 60], [10, 10], [90, 80], [0, 0])
+    second = ocr.Words(["1-0-1"], [5], [2], [40], [10], [95], [0])
+    words = ocr.Words.concat([(first, 10, 100), (ocr.Words.empty(), 0, 0), (second, 10, 200)])
+    assert list(words.left) == [10, 50, 15] and list(words.top) == [100, 100, 202]
+    assert words.lines() == [(0, 100, "Tab Crocin"), (1, 202, "1-0-1")]
+    assert words.joined(words.confident(85)) == "Tab\n1-0-1"
+
+
+def test_text_regions_are_in_reading_order():
+    page = Image.new("L", (400, 300), 255)
+    draw = ImageDraw.Draw(page)
+    draw.rectangle((20, 200, 150, 220), fill=0)
+    draw.rectangle((20, 30, 150, 50), fill=0)
+    boxes = ocr.text_regions(np.array(page))
+    assert [box[1] < 100 for box in boxes] == [True, False]
+
+
+def test_tesserocr_apis_are_shared_across_threads():
+    pytest.importorskip("tesserocr")
+    engine = ocr.TesserocrEngine(size=1)
+    page = Image.new("L", (200, 60), 255)
+    opened = []
+    original = engine._open
+    engine._open = lambda: opened.append(1) or original()
+    # Each call on a thread of its own, as Streamlit reruns are
+    for _ in range(3):
+        thread = threading.Thread(target=engine.recognize, args=(page,))
+        thread.start()
+        thread.join()
+    assert len(opened) == 1
@@ -0,0 +1,94 @@
+# tests/test_orders.py
+import csv
+import io
+from datetime import date, timedelta
+
+import pytest
+
+from pharmacy import catalog, db, orders
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+@pytest.fixture
+def history(conn):
+    """
+    A customer with 120 orders, one per minute, alternating between two drugs.
+    """
+    drugs = [catalog.add_medicine(conn, "Paracetamol", 100, EXPIRY, 2.5, ""),
+             catalog.add_medicine(conn, "Ibuprofen, 400 mg", 100, EXPIRY, 4.0, "")]
+    conn.executemany("INSERT INTO orders (order_date, customer_id, drug_id, quantity, total_amount) "
+                     "VALUES (?, 1, ?, 1, 1.0)",
+                     [(f"2026-01-01 {i // 60:02d}:{i % 60:02d}:00", drugs[i % 2]) for i in range(120)])
+    conn.commit()
+    return drugs
+
+
+def _item(medicine_id, quantity):
+    return {'drug_id': medicine_id, 'drug_name': "Paracetamol", 'quantity': quantity, 'total': quantity * 2.5}
+
+
+def test_stock_is_checked_when_it_is_decremented(conn, db_path):
+    medicine_id = catalog.add_medicine(conn, "Paracetamol", 2, EXPIRY, 2.5)
+    # Both carts were filled while two units were showing
+    with db.connection(db_path) as other:
+        orders.place_order(other, 2, [_item(medicine_id, 2)])
+    with pytest.raises(orders.InsufficientStock) as e:
+        orders.place_order(conn, 1, [_item(medicine_id, 1)])
+    assert e.value.available == 0
+    assert catalog.get_medicine(conn, medicine_id)[2] == 0
+    assert orders.customer_orders(conn, 1) == []
+
+
+def test_history_pages_walk_newest_first_without_gaps(conn, history):
+    seen, after = [], None
+    while True:
+        page = orders.customer_orders_page(conn, 1, limit=50, after=after)
+        seen += page
+        if len(page) < 50:
+            break
+        after = page[-1]
+    assert len(seen) == 120
+    assert [row[1] for row in seen] == sorted((row[1] for row in seen), reverse=True)
+    assert len({row[0] for row in seen}) == 120
+
+
+def test_pages_only_show_the_customers_orders(conn, history):
+    assert orders.customer_orders_page(conn, 2) == []
+
+
+def test_basket_pages(conn, history):
+    first = orders.customer_baskets_page(conn, 1, limit=100)
+    second = orders.customer_baskets_page(conn, 1, limit=100, after=first[-1])
+    assert len(first) + len(second) == 120
+    assert first[0] == ("2026-01-01 01:59:00", 1, 1, 1.0)
+
+
+def test_csv_export_streams_every_order(conn, history):
+    chunks = orders.export_orders_csv(conn, 1)
+    assert next(chunks) == "Order ID,Order Date,Drug Name,Quantity,Total Amount\r\n"
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert len(rows) == 120
+    # Names with commas are quoted, not split
+    assert {row[2] for row in rows} == {"Paracetamol", "Ibuprofen, 400 mg"}
+
+
+def test_pdf_export_is_a_well_formed_pdf(conn, history):
+    chunks = list(orders.export_orders_pdf(conn, 1))
+    assert len(chunks) > 3  # yielded piece by piece, not as one buffer
+    data = b"".join(chunks)
+    assert data.startswith(b"%PDF-1.4") and data.endswith(b"%%EOF\n")
+    # Every cross-reference entry points at its object
+    xref_at = int(data.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+    lines = data[xref_at:].split(b"\n")
+    count = int(lines[1].split()[1])
+    for object_id in range(1, count):
+        offset = int(lines[2 + object_id].split()[0])
+        assert data[offset:].startswith(b"%d 0 obj" % object_id)
+    assert data.count(b"/Type /Page ") == 2  # 120 rows at 60 a page
+    assert b"Ibuprofen, 400 mg" in data
+
+
+def test_pdf_export_of_an_empty_history_has_one_page(conn):
+    data = b"".join(orders.export_orders_pdf(conn, 1))
+    assert data.count(b"/Type /Page ") == 1
@@ -0,0 +1,63 @@
+# tests/test_perf.py
+from collections import defaultdict, deque
+
+import pytest
+
+from pharmacy import perf
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(perf, "_samples", defaultdict(lambda: deque(maxlen=perf.SAMPLE_WINDOW)))
+    monkeypatch.setattr(perf, "_counts", defaultdict(int))
+    monkeypatch.setattr(perf, "_totals", defaultdict(float))
+    monkeypatch.setattr(perf, "_errors", defaultdict(int))
+    monkeypatch.setattr(perf, "_slow_queries", deque(maxlen=perf.SLOW_LOG_SIZE))
+
+
+def test_timed_records_calls_and_errors():
+    @perf.timed("stage")
+    def step(fail):
+        if fail:
+            raise ValueError
+
+    step(False)
+    with pytest.raises(ValueError):
+        step(True)
+    [row] = perf.stats("stage")
+    assert (row["name"], row["count"], row["errors"]) == ("step", 2, 1)
+    assert row["p50_ms"] <= row["max_ms"] <= row["total_ms"]
+
+
+def test_queries_are_grouped_by_normalized_sql(conn):
+    conn.execute("SELECT count(*)\n   FROM medicines")
+    conn.execute("SELECT count(*) FROM medicines")
+    names = {row["name"]: row["count"] for row in perf.stats("query")}
+    assert names["SELECT count(*) FROM medicines"] == 2
+
+
+def test_slow_queries_keep_their_parameters(conn, monkeypatch):
+    monkeypatch.setattr(perf, "SLOW_QUERY_SECONDS", 0)
+    conn.execute("SELECT * FROM medicines WHERE medicine_id = ?", (7,))
+    slow = perf.slow_queries()[0]
+    assert (slow["sql"], slow["params"]) == ("SELECT * FROM medicines WHERE medicine_id = ?", (7,))
+    assert any("medicines" in step for step in perf.explain(conn, slow["sql"], slow["params"]))
+
+
+def test_slow_queries_on_users_drop_their_parameters(conn, monkeypatch):
+    monkeypatch.setattr(perf, "SLOW_QUERY_SECONDS", 0)
+    conn.execute("UPDATE users SET password = ? WHERE user_id = ?", ("secret-hash", 1))
+    conn.execute("SELECT role FROM users WHERE username = :name", {"name": "admin"})
+    selected, updated = perf.slow_queries()[:2]
+    assert updated["params"] == (None, None) and selected["params"] == {"name": None}
+    # Still enough to explain the statement
+    assert any("users" in step for step in perf.explain(conn, updated["sql"], updated["params"]))
+
+
+def test_prometheus_output(tmp_path):
+    perf.record("page", 'say "hi"', 0.5)
+    path = tmp_path / "metrics.prom"
+    perf.write_prometheus(str(path))
+    text = path.read_text()
+    assert 'dawakhana_duration_seconds_count{kind="page",name="say \\"hi\\""} 1' in text
+    assert 'dawakhana_errors_total{kind="page",name="say \\"hi\\""} 0' in text
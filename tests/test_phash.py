@@ -0,0 +1,69 @@
+# tests/test_phash.py
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from pharmacy import phash, prescriptions
+
+
+@pytest.fixture
+def fresh_hashes(monkeypatch):
+    monkeypatch.setattr(prescriptions, "_hashes", (0, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)))
+
+
+def _page(lines):
+    page = Image.new("L", (600, 800), 255)
+    draw = ImageDraw.Draw(page)
+    for top, width in lines:
+        draw.rectangle((40, top, 40 + width, top + 18), fill=0)
+    return page
+
+
+PAGE = _page([(60, 300), (120, 450), (200, 200), (260, 380), (500, 250)])
+OTHER = _page([(80, 500), (300, 120), (420, 420), (600, 300), (700, 150)])
+
+
+def test_edited_copies_hash_close_and_other_pages_far():
+    original = phash.phash(PAGE)
+    copy = PAGE.resize((450, 600)).filter(ImageFilter.GaussianBlur(1)).convert("RGB")
+    hashes = np.array([phash.phash(copy), phash.phash(OTHER)], dtype=np.int64)
+    near, far = phash.distances(hashes, original).tolist()
+    assert near <= prescriptions.DUPLICATE_DISTANCE < far
+
+
+def test_distances_count_differing_bits():
+    hashes = np.array([0, -1, 0b1011], dtype=np.int64)
+    assert phash.distances(hashes, 0).tolist() == [0, 64, 3]
+
+
+def test_reuploads_are_found_copied_and_flagged(conn, fresh_hashes):
+    conn.execute("INSERT INTO users (user_id, username, password, role) VALUES (1, 'a', '', 'customer'), "
+                 "(2, 'b', '', 'customer')")
+    entities = {"doctor_name": "Ravi", "patient_name": "Anil", "drug_name": ["Dolo 650"], "quantity": ["10"]}
+    assert prescriptions.find_duplicate(conn, phash.phash(PAGE)) is None
+    original = prescriptions.save_prescription(conn, 1, entities, image_hash=phash.phash(PAGE))
+    prescriptions.save_prescription(conn, 1, entities, image_hash=phash.phash(OTHER))
+    assert prescriptions.find_duplicate(conn, phash.phash(PAGE.resize((500, 666)))) == (original, 1)
+
+    copy = prescriptions.save_duplicate(conn, 1, original, source="again.png")
+    assert prescriptions.entities_of(conn, copy) == entities
+    assert [(row[0], row[2], row[3], row[5]) for row in prescriptions.flagged(conn)] == [(copy, "a", original, "a")]
+    prescriptions.mark_reviewed(conn, copy)
+    assert prescriptions.flagged(conn) == []
+    # Copies are never matched against; their original is
+    assert prescriptions.find_duplicate(conn, phash.phash(PAGE)) == (original, 1)
+
+
+def test_another_customers_reupload_is_read_and_flagged(conn, fresh_hashes):
+    conn.execute("INSERT INTO users (user_id, username, password, role) VALUES (1, 'a', '', 'customer'), "
+                 "(2, 'b', '', 'customer')")
+    original = prescriptions.save_prescription(conn, 1, {"patient_name": "Anil", "drug_name": ["Dolo 650"]},
+                                               image_hash=phash.phash(PAGE))
+    duplicate_of, owner = prescriptions.find_duplicate(conn, phash.phash(PAGE))
+    assert (duplicate_of, owner) == (original, 1)
+    # Customer 2 gets what was read from their own upload, not customer 1's
+    entities = {"patient_name": "Sunita", "drug_name": ["Crocin"], "quantity": ["5"]}
+    copy = prescriptions.save_prescription(conn, 2, entities, image_hash=phash.phash(PAGE), duplicate_of=duplicate_of)
+    assert prescriptions.entities_of(conn, copy)["patient_name"] == "Sunita"
+    assert [(row[0], row[2], row[3], row[5]) for row in prescriptions.flagged(conn)] == [(copy, "b", original, "a")]
+    assert prescriptions.find_duplicate(conn, phash.phash(PAGE)) == (original, 1)
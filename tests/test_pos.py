@@ -0,0 +1,45 @@
+# tests/test_pos.py
+from datetime import date, timedelta
+
+import pytest
+
+from pharmacy import catalog, orders, pos
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(pos, "_index", None)
+
+
+def test_prefix_of_any_word_matches():
+    index = pos.PrefixIndex([(1, "Dolo 650 Tablet"), (2, "Dolonex"), (3, None)])
+    assert index.lookup("dolo") == [1, 2]
+    assert index.lookup("  DOLO   6") == [1]
+    assert index.lookup("650 t") == [1]
+    assert index.lookup("tab", limit=1) == [1]
+    assert index.lookup("") == []
+
+
+def test_codes_are_medicine_ids():
+    index = pos.PrefixIndex([(1, "Dolo 650"), (650, "Crocin")])
+    assert index.lookup("650") == [650]
+    assert index.lookup("651") == []
+
+
+def test_search_reads_live_stock(conn):
+    medicine_id = catalog.add_medicine(conn, "Dolo 650", 10, EXPIRY, 1.0)
+    assert pos.search(conn, "dolo")[0][2] == 10
+    orders.place_order(conn, 1, [{'drug_id': medicine_id, 'drug_name': "Dolo 650", 'quantity': 3, 'total': 3.0}])
+    assert pos.search(conn, "dolo")[0][2] == 7
+
+
+def test_index_is_rebuilt_after_a_rename(conn):
+    medicine_id = catalog.add_medicine(conn, "Dolo 650", 10, EXPIRY, 1.0)
+    index = pos.prefix_index(conn)
+    catalog.update_medicine(conn, medicine_id, "Dolo 650", 5, EXPIRY, 1.0)
+    assert pos.prefix_index(conn) is index  # a stock change keeps the index
+    catalog.update_medicine(conn, medicine_id, "Crocin", 5, EXPIRY, 1.0)
+    assert [row[1] for row in pos.search(conn, "croc")] == ["Crocin"]
+    assert pos.search(conn, "dolo") == []
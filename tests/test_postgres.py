@@ -0,0 +1,232 @@
+# tests/test_postgres.py
+#
+# The order and ledger flows, run against SQLite and against PostgreSQL. The
+# PostgreSQL runs use DAWAKHANA_PG_DSN if it is set, otherwise a throwaway
+# server from pgserver (`pip install pgserver`), and are skipped when neither
+# is available. Each test gets a schema of its own, dropped afterwards.
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+from pharmacy import catalog, db, ledger, orders, postgres
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+@pytest.fixture(scope="session")
+def pg_dsn(tmp_path_factory):
+    if postgres.psycopg is None:
+        pytest.skip("psycopg is not installed")
+    dsn = os.environ.get("DAWAKHANA_PG_DSN")
+    if dsn:
+        yield dsn
+        return
+    pgserver = pytest.importorskip("pgserver", reason="set DAWAKHANA_PG_DSN or install pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pgdata")), cleanup_mode="stop")
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def pg_url(pg_dsn, db_path, monkeypatch):
+    """
+    Points the PostgreSQL backend at a fresh schema and switches db.BACKEND to it.
+    """
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with postgres.psycopg.connect(pg_dsn, autocommit=True) as admin:
+        admin.execute(f"CREATE SCHEMA {schema}")
+    url = postgres.psycopg.conninfo.make_conninfo(pg_dsn, options=f"-c search_path={schema}")
+    monkeypatch.setattr(postgres, "DATABASE_URL", url)
+    monkeypatch.setattr(postgres, "_pool", None)
+    monkeypatch.setattr(db, "BACKEND", "postgres")
+    yield url
+    if postgres._pool is not None:
+        postgres._pool.close()
+    with postgres.psycopg.connect(pg_dsn, autocommit=True) as admin:
+        admin.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def backend(request, db_path):
+    """
+    A connection from db.connect() on either backend, with the schema in place.
+    """
+    if request.param == "postgres":
+        request.getfixturevalue("pg_url")
+    conn = db.connect()
+    db.init_db(conn)
+    yield conn
+    conn.close()
+
+
+def _item(medicine_id, quantity, name="x"):
+    return {'drug_id': medicine_id, 'drug_name': name, 'quantity': quantity, 'total': quantity * 1.0}
+
+
+def _stock(conn, medicine_id):
+    return catalog.get_medicine(conn, medicine_id)[2]
+
+
+def test_translate_rewrites_sqlite_dialect():
+    assert postgres._translate("SELECT * FROM medicines WHERE name LIKE ? AND stock > ?") == (
+        "SELECT * FROM medicines WHERE name ILIKE %s AND stock > %s", False)
+    assert postgres._translate("SELECT printf('%d', group_concat(name)) FROM medicines")[0] == (
+        "SELECT printf('%%d', string_agg(name)) FROM medicines")
+    assert postgres._translate("BEGIN IMMEDIATE") is None
+
+
+def test_translate_returns_generated_keys_and_ignores_conflicts():
+    assert postgres._translate("INSERT INTO orders (customer_id) VALUES (?)") == (
+        "INSERT INTO orders (customer_id) VALUES (%s) RETURNING order_id", True)
+    assert postgres._translate("INSERT OR IGNORE INTO users (username) VALUES (?)") == (
+        "INSERT INTO users (username) VALUES (%s) ON CONFLICT DO NOTHING", False)
+    # carts is keyed by user_id, which the caller supplies
+    assert postgres._translate("INSERT INTO carts (user_id, items) VALUES (?, ?)")[1] is False
+
+
+def test_place_order_decrements_stock_and_records_the_sale(backend):
+    medicine_id = catalog.add_medicine(backend, "Paracetamol", 10, EXPIRY, 1.0)
+    order_ids = orders.place_order(backend, 1, [_item(medicine_id, 3)])
+    assert len(order_ids) == 1 and order_ids[0] is not None
+    assert _stock(backend, medicine_id) == 7
+    assert ledger.movements(backend, medicine_id, limit=1)[0][1:3] == (ledger.SALE, -3)
+    assert ledger.reconcile(backend) == []
+
+
+def test_an_empty_cart_places_nothing(backend):
+    assert orders.place_order(backend, 1, []) == []
+    assert orders.customer_orders(backend, 1) == []
+
+
+def test_a_short_item_cancels_the_whole_order(backend):
+    plenty = catalog.add_medicine(backend, "Paracetamol", 10, EXPIRY, 1.0)
+    scarce = catalog.add_medicine(backend, "Ibuprofen", 1, EXPIRY, 1.0)
+    with pytest.raises(orders.InsufficientStock) as e:
+        orders.place_order(backend, 1, [_item(plenty, 2), _item(scarce, 2, "Ibuprofen")])
+    assert (e.value.drug_name, e.value.available) == ("Ibuprofen", 1)
+    assert _stock(backend, plenty) == 10
+    assert orders.customer_orders(backend, 1) == []
+    assert ledger.reconcile(backend) == []
+
+
+def test_concurrent_checkouts_never_oversell(backend):
+    medicine_id = catalog.add_medicine(backend, "Paracetamol", 5, EXPIRY, 1.0)
+    other_id = catalog.add_medicine(backend, "Ibuprofen", 50, EXPIRY, 1.0)
+    results = []
+
+    def checkout():
+        with db.connection() as conn:
+            try:
+                # Both drugs in every cart, listed in opposite orders, so the row locks could cross
+                items = [_item(medicine_id, 1), _item(other_id, 1)]
+                orders.place_order(conn, 1, items if len(results) % 2 else items[::-1])
+                results.append(True)
+            except orders.InsufficientStock:
+                results.append(False)
+
+    threads = [threading.Thread(target=checkout) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 5
+    assert _stock(backend, medicine_id) == 0
+    assert _stock(backend, other_id) == 45
+    assert ledger.reconcile(backend) == []
+
+
+def test_ledger_flows_reconcile(backend):
+    medicine_id = catalog.add_medicine(backend, "Paracetamol", 10, EXPIRY, 1.0)
+    expired = catalog.add_medicine(backend, "Old", 4, date.today() - timedelta(days=1), 1.0)
+    orders.place_order(backend, 1, [_item(medicine_id, 4)])
+    ledger.restock(backend, medicine_id, 6, note="delivery")
+    assert ledger.write_off_expired(backend) == 1
+    snapshot_id = ledger.take_snapshot(backend)
+    assert ledger.maybe_snapshot(backend, every=1) is None
+    orders.place_order(backend, 1, [_item(medicine_id, 2)])
+    catalog.delete_medicine(backend, expired)
+    assert snapshot_id is not None
+    assert ledger.stock_at(backend, medicine_id, "9999-12-31") == _stock(backend, medicine_id) == 10
+    assert ledger.reconcile(backend) == []
+
+
+def test_catalog_versions_move_with_medicine_writes(backend):
+    medicine_id = catalog.add_medicine(backend, "Paracetamol", 10, EXPIRY, 1.0)
+    stock_version, names = catalog.version(backend), catalog.names_version(backend)
+    orders.place_order(backend, 1, [_item(medicine_id, 1)])
+    assert catalog.version(backend) > stock_version
+    assert catalog.names_version(backend) == names
+    catalog.update_medicine(backend, medicine_id, "Paracetamol 500", 9, EXPIRY, 1.0)
+    assert catalog.names_version(backend) > names
+
+
+def test_version_triggers_wait_for_commit(pg_url, db_path):
+    with db.connection() as conn, db.connection() as other:
+        db.init_db(conn)
+        medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+        before = catalog.version(other)
+        conn.execute("UPDATE medicines SET stock = 9 WHERE medicine_id = ?", (medicine_id,))
+        conn.execute("UPDATE medicines SET stock = 8 WHERE medicine_id = ?", (medicine_id,))
+        # Deferred: the counter row isn't touched (or locked) until commit
+        assert catalog.version(other) == before
+        other.execute("SET lock_timeout = '1s'")
+        other.execute("UPDATE catalog_version SET version = version")
+        other.commit()
+        conn.commit()
+        assert catalog.version(other) == before + 2
+
+
+def test_checkout_waits_for_rows_locked_by_another_transaction(pg_url, db_path):
+    with db.connection() as conn, db.connection() as other:
+        db.init_db(conn)
+        medicine_id = catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+        other.execute(f"SELECT stock FROM medicines WHERE medicine_id = ?{postgres.for_update(other)}",
+                      (medicine_id,))
+        done = threading.Event()
+
+        def checkout():
+            orders.place_order(conn, 1, [_item(medicine_id, 1)])
+            done.set()
+
+        thread = threading.Thread(target=checkout)
+        thread.start()
+        time.sleep(0.2)
+        assert not done.is_set()
+        other.rollback()
+        thread.join(timeout=5)
+        assert done.is_set()
+        assert _stock(other, medicine_id) == 9
+
+
+def test_load_sqlite_copies_every_table(pg_url, db_path):
+    with db.connection(db_path) as source:
+        medicine_id = catalog.add_medicine(source, "Paracetamol", 10, EXPIRY, 1.0)
+        catalog.add_medicine(source, "Ibuprofen", 5, EXPIRY, 2.0)
+        orders.place_order(source, 1, [_item(medicine_id, 3)])
+        ledger.take_snapshot(source)
+    with db.connection() as conn:
+        db.init_db(conn)
+        before = catalog.version(conn)
+        copied = postgres.load_sqlite(conn, db_path)
+        assert copied["medicines"] == 2 and copied["orders"] == 1
+        assert copied["stock_movements"] == 3 and copied["stock_snapshot_items"] == 2
+        # One bump for the whole load, not one per row
+        assert catalog.version(conn) == before + 1
+        assert ledger.reconcile(conn) == []
+        # New rows are numbered after the copied ones
+        assert catalog.add_medicine(conn, "Aspirin", 1, EXPIRY, 1.0) == 3
+
+
+def test_postgres_errors_surface_as_sqlite_errors(pg_url, db_path):
+    with db.connection() as conn:
+        db.init_db(conn)
+        conn.execute("INSERT INTO users (username, password, role) VALUES ('a', 'x', 'customer')")
+        conn.commit()
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO users (username, password, role) VALUES ('a', 'y', 'customer')")
+        conn.rollback()
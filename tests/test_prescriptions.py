@@ -0,0 +1,50 @@
+# tests/test_prescriptions.py
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from pharmacy import catalog, prescriptions
+
+EXPIRY = date.today() + timedelta(days=365)
+ENTITIES = {"doctor_name": "Ravi Sharma", "patient_name": "Anil Kumar",
+            "drug_name": ["Dolo 650", "Amoxicillin", "Unknownol"], "quantity": ["10", "", "2"]}
+
+
+@pytest.fixture(autouse=True)
+def fresh_hashes(monkeypatch):
+    monkeypatch.setattr(prescriptions, "_hashes", (0, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)))
+
+
+@pytest.fixture
+def drugs(conn):
+    return {"sold out": catalog.add_medicine(conn, "Dolo 650 Tablet", 0, EXPIRY, 1.0),
+            "dolo": catalog.add_medicine(conn, "Dolo 650 Strip", 4, EXPIRY, 2.0),
+            "amox": catalog.add_medicine(conn, "Amoxicillin", 0, EXPIRY, 5.0)}
+
+
+def test_stored_entities_round_trip(conn, drugs):
+    prescription_id = prescriptions.save_prescription(conn, 1, ENTITIES, source="rx.png")
+    assert prescriptions.entities_of(conn, prescription_id) == ENTITIES
+    # The in-stock match is preferred, and missing quantities stay missing
+    items = conn.execute("SELECT medicine_id, quantity FROM prescription_items ORDER BY position").fetchall()
+    assert items == [(drugs["dolo"], 10), (drugs["amox"], None), (None, 2)]
+
+
+def test_refill_caps_at_stock_and_lists_what_is_missing(conn, drugs):
+    prescription_id = prescriptions.save_prescription(conn, 1, ENTITIES)
+    items, unavailable = prescriptions.refill_cart(conn, 1, prescription_id)
+    assert [(item['drug_id'], item['quantity'], item['total']) for item in items] == [(drugs["dolo"], 4, 8.0)]
+    assert items[0]['prescription_id'] == prescription_id
+    assert unavailable == ["Amoxicillin", "Unknownol"]
+    # Another customer's prescription can't be refilled
+    assert prescriptions.refill_cart(conn, 2, prescription_id) == ([], [])
+
+
+def test_prescription_pages(conn, drugs):
+    ids = [prescriptions.save_prescription(conn, 1, ENTITIES) for _ in range(5)]
+    first = prescriptions.customer_prescriptions(conn, 1, limit=3)
+    second = prescriptions.customer_prescriptions(conn, 1, limit=3, after=first[-1])
+    assert [row[0] for row in first + second] == ids[::-1]
+    assert first[0][4] == "Dolo 650, Amoxicillin, Unknownol"
+    assert prescriptions.customer_prescriptions(conn, 2) == []
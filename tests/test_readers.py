@@ -0,0 +1,64 @@
+# tests/test_readers.py
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from pharmacy import catalog, readers
+
+EXPIRY = date.today() + timedelta(days=365)
+
+
+def test_a_snapshot_does_not_see_later_commits(conn, db_path):
+    catalog.add_medicine(conn, "Paracetamol", 10, EXPIRY, 1.0)
+    pool = readers.ReadPool(db_path)
+    with pool.snapshot() as report:
+        assert catalog.count_medicines(report) == 1
+        catalog.add_medicine(conn, "Ibuprofen", 10, EXPIRY, 1.0)
+        assert catalog.count_medicines(report) == 1
+    with pool.snapshot() as report:
+        assert catalog.count_medicines(report) == 2
+
+
+def test_snapshots_cannot_write(db_path):
+    with readers.ReadPool(db_path).snapshot() as report:
+        with pytest.raises(sqlite3.OperationalError):
+            report.execute("DELETE FROM medicines")
+
+
+def test_connections_are_reused_and_dropped_after_an_error(db_path):
+    pool = readers.ReadPool(db_path)
+    with pool.snapshot() as first:
+        pass
+    with pool.snapshot() as second:
+        assert second is first
+    with pytest.raises(ZeroDivisionError):
+        with pool.snapshot():
+            1 / 0
+    with pool.snapshot() as third:
+        assert third is not first
+
+
+def test_pool_bounds_concurrent_reports(db_path):
+    pool = readers.ReadPool(db_path, size=2)
+    inside, release = [], threading.Event()
+
+    def report():
+        with pool.snapshot():
+            inside.append(1)
+            release.wait(5)
+
+    threads = [threading.Thread(target=report) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while len(inside) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert len(inside) == 2  # the other two wait for a connection
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(inside) == 4
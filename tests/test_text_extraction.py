@@ -0,0 +1,102 @@
+# tests/test_text_extraction.py
+import io
+
+import pytest
+from PIL import Image
+
+import text_extraction
+from pharmacy import ocr
+
+
+def _document(fmt, count):
+    pages = [Image.new("RGB", (100 + i, 100), "white") for i in range(count)]
+    buffer = io.BytesIO()
+    pages[0].save(buffer, format=fmt, save_all=True, append_images=pages[1:])
+    buffer.seek(0)
+    return buffer
+
+
+def test_tiff_frames_are_pages():
+    widths = [page.width for page in text_extraction.iter_pages(_document("TIFF", 3), "rx.tiff")]
+    assert widths == [100, 101, 102]
+
+
+def test_reading_resumes_at_a_later_page():
+    pages = list(text_extraction.iter_pages(_document("TIFF", 3), "rx.tif", start=3))
+    assert [page.width for page in pages] == [102]
+
+
+def test_pdf_pages_are_rendered():
+    pytest.importorskip("pypdfium2")
+    pages = list(text_extraction.iter_pages(_document("PDF", 2), "rx.PDF"))
+    assert len(pages) == 2
+    assert pages[0].mode == "RGB" and pages[0].width > 100  # rendered at PDF_DPI, not 72
+
+
+def test_single_images_are_one_page():
+    assert len(list(text_extraction.iter_pages(_document("PNG", 1), "rx.png"))) == 1
+
+
+def _words(lines):
+    """
+    ocr.Words with one word per (top, text, confidence) line.
+    """
+    return ocr.Words([text for _, text, _ in lines], [0] * len(lines), [top for top, _, _ in lines],
+                     [10] * len(lines), [10] * len(lines), [conf for _, _, conf in lines], range(len(lines)))
+
+
+def test_prompt_span_starts_at_the_medication_section():
+    words = _words([(10, "City Clinic", 90), (30, "Dr. Mehta", 90), (50, "Ph: 555", 90),
+                    (80, "Rx", 95), (100, "Dolo", 92), (120, "smudge", 20)])
+    assert text_extraction.prompt_span(words) == "Dr. Mehta\nRx\nDolo"
+
+
+def test_prompt_span_without_a_medication_section_is_all_confident_text():
+    words = _words([(10, "City Clinic", 90), (30, "smudge", 10)])
+    assert text_extraction.prompt_span(words) == "City Clinic"
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """
+    Recognises each page as one confident word naming its width, e.g. "w101".
+    """
+    read = []
+
+    def recognize(image):
+        read.append(image.width)
+        return _words([(0, f"w{image.width}", 90)])
+
+    monkeypatch.setattr(text_extraction, "recognize_words", recognize)
+    return read
+
+
+def _extract(text):
+    return {"drug_name": [text], "quantity": [""]}
+
+
+def test_pipeline_yields_each_stage_in_order(fake_ocr):
+    events = list(text_extraction.prescription_pipeline(_document("TIFF", 2), _extract, lambda names: names,
+                                                        filename="rx.tiff"))
+    assert [(stage, page) for stage, page, _ in events] == [
+        (text_extraction.PREPROCESSED, 1), (text_extraction.TEXT_READY, 1), (text_extraction.ENTITIES_READY, 1),
+        (text_extraction.PREPROCESSED, 2), (text_extraction.TEXT_READY, 2), (text_extraction.ENTITIES_READY, 2),
+        (text_extraction.MATCHES_READY, None)]
+    assert events[-1][2] == ["w100", "w101"]
+
+
+def test_pipeline_resumes_with_the_entities_already_read(fake_ocr):
+    found = {"drug_name": ["w100"], "quantity": [""]}
+    events = list(text_extraction.prescription_pipeline(_document("TIFF", 3), _extract, lambda names: names,
+                                                        found=found, start_page=2, filename="rx.tiff"))
+    assert fake_ocr == [101, 102]
+    assert events[-1][2] == ["w100", "w101", "w102"]
+
+
+def test_closing_the_pipeline_stops_reading(fake_ocr):
+    pipeline = text_extraction.prescription_pipeline(_document("TIFF", 3), _extract, lambda names: names,
+                                                     filename="rx.tiff")
+    for stage, _, _ in pipeline:
+        if stage == text_extraction.TEXT_READY:
+            pipeline.close()
+    assert fake_ocr == [100]
@@ -0,0 +1,25 @@
+# tests/test_users.py
+import pytest
+
+from pharmacy import auth, users
+
+
+def test_created_users_are_listed_without_passwords(conn):
+    user_id = users.create_user(conn, "alice", "pw")
+    users.create_user(conn, "admin", "pw", role="admin")
+    assert users.find_user(conn, "alice") == (user_id, "alice", "customer")
+    assert [row[1:] for row in users.list_users(conn)] == [("alice", "customer"), ("admin", "admin")]
+    stored = conn.execute("SELECT password FROM users WHERE user_id = ?", (user_id,)).fetchone()[0]
+    assert auth.is_hashed(stored)
+
+
+def test_usernames_are_unique(conn):
+    users.create_user(conn, "alice", "pw")
+    with pytest.raises(users.UsernameTaken):
+        users.create_user(conn, "alice", "other")
+
+
+def test_deleted_users_are_gone(conn):
+    user_id = users.create_user(conn, "alice", "pw")
+    users.delete_user(conn, user_id)
+    assert users.find_user(conn, "alice") is None
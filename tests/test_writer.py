@@ -0,0 +1,48 @@
+# tests/test_writer.py
+import sqlite3
+import threading
+
+import pytest
+
+from pharmacy import writer
+
+
+def _thread_name(conn):
+    return threading.current_thread().name
+
+
+def test_calls_run_on_the_writer_thread(db_path):
+    w = writer.Writer(db_path)
+    assert w.run(_thread_name) == "pharmacy-writer"
+    assert w.run(lambda conn: conn.execute("SELECT count(*) FROM medicines").fetchone()[0]) == 0
+
+
+def test_errors_reach_the_caller_and_the_writer_keeps_going(db_path):
+    w = writer.Writer(db_path)
+    with pytest.raises(sqlite3.OperationalError):
+        w.run(lambda conn: conn.execute("SELECT * FROM no_such_table"))
+    assert w.run(lambda conn: 1) == 1
+
+
+def test_a_failed_connect_fails_the_call_instead_of_the_thread(tmp_path):
+    missing = tmp_path / "gone"
+    w = writer.Writer(str(missing / "pharmacy.db"))
+    with pytest.raises(sqlite3.OperationalError):
+        w.submit(lambda conn: 1).result(timeout=5)
+    missing.mkdir()
+    assert w.submit(lambda conn: 1).result(timeout=5) == 1
+
+
+def test_calls_are_serialised(db_path):
+    w = writer.Writer(db_path)
+    active, overlaps = [], []
+
+    def work(conn):
+        active.append(1)
+        overlaps.append(len(active))
+        active.pop()
+
+    futures = [w.submit(work) for _ in range(50)]
+    for future in futures:
+        future.result(timeout=5)
+    assert max(overlaps) == 1
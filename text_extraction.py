@@ -1,97 +1,152 @@
 # ocr_utils.py
-import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
-import spacy
 import re  # For regex-based extraction
-from pymongo import MongoClient
+try:
+    import pypdfium2 as pdfium  # PDF rasterizer, only needed for PDF uploads
+except ImportError:
+    pdfium = None
+from pharmacy import ocr, phash  # Persistent OCR engine and parallel region OCR; duplicate detection
+from pharmacy.entities import merge as merge_entities  # Entities of a page added to those of the pages before it
+from pharmacy.perf import timed  # Stage timings for the Performance page
 
-# Configure Tesseract path (update this path based on your system)
-pytesseract.pytesseract.tesseract_cmd = r"C:\Users\kusha\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
+# Tesseract is found on PATH; set DAWAKHANA_TESSERACT_CMD or DAWAKHANA_TESSDATA to override (see pharmacy/ocr.py)
 
-# Load spaCy's English language model
-nlp = spacy.load("en_core_web_sm")
+# Upload types the prescription page accepts, and the resolution PDF pages are rendered at
+PRESCRIPTION_TYPES = ["jpg", "jpeg", "png", "tif", "tiff", "pdf"]
+PDF_DPI = 200
 
-# MongoDB client setup
-client = MongoClient('mongodb://localhost:27017/')  # Connect to MongoDB server
-db = client['ocr_database']  # Database name
-collection = db['entities']  # Collection name
+# Words recognised with less confidence than this (0-100) are treated as noise
+MIN_CONFIDENCE = 60
+# A line like these starts the medication section of a prescription
+MEDICATION_START = re.compile(r"(\bRx\b|\bR/|\bMedicines?\b|\bDrugs?\b|\b(Tab|Cap|Syp|Inj)\b\.?|Tot:)", re.IGNORECASE)
+# Header lines worth keeping for the doctor and patient names
+NAME_LINE = re.compile(r"(PATIENT|Dr\.|Doctor)", re.IGNORECASE)
 
+# Stages of prescription_pipeline(), in the order their events arrive for each
+# page; MATCHES_READY comes once, after the last page
+PREPROCESSED = "preprocessed"      # payload: the binary page image
+TEXT_READY = "text_ready"          # payload: the page's ocr.Words
+ENTITIES_READY = "entities_ready"  # payload: the entities of every page so far
+MATCHES_READY = "matches_ready"    # payload: match(drug names of every page)
+
+@timed("stage", "preprocess")
 def preprocess_image(image):
     """
     Preprocess the image for better OCR accuracy.
     Converts the image to grayscale and applies thresholding.
     """
     # Convert to grayscale
-    gray = cv2.cvtColor(np.array(image), cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2GRAY)
     # Apply thresholding
     _, binary = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
     return Image.fromarray(binary)
 
-def extract_text_from_image(image_file):
+def iter_pages(document, filename=None, start=1):
     """
-    Extract text from an image using OCR.
+    Yield the pages of an uploaded prescription (image, multi-page TIFF or PDF)
+    as PIL images, one at a time, so only the current page is ever decoded.
+    Pages before page number `start` are skipped without being decoded.
     """
-    try:
-        # Open the image using PIL
-        image = Image.open(image_file)
-        # Preprocess the image (optional)
-        processed_image = preprocess_image(image)
-        # Use pytesseract to extract text
-        extracted_text = pytesseract.image_to_string(processed_image)
-        return extracted_text
-    except Exception as e:
-        print(f"Error extracting text: {e}")
-        return None
+    name = (filename or getattr(document, "name", "") or "").lower()
+    if name.endswith(".pdf"):
+        if pdfium is None:
+            raise RuntimeError("PDF prescriptions need the pypdfium2 package.")
+        pdf = pdfium.PdfDocument(document)
+        try:
+            for index in range(start - 1, len(pdf)):
+                page = pdf[index]
+                image = page.render(scale=PDF_DPI / 72).to_pil()
+                page.close()
+                yield image
+        finally:
+            pdf.close()
+    else:
+        # TIFF frames are decoded on seek(); other formats have a single frame
+        image = Image.open(document)
+        for index in range(start - 1, getattr(image, "n_frames", 1)):
+            image.seek(index)
+            yield image.convert("RGB")
+
+@timed("stage", "phash")
+def prescription_hash(processed_image):
+    """
+    Perceptual hash of a (first) page, taken of the preprocessed image so
+    lighting and colour differences between two photos of one prescription don't count.
+    """
+    return phash.phash(processed_image)
 
-def extract_entities(text):
+@timed("stage", "ocr")
+def recognize_words(processed_image):
     """
-    Extract specific entities (patient name, doctor name, drug name, quantity) using spaCy NER and regex.
+    Recognise one preprocessed page, returning ocr.Words (boxes, lines and confidence).
     """
-    doc = nlp(text)
-    entities = {
-        "patient_name": [],
-        "doctor_name": [],
-        "drug_name": [],
-        "quantity": []
-    }
+    # OCR the page's text regions in parallel on this process's engine
+    return ocr.recognize_page(processed_image)
 
-    # Extract Patient Name (Look for "PATIENT" keyword)
-    patient_match = re.search(r"PATIENT\s*\([MF]\)\s*/\s*(\d+Y)\s*(.*)", text)
-    if patient_match:
-        entities["patient_name"].append(patient_match.group(2).strip())
+def extract_words_from_page(image):
+    """
+    Recognise one page image, returning ocr.Words (boxes, lines and confidence).
+    """
+    # Preprocess the image (optional)
+    return recognize_words(preprocess_image(image))
 
-    # Extract Doctor Name (Look for "Dr." or "Doctor")
-    doctor_match = re.search(r"Dr\.\s*([A-Za-z]+)", text)
-    if doctor_match:
-        entities["doctor_name"].append(doctor_match.group(1).strip())
+def extract_text_from_page(image, min_confidence=MIN_CONFIDENCE):
+    """
+    Extract the confidently recognised text of one page image, a line per text line.
+    """
+    words = extract_words_from_page(image)
+    return words.joined(words.confident(min_confidence))
 
-    # List of common drug names to look for
-    common_drugs = [
-        "Paracetamol", "Ibuprofen", "Amoxicillin", "Lisinopril", "Metformin", 
-        "Atorvastatin", "Omeprazole", "Levothyroxine", "Amlodipine", "Simvastatin", 
-        "Losartan", "Metoprolol", "Albuterol", "Gabapentin", "Hydrochlorothiazide", 
-        "Sertraline", "Prednisone", "Tramadol", "Citalopram", "Warfarin", "Methamphetamine", "Dolo 650"]
+def prompt_span(words, min_confidence=MIN_CONFIDENCE):
+    """
+    The part of a page worth sending to the LLM: confident lines from the
+    start of the medication section down, plus any doctor/patient lines above
+    it. The whole confident text if no medication section is recognised.
+    """
+    lines = words.lines(words.confident(min_confidence))
+    start = next((top for _, top, text in lines if MEDICATION_START.search(text)), None)
+    if start is None:
+        return "\n".join(text for _, _, text in lines)
+    return "\n".join(text for _, top, text in lines if top >= start or NAME_LINE.search(text))
 
-    # Extract Drug Names (Look for common drug names in the text)
-    for drug in common_drugs:
-        if re.search(rf"\b{drug}\b", text, re.IGNORECASE):
-            entities["drug_name"].append(drug)
+def extract_pages(document, filename=None):
+    """
+    Yield (page number, text) for each page of an uploaded prescription as it is recognised.
+    """
+    for number, image in enumerate(iter_pages(document, filename), start=1):
+        yield number, extract_text_from_page(image)
 
-    # Extract Quantities (Look for numbers after "Tot:" or similar keywords)
-    quantity_matches = re.findall(r"Tot:\s*(\d+)", text)
-    for qty in quantity_matches:
-        entities["quantity"].append(qty.strip())
+def prescription_pipeline(document, extract, match, found=None, start_page=1, filename=None):
+    """
+    Read an uploaded prescription in stages, yielding (stage, page number,
+    payload) as each one completes, so a page can show the text of page 1 as
+    soon as it is recognised rather than after the whole document.
 
-    return entities
+    `extract(text)` returns the entities of one page's confident text and
+    `match(drug_names)` the catalog matches for them. Entities are merged into
+    `found`; to resume an interrupted read, pass the entities of the pages
+    already read and the page number to carry on from. Closing the generator
+    (e.g. once the first page turns out to be a re-upload) stops reading.
+    """
+    found = {} if found is None else found
+    for number, image in enumerate(iter_pages(document, filename, start=start_page), start=start_page):
+        processed_image = preprocess_image(image)
+        yield PREPROCESSED, number, processed_image
+        words = recognize_words(processed_image)
+        yield TEXT_READY, number, words
+        # Low-confidence words are left out of the text the entities are read from
+        merge_entities(found, extract(words.joined(words.confident(MIN_CONFIDENCE))))
+        yield ENTITIES_READY, number, found
+    yield MATCHES_READY, None, match(found.get("drug_name", []))
 
-def store_entities_in_mongo(entities):
+def extract_text_from_image(image_file):
     """
-    Store extracted entities into MongoDB.
+    Extract text from an image (every page of a TIFF or PDF) using OCR.
     """
     try:
-        collection.insert_one(entities)  # Insert the extracted entities into MongoDB
-        print("Entities successfully stored in MongoDB.")
+        return "\n".join(text for _, text in extract_pages(image_file))
     except Exception as e:
-        print(f"Error storing entities in MongoDB: {e}")
+        print(f"Error extracting text: {e}")
+        return None